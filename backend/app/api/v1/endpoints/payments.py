@@ -240,6 +240,7 @@ def create_customer_portal_session(
     """
     try:
         portal_url = stripe_service.create_customer_portal_session(
+            db=db,
             customer_id=current_user.id,
             return_url=portal_data.return_url
         )
@@ -421,7 +422,7 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
         event = stripe_service.construct_webhook_event(payload, signature)
         
         # Handle the event
-        success = stripe_service.handle_webhook_event(db, event)
+        success = await stripe_service.ahandle_webhook_event(db, event)
         
         if success:
             return {"status": "success", "message": "Webhook processed successfully"}
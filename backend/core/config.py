@@ -12,6 +12,17 @@ class Settings(BaseSettings):
     APP_NAME: str = "FineHero AI"
     DATABASE_URL: str = "sqlite:///./finehero.db"
     
+    # Database connection pool (ignored for SQLite). Requests mix short queries
+    # with slow Stripe calls, so the pool follows the (cores * 2) + spindles rule
+    # rather than SQLAlchemy's default of 5.
+    DB_POOL_SIZE: int = (os.cpu_count() or 1) * 2 + 1
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 5       # Seconds to wait for a connection before failing
+    DB_POOL_RECYCLE: int = 1800    # Seconds before a connection is replaced
+    # Set when PgBouncer (transaction mode) sits in front of the database, so
+    # connections are not pooled twice
+    DB_USE_NULLPOOL: bool = False
+    
     # External API Keys
     GOOGLE_AI_API_KEY: str = ""
     
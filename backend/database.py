@@ -1,10 +1,28 @@
+from typing import Any, Dict
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from .core.config import settings
 
-engine = create_engine(
-    settings.DATABASE_URL, 
-    # The connect_args are only needed for SQLite
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+
+def engine_options(database_url: str) -> Dict[str, Any]:
+    """Build create_engine keyword arguments for the configured database."""
+    if "sqlite" in database_url:
+        # The connect_args are only needed for SQLite
+        return {"connect_args": {"check_same_thread": False}}
+    
+    if settings.DB_USE_NULLPOOL:
+        # PgBouncer already pools server connections
+        return {"poolclass": NullPool}
+    
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -110,7 +110,7 @@ class ProductionDeployer:
             try:
                 cmd = [
                     sys.executable, "-c",
-                    "from services.redis_cache import cache; print('Redis Test:', cache.is_connected())"
+                    "from services.redis_cache import cache; print('Redis Test:', cache.ping())"
                 ]
                 result = subprocess.run(cmd, capture_output=True, text=True, cwd=self.backend_dir)
                 
@@ -0,0 +1,123 @@
+"""
+Database migration script for binary API key hashes.
+
+APIKey.key_hash used to hold the SHA-256 digest as a 64-character hex string;
+the model now stores the raw 32-byte digest. This migration converts existing
+rows so issued keys keep validating.
+
+Migration includes:
+- PostgreSQL: key_hash column retyped to BYTEA, decoding the hex in place
+- SQLite: hex values rewritten as raw digests (column affinity is unchanged)
+- Rollback to hex strings
+"""
+import logging
+import os
+import sys
+
+from sqlalchemy import create_engine, inspect, text
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Database configuration
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./finehero.db")
+
+TABLE_NAME = "api_keys"
+
+
+class APIKeyHashMigration:
+    """
+    Converts stored API key hashes between hex strings and raw digests.
+    """
+
+    def __init__(self, database_url: str):
+        self.engine = create_engine(database_url)
+
+    def table_exists(self) -> bool:
+        """Check if the api_keys table exists."""
+        return TABLE_NAME in inspect(self.engine).get_table_names()
+
+    def run_migration(self) -> int:
+        """Convert hex hashes to raw digests; returns the number of rows converted."""
+        if not self.table_exists():
+            logger.info(f"Table {TABLE_NAME} does not exist, skipping...")
+            return 0
+
+        with self.engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                converted = self._convert_postgresql(conn, to_binary=True)
+            else:
+                converted = self._convert_rows(conn, to_binary=True)
+
+        logger.info(f"Converted {converted} API key hashes to raw digests")
+        return converted
+
+    def rollback_migration(self) -> int:
+        """Convert raw digests back to hex hashes; returns the number of rows converted."""
+        if not self.table_exists():
+            logger.info(f"Table {TABLE_NAME} does not exist, skipping...")
+            return 0
+
+        with self.engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                converted = self._convert_postgresql(conn, to_binary=False)
+            else:
+                converted = self._convert_rows(conn, to_binary=False)
+
+        logger.info(f"Converted {converted} API key hashes back to hex")
+        return converted
+
+    def _convert_postgresql(self, conn, to_binary: bool) -> int:
+        """Retype the column in place; a no-op if it already has the target type."""
+        data_type = conn.execute(text("""
+            SELECT data_type FROM information_schema.columns
+            WHERE table_name = :table AND column_name = 'key_hash'
+        """), {"table": TABLE_NAME}).scalar()
+        if (data_type == "bytea") == to_binary:
+            return 0
+
+        if to_binary:
+            conn.execute(text(f"""
+                ALTER TABLE {TABLE_NAME}
+                ALTER COLUMN key_hash TYPE BYTEA USING decode(key_hash, 'hex')
+            """))
+        else:
+            conn.execute(text(f"""
+                ALTER TABLE {TABLE_NAME}
+                ALTER COLUMN key_hash TYPE VARCHAR USING encode(key_hash, 'hex')
+            """))
+        return conn.execute(text(f"SELECT COUNT(*) FROM {TABLE_NAME}")).scalar()
+
+    def _convert_rows(self, conn, to_binary: bool) -> int:
+        """Rewrite each value that is still in the source format."""
+        rows = conn.execute(text(f"SELECT id, key_hash FROM {TABLE_NAME}")).all()
+        params = []
+        for row_id, key_hash in rows:
+            if to_binary and isinstance(key_hash, str):
+                params.append({"id": row_id, "h": bytes.fromhex(key_hash)})
+            elif not to_binary and isinstance(key_hash, bytes):
+                params.append({"id": row_id, "h": key_hash.hex()})
+
+        if params:
+            conn.execute(text(f"UPDATE {TABLE_NAME} SET key_hash = :h WHERE id = :id"), params)
+        return len(params)
+
+
+def main():
+    """Main migration function."""
+    migration = APIKeyHashMigration(DATABASE_URL)
+
+    if len(sys.argv) > 1:
+        command = sys.argv[1]
+        if command == 'rollback':
+            migration.rollback_migration()
+        else:
+            print(f"Unknown command: {command}")
+            print("Available commands: migration, rollback")
+    else:
+        migration.run_migration()
+
+
+if __name__ == "__main__":
+    main()
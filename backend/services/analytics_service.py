@@ -15,7 +15,14 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
-from .security_validator import SecurityValidator
+from .security_validator import (
+    validator as security_validator,
+    validate_event_data,
+    validate_ip_address,
+    validate_session_id,
+    validate_url,
+    validate_user_id,
+)
 
 Base = declarative_base()
 
@@ -170,8 +177,6 @@ class EventData:
     
     def __post_init__(self):
         """Validate and sanitize event data after initialization"""
-        validator = SecurityValidator()
-        
         # Validate event type
         if not self.event_type or not isinstance(self.event_type, str):
             raise ValueError("Event type must be a non-empty string")
@@ -184,15 +189,15 @@ class EventData:
         
         # Validate user_id if provided
         if self.user_id:
-            self.user_id = validator.validate_user_id(self.user_id)
+            self.user_id = validate_user_id(self.user_id)
         
         # Validate session_id if provided
         if self.session_id:
-            self.session_id = validator.validate_session_id(self.session_id)
+            self.session_id = validate_session_id(self.session_id)
         
         # Validate and sanitize event data
         if self.data:
-            self.data = validator.validate_event_data(self.data)
+            self.data = validate_event_data(self.data)
         
         # Validate response time
         if self.response_time is not None:
@@ -205,11 +210,11 @@ class EventData:
         
         # Validate and sanitize IP address
         if self.ip_address:
-            self.ip_address = validator.validate_ip_address(self.ip_address)
+            self.ip_address = validate_ip_address(self.ip_address)
         
         # Validate and sanitize URL fields
         if self.referrer:
-            self.referrer = validator.validate_url(self.referrer)
+            self.referrer = validate_url(self.referrer)
 
 
 class AnalyticsService:
@@ -219,7 +224,7 @@ class AnalyticsService:
     
     def __init__(self, db_session: Session):
         self.db = db_session
-        self.validator = SecurityValidator()
+        self.validator = security_validator
         self.session_id = self._generate_session_id()
         self._rate_limits = {}  # Simple in-memory rate limiting
         self._rate_limit_window = 60  # seconds
@@ -33,7 +33,7 @@ from pathlib import Path
 from datetime import datetime
 from PIL import Image
 import numpy as np
-from .security_validator import SecurityValidator
+from .security_validator import validator as security_validator
 
 # Custom security exception for clear error handling
 class SecurityError(Exception):
@@ -90,7 +90,7 @@ class SecurePDFProcessor:
             ValueError: If file validation fails
             SecurityError: If security checks detect threats
         """
-        self.security_validator = SecurityValidator()
+        self.security_validator = security_validator
         self.logger = logging.getLogger(__name__)
         self.security_logger = logging.getLogger('security_events')
         self.user_id = user_id
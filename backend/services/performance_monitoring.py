@@ -242,7 +242,7 @@ class HealthChecker:
         
         # Redis health
         try:
-            redis_status = "healthy" if cache.is_connected() else "disconnected"
+            redis_status = "healthy" if cache.ping() else "disconnected"
             if redis_status != "healthy":
                 errors.append("Redis connection failed")
         except Exception as e:
@@ -374,7 +374,7 @@ def quick_health_check() -> Dict[str, Any]:
         "status": "ok",
         "timestamp": datetime.now().isoformat(),
         "database": "connected" if db_config.test_connection() else "disconnected",
-        "cache": "connected" if cache.is_connected() else "disconnected",
+        "cache": "connected" if cache.ping() else "disconnected",
         "uptime": time.time()  # Could track actual uptime
     }
 
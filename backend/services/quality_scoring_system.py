@@ -14,6 +14,7 @@ Target: 95% document quality classification accuracy
 """
 
 import numpy as np
+import os
 import re
 import json
 import logging
@@ -21,21 +22,30 @@ from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, date, timedelta
 from dataclasses import dataclass
 from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import hashlib
 import pickle
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-from sqlalchemy import create_engine, and_, or_, desc, func
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, and_, or_, desc, func, select
+from sqlalchemy.orm import Session, sessionmaker
 
 # Import models
 from backend.app.models import LegalDocument, CaseOutcome
+from backend.database import engine_options
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Tokenizer used to build the word set for keyword presence checks
+WORD_PATTERN = re.compile(r'\w+')
+
+# Citations in Portuguese legal documents are front-loaded, so the accuracy
+# regexes only scan this many leading characters of very long documents
+CITATION_SCAN_LIMIT = 20000
+
 @dataclass
 class QualityMetrics:
     """Quality metrics breakdown for a document."""
@@ -59,6 +69,18 @@ class FilteringResult:
     quality_distribution: Dict[str, int]
     average_quality_scores: Dict[str, float]
 
+@dataclass
+class DocumentSnapshot:
+    """Plain, picklable view of the document fields used for scoring."""
+    id: int
+    title: Optional[str]
+    source: str
+    source_url: Optional[str]
+    publication_date: Optional[date]
+    jurisdiction: Optional[str]
+    document_type: Optional[str]
+    extracted_text: Optional[str]
+
 class QualityScoringEngine:
     """
     Advanced quality scoring engine for Portuguese legal documents.
@@ -80,7 +102,8 @@ class QualityScoringEngine:
             database_url: Database connection URL
         """
         self.database_url = database_url
-        self.engine = create_engine(database_url)
+        # Pool sizing follows the application settings (see backend.database)
+        self.engine = create_engine(database_url, **engine_options(database_url))
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
         
         # Quality thresholds
@@ -118,6 +141,16 @@ class QualityScoringEngine:
             ]
         }
         
+        # Split keywords into single-word (set lookup against the tokenized
+        # content) and multi-word (substring scan) groups per category
+        self._keyword_groups = {
+            category: (
+                frozenset(k for k in keywords if WORD_PATTERN.fullmatch(k)),
+                tuple(k for k in keywords if not WORD_PATTERN.fullmatch(k))
+            )
+            for category, keywords in self.legal_keywords.items()
+        }
+        
         # Citation patterns for legal accuracy
         self.citation_patterns = {
             'article': r'artigo\s+(\d+(?:-\d+)?)\s*[º°]?',
@@ -153,7 +186,8 @@ class QualityScoringEngine:
             'aquele', 'aquela', 'aqueles', 'aquelas', 'todo', 'toda', 'todos', 'todas'
         ]
 
-    def calculate_comprehensive_quality_score(self, document: LegalDocument) -> QualityMetrics:
+    def calculate_comprehensive_quality_score(self, document: LegalDocument,
+                                              today: Optional[date] = None) -> QualityMetrics:
         """
         Calculates a comprehensive quality score for a given legal document by aggregating
         scores from various sub-assessments. Each sub-assessment evaluates a specific aspect
@@ -161,6 +195,8 @@ class QualityScoringEngine:
         
         Args:
             document: The LegalDocument object for which to calculate the quality score.
+            today: Reference date for freshness scoring; batch callers compute it once
+                   and pass it in (defaults to the current date).
             
         Returns:
             A QualityMetrics object containing the overall score and a breakdown of
@@ -168,9 +204,12 @@ class QualityScoringEngine:
         """
         logger.info(f"Calculating quality score for document: {document.title}")
         
+        # Stripped content length is shared by content quality and completeness checks
+        stripped_length = len(document.extracted_text.strip()) if document.extracted_text else 0
+        
         # 1. Content quality assessment: Evaluates the structural integrity, length,
         #    and linguistic quality of the document's text.
-        content_quality = self._assess_content_quality(document.extracted_text)
+        content_quality = self._assess_content_quality(document.extracted_text, stripped_length)
         
         # 2. Legal relevance scoring: Determines how pertinent the document's content is
         #    to the domain of traffic fine defense, based on keyword analysis.
@@ -182,11 +221,11 @@ class QualityScoringEngine:
         
         # 4. Freshness scoring: Evaluates the recency of the document, as legal validity
         #    can be time-sensitive.
-        freshness_score = self._assess_freshness_score(document.publication_date)
+        freshness_score = self._assess_freshness_score(document.publication_date, today)
         
         # 5. Completeness scoring: Checks if essential metadata (title, URL, date, etc.)
         #    is present, indicating a well-formed and usable document.
-        completeness_score = self._assess_completeness(document)
+        completeness_score = self._assess_completeness(document, stripped_length)
         
         # 6. Legal accuracy scoring: Analyzes the presence and proper formatting of
         #    legal citations and references within the text.
@@ -234,13 +273,14 @@ class QualityScoringEngine:
         
         return metrics
 
-    def _assess_content_quality(self, content: str) -> float:
+    def _assess_content_quality(self, content: str, stripped_length: Optional[int] = None) -> float:
         """
         Assesses the quality of the document's content based on its length,
         the presence of structural legal elements, and typical Portuguese legal phrasing.
         
         Args:
             content: The extracted text content of the legal document.
+            stripped_length: Precomputed length of the stripped content, if available.
             
         Returns:
             A float score between 0.0 and 1.0 representing content quality.
@@ -253,7 +293,7 @@ class QualityScoringEngine:
         # 1. Length quality (40% contribution to content quality)
         # Documents within a certain length range are considered more complete and informative.
         length_score = 0.0
-        content_length = len(content.strip())
+        content_length = stripped_length if stripped_length is not None else len(content.strip())
         
         if 500 <= content_length <= 5000: # Optimal length range
             length_score = 1.0
@@ -318,19 +358,19 @@ class QualityScoringEngine:
         if total_words == 0:
             return 0.0
         
+        # Tokenize once so single-word keywords are O(1) set lookups
+        word_set = set(WORD_PATTERN.findall(content_lower))
+        
         # 1. Primary keywords (highest weight): Directly related to traffic fines and violations.
-        primary_matches = sum(1 for keyword in self.legal_keywords['primary'] 
-                            if keyword in content_lower)
+        primary_matches = self._count_keyword_matches('primary', word_set, content_lower)
         primary_score = min(1.0, primary_matches * 0.2) # Each match contributes, capped at 1.0
         
         # 2. Secondary keywords: Related to legal authority, enforcement, and safety.
-        secondary_matches = sum(1 for keyword in self.legal_keywords['secondary'] 
-                              if keyword in content_lower)
+        secondary_matches = self._count_keyword_matches('secondary', word_set, content_lower)
         secondary_score = min(0.8, secondary_matches * 0.15) # Capped at 0.8
         
         # 3. Procedural keywords: Related to legal processes, notifications, and appeals.
-        procedural_matches = sum(1 for keyword in self.legal_keywords['procedural'] 
-                               if keyword in content_lower)
+        procedural_matches = self._count_keyword_matches('procedural', word_set, content_lower)
         procedural_score = min(0.6, procedural_matches * 0.1) # Capped at 0.6
         
         # Calculate keyword density: The proportion of relevant keywords in the document.
@@ -343,6 +383,12 @@ class QualityScoringEngine:
         return (primary_score * 0.5 + secondary_score * 0.3 + 
                 procedural_score * 0.1 + density_score * 0.1)
 
+    def _count_keyword_matches(self, category: str, word_set: set, content_lower: str) -> int:
+        """Count keywords of a category present in the content."""
+        single_words, multi_words = self._keyword_groups[category]
+        return (len(single_words & word_set) +
+                sum(1 for keyword in multi_words if keyword in content_lower))
+
     def _assess_authority_score(self, source: str) -> float:
         """Assess document authority based on source reliability."""
         source_lower = source.lower()
@@ -354,12 +400,13 @@ class QualityScoringEngine:
         # Default authority for unknown sources
         return 0.3
 
-    def _assess_freshness_score(self, publication_date: Optional[date]) -> float:
+    def _assess_freshness_score(self, publication_date: Optional[date],
+                                today: Optional[date] = None) -> float:
         """Assess document freshness based on publication date."""
         if not publication_date:
             return 0.3  # Default for documents without dates
         
-        days_old = (datetime.now().date() - publication_date).days
+        days_old = ((today or date.today()) - publication_date).days
         
         # Freshness scoring based on legal document lifecycle
         if days_old <= 365:    # Within 1 year = highest freshness
@@ -373,8 +420,11 @@ class QualityScoringEngine:
         else:                   # Over 10 years = very low freshness
             return 0.2
 
-    def _assess_completeness(self, document: LegalDocument) -> float:
+    def _assess_completeness(self, document: LegalDocument, stripped_length: Optional[int] = None) -> float:
         """Assess document completeness based on metadata and content."""
+        if stripped_length is None:
+            stripped_length = len(document.extracted_text.strip()) if document.extracted_text else 0
+        
         score = 0.0
         
         # Title completeness
@@ -398,7 +448,7 @@ class QualityScoringEngine:
             score += 0.1
         
         # Content completeness (already assessed in content quality)
-        if document.extracted_text and len(document.extracted_text.strip()) > 200:
+        if stripped_length > 200:
             score += 0.3
         
         return min(1.0, score)
@@ -406,7 +456,8 @@ class QualityScoringEngine:
     def _assess_legal_accuracy(self, content: str) -> float:
         """
         Assesses the legal accuracy of the document by analyzing the presence and
-        correct formatting of legal citations and references.
+        correct formatting of legal citations and references. Only the first
+        CITATION_SCAN_LIMIT characters are scanned to bound work on large documents.
         
         Args:
             content: The extracted text content of the legal document.
@@ -417,6 +468,8 @@ class QualityScoringEngine:
         if not content:
             return 0.0
         
+        if len(content) > CITATION_SCAN_LIMIT:
+            content = content[:CITATION_SCAN_LIMIT]
         content_lower = content.lower()
         accuracy_score = 0.0
         
@@ -485,9 +538,10 @@ class QualityScoringEngine:
         filtered_out = []
         
         quality_scores = []
+        today = date.today()
         
         for doc in documents:
-            metrics = self.calculate_comprehensive_quality_score(doc)
+            metrics = self.calculate_comprehensive_quality_score(doc, today)
             
             # Update document with new quality score
             doc.quality_score = metrics.overall_score
@@ -539,9 +593,10 @@ class QualityScoringEngine:
     def save_quality_scores_to_database(self, documents: List[LegalDocument]) -> None:
         """Save calculated quality scores to database."""
         db = self.SessionLocal()
+        today = date.today()
         try:
             for doc in documents:
-                metrics = self.calculate_comprehensive_quality_score(doc)
+                metrics = self.calculate_comprehensive_quality_score(doc, today)
                 
                 # Update document in database
                 db_doc = db.query(LegalDocument).filter(LegalDocument.id == doc.id).first()
@@ -561,7 +616,13 @@ class QualityScoringEngine:
             db.close()
 
     def batch_quality_assessment(self, batch_size: int = 100) -> Dict[str, Any]:
-        """Perform batch quality assessment on all documents in database."""
+        """
+        Perform batch quality assessment on all documents in database.
+        
+        Documents are fetched as plain column tuples and scored in a process pool,
+        since scoring is CPU-bound and independent per document. Score updates are
+        applied in this process with a bulk update per batch.
+        """
         logger.info("Starting batch quality assessment")
         
         db = self.SessionLocal()
@@ -570,41 +631,44 @@ class QualityScoringEngine:
             total_docs = db.query(LegalDocument).count()
             logger.info(f"Found {total_docs} documents for quality assessment")
             
-            processed_docs = []
+            scoring_columns = (
+                LegalDocument.id, LegalDocument.title, LegalDocument.source_url,
+                LegalDocument.publication_date, LegalDocument.jurisdiction,
+                LegalDocument.document_type, LegalDocument.extracted_text
+            )
+            processed_scores = []
             batch_count = 0
             
-            # Process in batches
-            for offset in range(0, total_docs, batch_size):
-                batch_count += 1
-                logger.info(f"Processing batch {batch_count} (offset {offset})")
-                
-                documents = db.query(LegalDocument).offset(offset).limit(batch_size).all()
-                
-                for doc in documents:
-                    metrics = self.calculate_comprehensive_quality_score(doc)
+            with ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                     initializer=_init_scoring_worker,
+                                     initargs=(self.database_url, date.today())) as executor:
+                # Process in batches
+                for offset in range(0, total_docs, batch_size):
+                    batch_count += 1
+                    logger.info(f"Processing batch {batch_count} (offset {offset})")
                     
-                    # Update document
-                    doc.quality_score = metrics.overall_score
-                    doc.relevance_score = metrics.relevance_score
-                    doc.freshness_score = metrics.freshness_score
-                    doc.authority_score = metrics.authority_score
+                    rows = [tuple(row) for row in db.query(*scoring_columns)
+                            .order_by(LegalDocument.id).offset(offset).limit(batch_size).all()]
                     
-                    processed_docs.append(doc)
-                
-                # Commit batch
-                db.commit()
+                    results = list(executor.map(_score_row, rows, chunksize=64))
+                    
+                    # Commit batch
+                    db.bulk_update_mappings(LegalDocument, results)
+                    db.commit()
+                    
+                    processed_scores.extend(result['quality_score'] for result in results)
             
             # Generate quality report
-            quality_distribution = self._analyze_quality_distribution(processed_docs)
+            quality_distribution = self._summarize_quality_scores(processed_scores)
             
             report = {
-                'total_documents_processed': len(processed_docs),
+                'total_documents_processed': len(processed_scores),
                 'quality_distribution': quality_distribution,
-                'average_quality_score': np.mean([doc.quality_score for doc in processed_docs]),
+                'average_quality_score': np.mean(processed_scores),
                 'processing_date': datetime.now().isoformat()
             }
             
-            logger.info(f"Batch quality assessment completed: {len(processed_docs)} documents processed")
+            logger.info(f"Batch quality assessment completed: {len(processed_scores)} documents processed")
             
             return report
             
@@ -617,24 +681,41 @@ class QualityScoringEngine:
 
     def _analyze_quality_distribution(self, documents: List[LegalDocument]) -> Dict[str, Any]:
         """Analyze quality score distribution across documents."""
-        if not documents:
+        return self._summarize_quality_scores(
+            np.fromiter((doc.quality_score for doc in documents), dtype=np.float64, count=len(documents))
+        )
+
+    def _summarize_quality_scores(self, scores) -> Dict[str, Any]:
+        """Summarize a sequence of quality scores into distribution statistics."""
+        scores = np.asarray(scores, dtype=np.float64)
+        n = scores.size
+        if n == 0:
             return {}
         
-        scores = [doc.quality_score for doc in documents]
+        # Quartiles from a single partition, using the same linear interpolation
+        # as np.percentile: each quantile sits between two neighbouring order statistics
+        positions = np.array([0.25, 0.5, 0.75]) * (n - 1)
+        lower = np.floor(positions).astype(np.intp)
+        upper = np.ceil(positions).astype(np.intp)
+        partitioned = np.partition(scores, np.unique(np.concatenate((lower, upper))))
+        p25, median, p75 = partitioned[lower] + (partitioned[upper] - partitioned[lower]) * (positions - lower)
+        
+        high = self.quality_thresholds['high']
+        medium = self.quality_thresholds['medium']
         
         distribution = {
-            'total': len(scores),
-            'high_quality': len([s for s in scores if s >= self.quality_thresholds['high']]),
-            'medium_quality': len([s for s in scores if self.quality_thresholds['medium'] <= s < self.quality_thresholds['high']]),
-            'low_quality': len([s for s in scores if s < self.quality_thresholds['medium']]),
+            'total': n,
+            'high_quality': int(np.count_nonzero(scores >= high)),
+            'medium_quality': int(np.count_nonzero((scores >= medium) & (scores < high))),
+            'low_quality': int(np.count_nonzero(scores < medium)),
             'statistics': {
-                'mean': np.mean(scores),
-                'median': np.median(scores),
-                'std': np.std(scores),
-                'min': np.min(scores),
-                'max': np.max(scores),
-                'percentile_25': np.percentile(scores, 25),
-                'percentile_75': np.percentile(scores, 75)
+                'mean': scores.mean(),
+                'median': median,
+                'std': scores.std(),
+                'min': scores.min(),
+                'max': scores.max(),
+                'percentile_25': p25,
+                'percentile_75': p75
             }
         }
         
@@ -657,20 +738,22 @@ class QualityScoringEngine:
         """
         logger.info(f"Processing {len(feedback_data)} feedback entries for continuous learning")
         
-        # 1. Analyze feedback patterns: Categorize feedback into positive/negative
-        #    and calculate average quality scores for each category.
-        feedback_analysis = self._analyze_feedback_patterns(feedback_data)
-        
-        # 2. Update quality thresholds: Adjust the 'high', 'medium', and 'low' quality
-        #    thresholds based on the insights from user feedback. This makes the system
-        #    more aligned with user perception of quality.
-        updated_thresholds = self._update_quality_thresholds(feedback_analysis)
-        
-        # 3. Update feature weights: (Placeholder for a more advanced ML-driven approach)
-        #    In a production system, this step would involve training a machine learning
-        #    model to adjust the weights of different quality features based on how
-        #    they correlate with positive or negative user feedback.
-        updated_weights = self._update_feature_weights(feedback_data)
+        # One session spans the whole update so the connection is checked out once.
+        with self.SessionLocal() as db:
+            # 1. Analyze feedback patterns: Categorize feedback into positive/negative
+            #    and calculate average quality scores for each category.
+            feedback_analysis = self._analyze_feedback_patterns(feedback_data, db)
+            
+            # 2. Update quality thresholds: Adjust the 'high', 'medium', and 'low' quality
+            #    thresholds based on the insights from user feedback. This makes the system
+            #    more aligned with user perception of quality.
+            updated_thresholds = self._update_quality_thresholds(feedback_analysis)
+            
+            # 3. Update feature weights: (Placeholder for a more advanced ML-driven approach)
+            #    In a production system, this step would involve training a machine learning
+            #    model to adjust the weights of different quality features based on how
+            #    they correlate with positive or negative user feedback.
+            updated_weights = self._update_feature_weights(feedback_data, db)
         
         # Compile statistics about the learning update.
         learning_stats = {
@@ -685,35 +768,42 @@ class QualityScoringEngine:
         
         return learning_stats
 
-    def _analyze_feedback_patterns(self, feedback_data: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Analyze patterns in user feedback."""
-        positive_ratings = [f for f in feedback_data if f.get('rating', 0) >= 4]
-        negative_ratings = [f for f in feedback_data if f.get('rating', 0) <= 2]
+    def _analyze_feedback_patterns(self, feedback_data: List[Dict[str, Any]],
+                                   db: Optional[Session] = None) -> Dict[str, Any]:
+        """Analyze patterns in user feedback, using the given session if provided."""
+        count = len(feedback_data)
+        ratings = np.fromiter((f.get('rating', 0) for f in feedback_data), dtype=np.float64, count=count)
         
-        # Analyze quality scores of positively/negatively rated documents
-        positive_scores = []
-        negative_scores = []
+        doc_ids = [f['document_id'] for f in feedback_data if f.get('document_id')]
         
-        db = self.SessionLocal()
+        owns_session = db is None
+        db = db or self.SessionLocal()
         try:
-            for feedback in feedback_data:
-                doc_id = feedback.get('document_id')
-                if doc_id:
-                    doc = db.query(LegalDocument).filter(LegalDocument.id == doc_id).first()
-                    if doc:
-                        if feedback.get('rating', 0) >= 4:
-                            positive_scores.append(doc.quality_score)
-                        else:
-                            negative_scores.append(doc.quality_score)
+            # Fetch all referenced scores in one round trip instead of one query per feedback
+            stmt = select(LegalDocument.id, LegalDocument.quality_score).where(LegalDocument.id.in_(doc_ids))
+            score_by_id = dict(db.execute(stmt).all()) if doc_ids else {}
         finally:
-            db.close()
+            if owns_session:
+                db.close()
+        
+        # Analyze quality scores of positively/negatively rated documents; feedback
+        # without a matching scored document is NaN and excluded by the masks
+        scores = np.fromiter(
+            (score_by_id.get(f.get('document_id'), np.nan) for f in feedback_data),
+            dtype=np.float64, count=count
+        )
+        scored = ~np.isnan(scores)
+        positive_mask = (ratings >= 4) & scored
+        negative_mask = (ratings < 4) & scored
+        positive_count = int(np.count_nonzero(positive_mask))
+        negative_count = int(np.count_nonzero(negative_mask))
         
         analysis = {
-            'positive_feedback_count': len(positive_ratings),
-            'negative_feedback_count': len(negative_ratings),
-            'positive_documents_avg_quality': np.mean(positive_scores) if positive_scores else 0,
-            'negative_documents_avg_quality': np.mean(negative_scores) if negative_scores else 0,
-            'quality_threshold_feedback_ratio': len(positive_scores) / len(negative_scores) if negative_scores else float('inf')
+            'positive_feedback_count': int(np.count_nonzero(ratings >= 4)),
+            'negative_feedback_count': int(np.count_nonzero(ratings <= 2)),
+            'positive_documents_avg_quality': float(scores[positive_mask].mean()) if positive_count else 0,
+            'negative_documents_avg_quality': float(scores[negative_mask].mean()) if negative_count else 0,
+            'quality_threshold_feedback_ratio': positive_count / negative_count if negative_count else float('inf')
         }
         
         return analysis
@@ -724,17 +814,19 @@ class QualityScoringEngine:
         positive_avg = feedback_analysis.get('positive_documents_avg_quality', 0.7)
         negative_avg = feedback_analysis.get('negative_documents_avg_quality', 0.4)
         
-        # Adjust thresholds based on feedback
-        # High threshold should be slightly below average of positively rated documents
-        new_high_threshold = max(0.7, min(0.9, positive_avg * 0.9))
-        
-        # Medium threshold should be between high and low
-        new_medium_threshold = max(0.5, min(0.7, (positive_avg + negative_avg) / 2))
+        # Adjust thresholds based on feedback, clamping every tier in one vector op:
+        # - high sits slightly below the average of positively rated documents
+        # - medium sits between positive and negative averages
+        new_high_threshold, new_medium_threshold = np.clip(
+            [positive_avg * 0.9, (positive_avg + negative_avg) / 2],
+            [0.7, 0.5],
+            [0.9, 0.7]
+        )
         
         updated_thresholds = {
-            'high': new_high_threshold,
-            'medium': new_medium_threshold,
-            'low': max(0.3, new_medium_threshold * 0.7)
+            'high': float(new_high_threshold),
+            'medium': float(new_medium_threshold),
+            'low': float(max(0.3, new_medium_threshold * 0.7))
         }
         
         # Update instance thresholds
@@ -742,45 +834,100 @@ class QualityScoringEngine:
         
         return updated_thresholds
 
-    def _update_feature_weights(self, feedback_data: List[Dict[str, Any]]) -> Dict[str, float]:
-        """Update feature weights based on feedback."""
+    def _update_feature_weights(self, feedback_data: List[Dict[str, Any]],
+                                db: Optional[Session] = None) -> Dict[str, float]:
+        """Update feature weights based on feedback, using the given session if provided."""
         # This is a simplified approach - in production, use machine learning
         # For now, adjust weights slightly based on document success patterns
         
-        db = self.SessionLocal()
+        successful_docs = []
+        unsuccessful_docs = []
+        
+        # Only clearly positive/negative feedback is compared, and only on the score
+        # columns, so fetch just those rows without full ORM hydration
+        doc_ids = list({
+            f['document_id'] for f in feedback_data
+            if f.get('document_id') and not 2 < f.get('rating', 0) < 4
+        })
+        owns_session = db is None
+        db = db or self.SessionLocal()
         try:
-            successful_docs = []
-            unsuccessful_docs = []
-            
-            for feedback in feedback_data:
-                doc_id = feedback.get('document_id')
-                if doc_id and feedback.get('rating', 0) >= 4:
-                    doc = db.query(LegalDocument).filter(LegalDocument.id == doc_id).first()
-                    if doc:
-                        successful_docs.append(doc)
-                elif doc_id and feedback.get('rating', 0) <= 2:
-                    doc = db.query(LegalDocument).filter(LegalDocument.id == doc_id).first()
-                    if doc:
-                        unsuccessful_docs.append(doc)
-            
-            # Analyze differences between successful and unsuccessful documents
-            if successful_docs and unsuccessful_docs:
-                # Adjust weights based on patterns
-                # This is a simplified heuristic approach
-                pass  # In a full implementation, use ML models here
-            
-            return self.feature_weights.copy()
-            
+            stmt = select(
+                LegalDocument.id, LegalDocument.quality_score, LegalDocument.relevance_score,
+                LegalDocument.freshness_score, LegalDocument.authority_score
+            ).where(LegalDocument.id.in_(doc_ids))
+            docs_by_id = {row.id: row for row in db.execute(stmt).all()} if doc_ids else {}
         finally:
-            db.close()
+            if owns_session:
+                db.close()
+        
+        for feedback in feedback_data:
+            doc = docs_by_id.get(feedback.get('document_id'))
+            if doc is None:
+                continue
+            rating = feedback.get('rating', 0)
+            if rating >= 4:
+                successful_docs.append(doc)
+            elif rating <= 2:
+                unsuccessful_docs.append(doc)
+        
+        # Analyze differences between successful and unsuccessful documents
+        if successful_docs and unsuccessful_docs:
+            # Adjust weights based on patterns
+            # This is a simplified heuristic approach
+            pass  # In a full implementation, use ML models here
+        
+        return self.feature_weights.copy()
+
+# Per-process engine and reference date used by the batch assessment worker pool
+_worker_engine: Optional[QualityScoringEngine] = None
+_worker_today: Optional[date] = None
+
+def _init_scoring_worker(database_url: str, today: date) -> None:
+    """Create the scoring engine once per worker process."""
+    global _worker_engine, _worker_today
+    _worker_engine = QualityScoringEngine(database_url)
+    _worker_today = today
+
+def _score_row(row: Tuple) -> Dict[str, Any]:
+    """
+    Score a single document row in a worker process.
+    
+    Args:
+        row: (id, title, source_url, publication_date, jurisdiction,
+              document_type, extracted_text) column tuple
+        
+    Returns:
+        Update mapping for LegalDocument with the calculated scores
+    """
+    doc_id, title, source_url, publication_date, jurisdiction, document_type, extracted_text = row
+    # LegalDocument has no dedicated source column; the URL carries the source name
+    document = DocumentSnapshot(
+        id=doc_id,
+        title=title,
+        source=source_url or '',
+        source_url=source_url,
+        publication_date=publication_date,
+        jurisdiction=jurisdiction,
+        document_type=document_type,
+        extracted_text=extracted_text
+    )
+    metrics = _worker_engine.calculate_comprehensive_quality_score(document, _worker_today)
+    
+    return {
+        'id': doc_id,
+        'quality_score': metrics.overall_score,
+        'relevance_score': metrics.relevance_score,
+        'freshness_score': metrics.freshness_score,
+        'authority_score': metrics.authority_score
+    }
 
 if __name__ == "__main__":
     # Example usage
     quality_engine = QualityScoringEngine()
     
     # Get documents from database
-    db = quality_engine.SessionLocal()
-    try:
+    with quality_engine.SessionLocal() as db:
         documents = db.query(LegalDocument).limit(10).all()
         
         # Perform quality assessment
@@ -797,6 +944,3 @@ if __name__ == "__main__":
         quality_engine.save_quality_scores_to_database(documents)
         
         print("Quality scoring completed!")
-        
-    finally:
-        db.close()
\ No newline at end of file
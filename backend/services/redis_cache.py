@@ -3,16 +3,50 @@ Redis Caching Implementation for FineHero Phase 3.
 Simple and effective caching for legal documents and frequently accessed data.
 """
 import os
+import atexit
+import hashlib
 import json
 import logging
 import pickle
-from typing import Any, Optional, Dict, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional, Dict, List, Tuple
 from datetime import datetime, timedelta
+import msgpack
+import orjson
 import redis
+import redis.asyncio as aioredis
+from cachetools import TTLCache
 from functools import wraps
 
 logger = logging.getLogger(__name__)
 
+# Number of commands buffered in a pipeline before each round trip
+PIPELINE_CHUNK_SIZE = 1000
+
+# Keys requested per SCAN call when iterating patterns
+SCAN_COUNT = 500
+
+# One-byte format tags prefixed to every stored value
+MSGPACK_TAG = b"\x01"
+PICKLE_TAG = b"\x02"
+JSON_TAG = b"\x03"
+
+# Value types stored as JSON (or MessagePack when not JSON-serializable);
+# everything else is pickled
+STRUCTURED_TYPES = frozenset((dict, list))
+
+# Reconnect backoff after a connection failure, in seconds
+RECONNECT_BASE_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+# Connection pool size for the asyncio client shared by request handlers
+ASYNC_MAX_CONNECTIONS = int(os.getenv("REDIS_ASYNC_MAX_CONNECTIONS", "50"))
+
+# Errors that mean the Redis connection is gone rather than a bad command
+CONNECTION_ERRORS = (redis.ConnectionError, redis.TimeoutError)
+
 class RedisCache:
     """
     Simple Redis caching implementation for FineHero.
@@ -32,7 +66,17 @@ class RedisCache:
         self.fines_cache_ttl = int(os.getenv("FINES_CACHE_TTL", "1800"))  # 30 minutes
         
         self._client = None
+        self._reconnect_delay = RECONNECT_BASE_DELAY
+        self._next_reconnect_at = 0.0
         self._connect()
+        
+        self._aclient = None
+        self._async_retry_at = 0.0
+        self._connect_async()
+        
+        # Background writers for fire-and-forget cache writes
+        self._write_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="redis-cache-writer")
+        atexit.register(self._write_pool.shutdown)
     
     def _connect(self):
         """Connect to Redis."""
@@ -41,8 +85,7 @@ class RedisCache:
                 # Use URL for cloud Redis services
                 self._client = redis.from_url(
                     self.redis_url,
-                    encoding='utf-8',
-                    decode_responses=True
+                    decode_responses=False
                 )
             else:
                 # Use individual connection parameters
@@ -51,31 +94,86 @@ class RedisCache:
                     port=self.redis_port,
                     password=self.redis_password if self.redis_password else None,
                     db=self.redis_db,
-                    decode_responses=True,
+                    decode_responses=False,
                     socket_connect_timeout=5,
                     socket_timeout=5
                 )
             
             # Test connection
             self._client.ping()
+            self._reconnect_delay = RECONNECT_BASE_DELAY
             logger.info("Redis connection established successfully")
             
         except redis.ConnectionError:
             logger.warning("Redis connection failed - caching disabled")
-            self._client = None
+            self._schedule_reconnect()
         except Exception as e:
             logger.error(f"Redis connection error: {e}")
-            self._client = None
+            self._schedule_reconnect()
+    
+    def _connect_async(self):
+        """Create the asyncio client; connections are opened lazily by its pool."""
+        try:
+            if self.redis_url:
+                self._aclient = aioredis.from_url(
+                    self.redis_url,
+                    decode_responses=False,
+                    max_connections=ASYNC_MAX_CONNECTIONS
+                )
+            else:
+                self._aclient = aioredis.Redis(
+                    host=self.redis_host,
+                    port=self.redis_port,
+                    password=self.redis_password if self.redis_password else None,
+                    db=self.redis_db,
+                    decode_responses=False,
+                    socket_connect_timeout=5,
+                    socket_timeout=5,
+                    max_connections=ASYNC_MAX_CONNECTIONS
+                )
+        except Exception as e:
+            logger.error(f"Async Redis client error: {e}")
+            self._aclient = None
+    
+    def _schedule_reconnect(self):
+        """Drop the client and back off exponentially before the next connect attempt."""
+        self._client = None
+        self._next_reconnect_at = time.monotonic() + self._reconnect_delay
+        self._reconnect_delay = min(self._reconnect_delay * 2, RECONNECT_MAX_DELAY)
+    
+    def _handle_connection_error(self, operation: str, error: Exception):
+        """Mark the cache disconnected after a failed command."""
+        logger.warning(f"Redis connection lost during {operation}: {error} - caching disabled")
+        self._schedule_reconnect()
     
     def is_connected(self) -> bool:
-        """Check if Redis is connected."""
-        if not self._client:
+        """
+        Check if Redis is connected.
+        
+        Does not PING: the connection is assumed healthy until a command fails,
+        after which a reconnect is attempted once the backoff delay has passed.
+        """
+        if self._client is None and time.monotonic() >= self._next_reconnect_at:
+            self._connect()
+        return self._client is not None
+    
+    def ping(self) -> bool:
+        """
+        Health check that round-trips a PING to Redis.
+        
+        Unlike is_connected, this notices an outage before a cache command
+        fails; on failure the client is dropped and a reconnect is scheduled.
+        """
+        if not self.is_connected():
             return False
         
         try:
-            self._client.ping()
-            return True
-        except:
+            return bool(self._client.ping())
+        except CONNECTION_ERRORS as e:
+            self._handle_connection_error("ping", e)
+            return False
+        except Exception as e:
+            logger.error(f"Cache ping error: {e}")
             return False
     
     def get(self, key: str) -> Optional[Any]:
@@ -88,43 +186,133 @@ class RedisCache:
             if value is None:
                 return None
             
-            # Try to deserialize as JSON first, then pickle
-            try:
-                return json.loads(value)
-            except (json.JSONDecodeError, TypeError):
-                try:
-                    return pickle.loads(value.encode('latin-1'))
-                except:
-                    return value
+            return self._deserialize(value)
                     
+        except CONNECTION_ERRORS as e:
+            self._handle_connection_error("get", e)
+            return None
         except Exception as e:
             logger.error(f"Cache get error for key {key}: {e}")
             return None
     
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Get many values from cache in a single MGET round trip.
+        
+        Returns:
+            Mapping of key to value for the keys that were found
+        """
+        if not self.is_connected() or not keys:
+            return {}
+        
+        try:
+            values = self._client.mget(keys)
+            return {
+                key: self._deserialize(value)
+                for key, value in zip(keys, values) if value is not None
+            }
+        except CONNECTION_ERRORS as e:
+            self._handle_connection_error("get_many", e)
+            return {}
+        except Exception as e:
+            logger.error(f"Cache get_many error for {len(keys)} keys: {e}")
+            return {}
+    
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """Set value in cache."""
         if not self.is_connected():
             return False
         
         try:
-            # Serialize value
-            if isinstance(value, (dict, list)):
-                serialized_value = json.dumps(value, default=str)
-            else:
-                serialized_value = pickle.dumps(value)
-            
-            # Set with TTL
-            if ttl:
-                result = self._client.setex(key, ttl, serialized_value)
-            else:
-                result = self._client.set(key, serialized_value)
-            
-            return result
+            # Single SET command; EX is omitted when no TTL is given
+            return self._client.set(key, self._serialize(value), ex=ttl or None)
             
+        except CONNECTION_ERRORS as e:
+            self._handle_connection_error("set", e)
+            return False
         except Exception as e:
             logger.error(f"Cache set error for key {key}: {e}")
             return False
     
+    def set_background(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        """
+        Queue a cache write without waiting for the Redis acknowledgement.
+        
+        Returns:
+            True if the write was queued
+        """
+        if not self.is_connected():
+            return False
+        
+        try:
+            self._write_pool.submit(self.set, key, value, ttl)
+            return True
+        except RuntimeError as e:
+            # Raised once the writer pool has been shut down at interpreter exit
+            logger.error(f"Cache background set error for key {key}: {e}")
+            return False
+    
+    def mset_many(self, items: List[Tuple[str, Any, Optional[int]]]) -> int:
+        """
+        Set many values in cache using pipelined round trips.
+        
+        Args:
+            items: (key, value, ttl) tuples; a falsy ttl stores without expiry
+            
+        Returns:
+            Number of values stored
+        """
+        if not self.is_connected() or not items:
+            return 0
+        
+        stored = 0
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for start in range(0, len(items), PIPELINE_CHUNK_SIZE):
+                for key, value, ttl in items[start:start + PIPELINE_CHUNK_SIZE]:
+                    pipe.set(key, self._serialize(value), ex=ttl or None)
+                stored += sum(1 for result in pipe.execute() if result)
+            return stored
+        except CONNECTION_ERRORS as e:
+            self._handle_connection_error("mset_many", e)
+            return stored
+        except Exception as e:
+            logger.error(f"Cache pipelined set error after {stored} keys: {e}")
+            return stored
+    
+    def _serialize(self, value: Any) -> bytes:
+        """Serialize a value for storage, prefixed with its format tag."""
+        # Exact-type set lookup; dict/list subclasses are pickled so they round-trip as-is
+        if type(value) in STRUCTURED_TYPES:
+            try:
+                return JSON_TAG + orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                # Bytes, oversized integers and custom objects are not JSON-serializable
+                return MSGPACK_TAG + msgpack.packb(value, use_bin_type=True, default=str)
+        return PICKLE_TAG + pickle.dumps(value)
+    
+    def _deserialize(self, value: bytes) -> Any:
+        """Deserialize a stored value by dispatching on its format tag."""
+        tag = value[:1]
+        if tag == JSON_TAG:
+            return orjson.loads(value[1:])
+        if tag == MSGPACK_TAG:
+            return msgpack.unpackb(value[1:], raw=False, strict_map_key=False)
+        if tag == PICKLE_TAG:
+            return pickle.loads(value[1:])
+        
+        # Untagged values were written as JSON text before the tagged format.
+        # Decode strictly so binary payloads come back as the original bytes
+        # instead of being mangled by a lossy text round trip.
+        try:
+            text = value.decode('utf-8')
+        except UnicodeDecodeError:
+            return value
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text
+    
     def delete(self, key: str) -> bool:
         """Delete value from cache."""
         if not self.is_connected():
@@ -132,24 +320,57 @@ class RedisCache:
         
         try:
             return bool(self._client.delete(key))
+        except CONNECTION_ERRORS as e:
+            self._handle_connection_error("delete", e)
+            return False
         except Exception as e:
             logger.error(f"Cache delete error for key {key}: {e}")
             return False
     
     def delete_pattern(self, pattern: str) -> int:
-        """Delete all keys matching pattern."""
+        """
+        Delete all keys matching pattern.
+        
+        Uses incremental SCAN instead of KEYS so the server is never blocked
+        walking the whole keyspace; deletes are pipelined in chunks.
+        """
         if not self.is_connected():
             return 0
         
         try:
-            keys = self._client.keys(pattern)
-            if keys:
-                return self._client.delete(*keys)
+            deleted = 0
+            pending = 0
+            pipe = self._client.pipeline(transaction=False)
+            for key in self._client.scan_iter(match=pattern, count=SCAN_COUNT):
+                pipe.delete(key)
+                pending += 1
+                if pending >= PIPELINE_CHUNK_SIZE:
+                    deleted += sum(pipe.execute())
+                    pending = 0
+            if pending:
+                deleted += sum(pipe.execute())
+            return deleted
+        except CONNECTION_ERRORS as e:
+            self._handle_connection_error("delete_pattern", e)
             return 0
         except Exception as e:
             logger.error(f"Cache pattern delete error for pattern {pattern}: {e}")
             return 0
     
+    def count_pattern(self, pattern: str) -> int:
+        """Count keys matching pattern without modifying them."""
+        if not self.is_connected():
+            return 0
+        
+        try:
+            return sum(1 for _ in self._client.scan_iter(match=pattern, count=SCAN_COUNT))
+        except CONNECTION_ERRORS as e:
+            self._handle_connection_error("count_pattern", e)
+            return 0
+        except Exception as e:
+            logger.error(f"Cache pattern count error for pattern {pattern}: {e}")
+            return 0
+    
     def exists(self, key: str) -> bool:
         """Check if key exists in cache."""
         if not self.is_connected():
@@ -157,6 +378,9 @@ class RedisCache:
         
         try:
             return bool(self._client.exists(key))
+        except CONNECTION_ERRORS as e:
+            self._handle_connection_error("exists", e)
+            return False
         except Exception as e:
             logger.error(f"Cache exists error for key {key}: {e}")
             return False
@@ -168,10 +392,85 @@ class RedisCache:
         
         try:
             return bool(self._client.flushdb())
+        except CONNECTION_ERRORS as e:
+            self._handle_connection_error("clear_all", e)
+            return False
         except Exception as e:
             logger.error(f"Cache clear error: {e}")
             return False
     
+    def _async_available(self) -> bool:
+        """Check if the asyncio client may be used (no I/O)."""
+        return self._aclient is not None and time.monotonic() >= self._async_retry_at
+    
+    def _handle_async_connection_error(self, operation: str, error: Exception):
+        """Back off the asyncio client after a failed command."""
+        logger.warning(f"Async Redis connection lost during {operation}: {error} - caching disabled")
+        self._async_retry_at = time.monotonic() + RECONNECT_BASE_DELAY
+    
+    async def aget(self, key: str) -> Optional[Any]:
+        """Get value from cache without blocking the event loop."""
+        if not self._async_available():
+            return None
+        
+        try:
+            value = await self._aclient.get(key)
+            if value is None:
+                return None
+            return self._deserialize(value)
+        except CONNECTION_ERRORS as e:
+            self._handle_async_connection_error("aget", e)
+            return None
+        except Exception as e:
+            logger.error(f"Async cache get error for key {key}: {e}")
+            return None
+    
+    async def aget_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Get many values from cache in a single MGET without blocking the event loop."""
+        if not self._async_available() or not keys:
+            return {}
+        
+        try:
+            values = await self._aclient.mget(keys)
+            return {
+                key: self._deserialize(value)
+                for key, value in zip(keys, values) if value is not None
+            }
+        except CONNECTION_ERRORS as e:
+            self._handle_async_connection_error("aget_many", e)
+            return {}
+        except Exception as e:
+            logger.error(f"Async cache get_many error for {len(keys)} keys: {e}")
+            return {}
+    
+    async def aset(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        """Set value in cache without blocking the event loop."""
+        if not self._async_available():
+            return False
+        
+        try:
+            return bool(await self._aclient.set(key, self._serialize(value), ex=ttl or None))
+        except CONNECTION_ERRORS as e:
+            self._handle_async_connection_error("aset", e)
+            return False
+        except Exception as e:
+            logger.error(f"Async cache set error for key {key}: {e}")
+            return False
+    
+    async def adelete(self, key: str) -> bool:
+        """Delete value from cache without blocking the event loop."""
+        if not self._async_available():
+            return False
+        
+        try:
+            return bool(await self._aclient.delete(key))
+        except CONNECTION_ERRORS as e:
+            self._handle_async_connection_error("adelete", e)
+            return False
+        except Exception as e:
+            logger.error(f"Async cache delete error for key {key}: {e}")
+            return False
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics."""
         if not self.is_connected():
@@ -188,6 +487,9 @@ class RedisCache:
                 "keyspace_misses": info.get('keyspace_misses', 0),
                 "hit_rate": self._calculate_hit_rate(info)
             }
+        except CONNECTION_ERRORS as e:
+            self._handle_connection_error("get_stats", e)
+            return {"status": "disconnected"}
         except Exception as e:
             logger.error(f"Cache stats error: {e}")
             return {"status": "error", "error": str(e)}
@@ -242,10 +544,39 @@ class CacheKeys:
     @staticmethod
     def api_response(endpoint: str, params_hash: str) -> str:
         return f"api:{endpoint}:{params_hash}"
+    
+    @staticmethod
+    def stripe_price(price_id: str) -> str:
+        return f"stripe_price:{price_id}"
 
 # Global cache instance
 cache = RedisCache()
 
+# Per-process front cache for hot legal documents, checked before Redis.
+# Disable in deployments where other processes write documents that must be
+# visible immediately (entries only expire after DOCUMENT_L1_CACHE_TTL there).
+# Entries are kept serialized so every hit decodes a private copy for the caller.
+legal_document_l1_enabled = os.getenv("DOCUMENT_L1_CACHE_ENABLED", "true").lower() == "true"
+_legal_document_l1 = TTLCache(
+    maxsize=int(os.getenv("DOCUMENT_L1_CACHE_SIZE", "4096")),
+    ttl=int(os.getenv("DOCUMENT_L1_CACHE_TTL", "300"))
+)
+_legal_document_l1_lock = threading.Lock()
+# Bumped under the lock on every local write or discard; a reader only fills
+# the cache from Redis if no write happened while its fetch was in flight
+_legal_document_l1_generation = 0
+
+def _default_cache_key(func, args: tuple, kwargs: Dict[str, Any]) -> str:
+    """
+    Build a fixed-size cache key for a function call.
+    
+    Arguments are packed into a canonical MessagePack payload and hashed, so
+    keys stay short for large arguments and ("a:b",) cannot collide with ("a", "b").
+    """
+    payload = msgpack.packb((args, sorted(kwargs.items())), use_bin_type=True, default=str)
+    digest = hashlib.blake2b(payload, digest_size=16).hexdigest()
+    return f"{func.__module__}.{func.__qualname__}:{digest}"
+
 # Cache decorator for functions
 def cached(ttl: int = None, key_func=None):
     """
@@ -262,13 +593,7 @@ def cached(ttl: int = None, key_func=None):
             if key_func:
                 cache_key = key_func(*args, **kwargs)
             else:
-                # Default key generation
-                key_parts = [func.__name__]
-                key_parts.extend([str(arg) for arg in args])
-                if kwargs:
-                    sorted_kwargs = sorted(kwargs.items())
-                    key_parts.extend([f"{k}={v}" for k, v in sorted_kwargs])
-                cache_key = ":".join(key_parts)
+                cache_key = _default_cache_key(func, args, kwargs)
             
             # Try to get from cache
             cached_result = cache.get(cache_key)
@@ -290,6 +615,43 @@ def cached(ttl: int = None, key_func=None):
         return wrapper
     return decorator
 
+def async_cached(ttl: int = None, key_func=None):
+    """
+    Decorator to cache coroutine results using the asyncio Redis client.
+    
+    Args:
+        ttl: Time to live in seconds
+        key_func: Function to generate cache key from function args
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            # Generate cache key
+            if key_func:
+                cache_key = key_func(*args, **kwargs)
+            else:
+                cache_key = _default_cache_key(func, args, kwargs)
+            
+            # Try to get from cache
+            cached_result = await cache.aget(cache_key)
+            if cached_result is not None:
+                logger.debug(f"Cache hit for {cache_key}")
+                return cached_result
+            
+            # Execute coroutine and cache result
+            try:
+                result = await func(*args, **kwargs)
+                if result is not None:
+                    await cache.aset(cache_key, result, ttl)
+                    logger.debug(f"Cached result for {cache_key}")
+                return result
+            except Exception as e:
+                logger.error(f"Function {func.__name__} failed: {e}")
+                raise
+        
+        return wrapper
+    return decorator
+
 # Cache management functions for specific entities
 class FineHeroCache:
     """
@@ -298,15 +660,90 @@ class FineHeroCache:
     
     @staticmethod
     def cache_legal_document(document_data: Dict[str, Any], doc_id: str) -> bool:
-        """Cache legal document data."""
+        """Cache legal document data; the Redis write happens off the request path."""
         key = CacheKeys.legal_document(doc_id)
-        return cache.set(key, document_data, cache.document_cache_ttl)
+        queued = cache.set_background(key, document_data, cache.document_cache_ttl)
+        if queued and legal_document_l1_enabled:
+            # Written through so reads in this process never see the value the
+            # queued Redis write is about to replace
+            FineHeroCache._store_local_documents({key: document_data})
+        else:
+            FineHeroCache._discard_local_documents([key])
+        return queued
     
     @staticmethod
     def get_legal_document(doc_id: str) -> Optional[Dict[str, Any]]:
-        """Get cached legal document."""
+        """Get cached legal document, checking the in-process cache before Redis."""
         key = CacheKeys.legal_document(doc_id)
-        return cache.get(key)
+        if not legal_document_l1_enabled:
+            return cache.get(key)
+        
+        with _legal_document_l1_lock:
+            payload = _legal_document_l1.get(key)
+            generation = _legal_document_l1_generation
+        if payload is not None:
+            return cache._deserialize(payload)
+        
+        document = cache.get(key)
+        if document is not None:
+            FineHeroCache._fill_local_documents({key: document}, generation)
+        return document
+    
+    @staticmethod
+    def get_legal_documents(doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get many cached legal documents, fetching local misses with one MGET.
+        
+        Returns:
+            Mapping of document id to cached document for the ids that were found
+        """
+        keys = {doc_id: CacheKeys.legal_document(doc_id) for doc_id in doc_ids}
+        documents = {}
+        
+        if legal_document_l1_enabled:
+            with _legal_document_l1_lock:
+                payloads = {doc_id: _legal_document_l1.get(key) for doc_id, key in keys.items()}
+                generation = _legal_document_l1_generation
+            documents = {
+                doc_id: cache._deserialize(payload)
+                for doc_id, payload in payloads.items() if payload is not None
+            }
+        
+        missing = {key: doc_id for doc_id, key in keys.items() if doc_id not in documents}
+        found = cache.get_many(list(missing))
+        
+        if found and legal_document_l1_enabled:
+            FineHeroCache._fill_local_documents(found, generation)
+        for key, document in found.items():
+            documents[missing[key]] = document
+        
+        return documents
+    
+    @staticmethod
+    def _store_local_documents(documents: Dict[str, Any]) -> None:
+        """Write legal documents to the in-process cache, by cache key."""
+        global _legal_document_l1_generation
+        payloads = {key: cache._serialize(document) for key, document in documents.items()}
+        with _legal_document_l1_lock:
+            _legal_document_l1.update(payloads)
+            _legal_document_l1_generation += 1
+    
+    @staticmethod
+    def _fill_local_documents(documents: Dict[str, Any], generation: int) -> None:
+        """Cache documents read from Redis, unless a local write raced the read."""
+        payloads = {key: cache._serialize(document) for key, document in documents.items()}
+        with _legal_document_l1_lock:
+            if generation == _legal_document_l1_generation:
+                _legal_document_l1.update(payloads)
+    
+    @staticmethod
+    def _discard_local_documents(keys: List[str]) -> None:
+        """Drop legal documents from the in-process cache."""
+        global _legal_document_l1_generation
+        with _legal_document_l1_lock:
+            for key in keys:
+                _legal_document_l1.pop(key, None)
+            _legal_document_l1_generation += 1
     
     @staticmethod
     def cache_fine_data(fine_data: Dict[str, Any], fine_id: str) -> bool:
@@ -320,6 +757,17 @@ class FineHeroCache:
         key = CacheKeys.fine(fine_id)
         return cache.get(key)
     
+    @staticmethod
+    def get_fines_data(fine_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get many cached fines with one MGET round trip.
+        
+        Returns:
+            Mapping of fine id to cached fine data for the ids that were found
+        """
+        keys = {CacheKeys.fine(fine_id): fine_id for fine_id in fine_ids}
+        return {keys[key]: fine for key, fine in cache.get_many(list(keys)).items()}
+    
     @staticmethod
     def invalidate_user_fines(user_hash: str) -> int:
         """Invalidate all cached fines for a user."""
@@ -330,13 +778,21 @@ class FineHeroCache:
     def invalidate_legal_document(doc_id: str) -> bool:
         """Invalidate specific legal document cache."""
         key = CacheKeys.legal_document(doc_id)
-        return cache.delete(key)
+        deleted = cache.delete(key)
+        # Discarded after Redis so a concurrent read cannot refill the old value
+        FineHeroCache._discard_local_documents([key])
+        return deleted
     
     @staticmethod
     def invalidate_legal_documents() -> int:
         """Invalidate all legal documents cache."""
+        global _legal_document_l1_generation
         pattern = "legal_doc:*"
-        return cache.delete_pattern(pattern)
+        deleted = cache.delete_pattern(pattern)
+        with _legal_document_l1_lock:
+            _legal_document_l1.clear()
+            _legal_document_l1_generation += 1
+        return deleted
     
     @staticmethod
     def invalidate_fines() -> int:
@@ -350,11 +806,12 @@ class FineHeroCache:
         if not documents:
             return 0
         
-        count = 0
-        for doc in documents:
-            if 'id' in doc:
-                if FineHeroCache.cache_legal_document(doc, str(doc['id'])):
-                    count += 1
+        items = [
+            (CacheKeys.legal_document(str(doc['id'])), doc, cache.document_cache_ttl)
+            for doc in documents if 'id' in doc
+        ]
+        count = cache.mset_many(items)
+        FineHeroCache._discard_local_documents([key for key, _, _ in items])
         
         logger.info(f"Warmed cache with {count} legal documents")
         return count
@@ -364,12 +821,12 @@ class FineHeroCache:
         """Get comprehensive cache status."""
         stats = cache.get_stats()
         
-        # Add cache patterns information
+        # Add cache patterns information (read-only key counts)
         patterns = {
-            "legal_documents": cache.delete_pattern("legal_doc:*"),
-            "fines": cache.delete_pattern("fines:*"),
-            "user_data": cache.delete_pattern("user:*"),
-            "search_results": cache.delete_pattern("search:*")
+            "legal_documents": cache.count_pattern("legal_doc:*"),
+            "fines": cache.count_pattern("fines:*"),
+            "user_data": cache.count_pattern("user:*"),
+            "search_results": cache.count_pattern("search:*")
         }
         
         return {
@@ -386,5 +843,6 @@ __all__ = [
     "CacheKeys", 
     "FineHeroCache",
     "cached",
+    "async_cached",
     "cache"
 ]
\ No newline at end of file
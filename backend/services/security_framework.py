@@ -11,45 +11,113 @@ This module provides comprehensive security features including:
 - Security audit logging
 """
 
+import os
 import time
+import asyncio
+import atexit
+import logging
 import secrets
+import threading
 import hashlib
 import hmac
-import json
+import operator
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, Iterator
+from itertools import islice
 from dataclasses import dataclass
 from enum import Enum
-from sqlalchemy.orm import Session
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Float
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import (
+    Column, Integer, String, DateTime, Text, Boolean, Float, LargeBinary, Index,
+    select, insert, update, bindparam, func, cast, literal,
+)
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from fastapi import Request, HTTPException, Depends, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from pydantic import BaseModel, EmailStr, validator
 import re
-import bleach
-from collections import defaultdict
+import nh3
+import orjson
+from collections import deque
+from cachetools import TTLCache
 import redis
 
+logger = logging.getLogger(__name__)
+
 Base = declarative_base()
 
 # Security configuration
-SECURITY_CONFIG = {
-    "SECRET_KEY": "your-secret-key-here-change-in-production",
-    "ALGORITHM": "HS256",
-    "ACCESS_TOKEN_EXPIRE_MINUTES": 30,
-    "REFRESH_TOKEN_EXPIRE_DAYS": 7,
-    "PASSWORD_MIN_LENGTH": 8,
-    "API_KEY_PREFIX": "finehero_",
-    "MAX_LOGIN_ATTEMPTS": 5,
-    "LOGIN_LOCKOUT_TIME": 900,  # 15 minutes
-    "RATE_LIMIT_REQUESTS": 100,
-    "RATE_LIMIT_WINDOW": 3600,  # 1 hour
-    "GDPR_DATA_RETENTION_DAYS": 2555,  # 7 years
-    "ANONYMIZATION_DELAY_DAYS": 30
-}
+@dataclass(frozen=True, slots=True)
+class SecurityConfig:
+    """Security settings; attribute access keeps hot paths off dict lookups."""
+    secret_key: bytes = b"your-secret-key-here-change-in-production"
+    algorithm: str = "HS256"
+    access_token_expire_minutes: int = 30
+    refresh_token_expire_days: int = 7
+    password_min_length: int = 8
+    api_key_prefix: str = "finehero_"
+    max_login_attempts: int = 5
+    login_lockout_time: int = 900  # 15 minutes
+    rate_limit_requests: int = 100
+    rate_limit_window: int = 3600  # 1 hour
+    rate_limit_redis_url: str = os.getenv("REDIS_URL", "") or "redis://localhost:6379/0"
+    api_key_usage_batch_size: int = 2000
+    api_key_usage_flush_interval: float = 0.1  # seconds
+    audit_log_buffer_size: int = 65536
+    audit_log_batch_size: int = 1000
+    audit_log_flush_interval: float = 0.1  # seconds
+    audit_stream_key: str = "security_audit_events"
+    audit_stream_group: str = "security_audit_writers"
+    audit_stream_maxlen: int = 100_000
+    audit_stream_claim_idle_ms: int = 30_000  # unacknowledged entries older than this are retried
+    api_key_cache_size: int = 10_000
+    api_key_cache_ttl: int = 60  # seconds
+    token_cache_size: int = 50_000
+    token_cache_ttl: int = 60  # seconds
+    gdpr_data_retention_days: int = 2555  # 7 years
+    anonymization_delay_days: int = 30
+    gdpr_export_batch_size: int = 500
+
+
+SECURITY_CONFIG = SecurityConfig()
+
+# Validation patterns, compiled once at import
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+LOWERCASE_PATTERN = re.compile(r'[a-z]')
+UPPERCASE_PATTERN = re.compile(r'[A-Z]')
+DIGIT_PATTERN = re.compile(r'\d')
+SPECIAL_CHAR_PATTERN = re.compile(r'[!@#$%^&*()_+\-=\[\]{};:,.<>?]')
+CONTROL_CHAR_PATTERN = re.compile(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]')
+PHONE_PATTERN = re.compile(r'^(\+351)?[0-9]{9}$')
+# Weights of the first eight NIF digits for the mod-11 check digit
+NIF_WEIGHTS = (9, 8, 7, 6, 5, 4, 3, 2)
+# Security headers added to every response, pre-encoded for raw_headers
+SECURITY_HEADERS = (
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+)
+
+# HTML sanitization allowlists
+SANITIZE_INPUT_TAGS = frozenset({'p', 'br', 'strong', 'em', 'u'})
+SANITIZE_HTML_TAGS = frozenset({'p', 'br', 'strong', 'em', 'u', 'h1', 'h2', 'h3', 'ul', 'ol', 'li'})
+SANITIZE_URL_SCHEMES = frozenset({'http', 'https', 'mailto'})
+
+# Single alternation over raw upload bytes: one scan, no decoded copy
+MALICIOUS_CONTENT_PATTERN = re.compile(
+    rb'<script[^>]*>.*?</script>'
+    rb'|javascript:'
+    rb'|on\w+\s*='
+    rb'|eval\s*\('
+    rb'|exec\s*\(',
+    re.IGNORECASE,
+)
 
 class SecurityLevel(Enum):
     """Security level enumeration."""
@@ -86,6 +154,12 @@ class SecurityAuditLog(Base):
     details = Column(Text)  # JSON string
     resolved = Column(Boolean, default=False)
     resolution_notes = Column(Text)
+    
+    __table_args__ = (
+        # Covers detect_suspicious_activity: range scan on the user's recent
+        # events with ip_address read from the index
+        Index("ix_security_audit_logs_user_ts_ip", "user_id", timestamp.desc(), "ip_address"),
+    )
 
 
 class APIKey(Base):
@@ -94,7 +168,9 @@ class APIKey(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String, index=True)
-    key_hash = Column(String, unique=True, index=True)
+    # Raw SHA-256 digest; hex hashes from earlier releases are converted by
+    # infrastructure/migrations/api_key_hash_binary_migration.py
+    key_hash = Column(LargeBinary(32), unique=True, index=True)
     key_prefix = Column(String)
     name = Column(String)
     permissions = Column(Text)  # JSON string
@@ -137,16 +213,431 @@ class GDPRDataRecord(Base):
     processing_purposes = Column(Text)  # JSON string
 
 
+# Token bucket rate limit, evaluated atomically in Redis.
+# KEYS[1]: bucket key; ARGV: capacity, window (seconds), now (seconds),
+# and optionally audit stream key, stream maxlen, serialized audit row.
+# Refills capacity/window tokens per second. Rejections append the audit
+# row to the stream in the same call. Returns {allowed, retry_after, stream_id}.
+RATE_LIMIT_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local rate = capacity / window
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = math.ceil((1 - tokens) / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(window))
+
+local stream_id = ''
+if allowed == 0 and ARGV[6] then
+    stream_id = redis.call('XADD', ARGV[4], 'MAXLEN', '~', ARGV[5], '*', 'row', ARGV[6])
+end
+return {allowed, retry_after, stream_id}
+"""
+
+
+class RedisRateLimiter:
+    """
+    Token bucket rate limiter shared across workers through Redis.
+    
+    Each check is a single EVALSHA round trip with O(1) state per identifier;
+    buckets expire on their own after one idle window. An audit row passed
+    with the check is appended to the audit stream only if the request is
+    rejected, without a second round trip.
+    """
+    
+    KEY_PREFIX = "rate_limit:"
+    
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self._script_sha = client.script_load(RATE_LIMIT_SCRIPT)
+    
+    def allow(self, identifier: str, limit: int, window: int,
+              audit_row: Optional[Dict[str, Any]] = None) -> bool:
+        """Consume one token for identifier; returns False when the bucket is empty."""
+        args = [1, f"{self.KEY_PREFIX}{identifier}", limit, window, time.time()]
+        if audit_row is not None:
+            args += [
+                SECURITY_CONFIG.audit_stream_key,
+                SECURITY_CONFIG.audit_stream_maxlen,
+                orjson.dumps(audit_row),
+            ]
+        try:
+            allowed, _retry_after, _stream_id = self.client.evalsha(self._script_sha, *args)
+        except redis.exceptions.NoScriptError:
+            # Script cache was flushed (e.g. Redis restart); EVAL reloads it
+            allowed, _retry_after, _stream_id = self.client.eval(RATE_LIMIT_SCRIPT, *args)
+        return bool(allowed)
+
+
+class InProcessRateLimiter:
+    """
+    Sliding-window rate limiter kept in process memory.
+    
+    Each identifier owns a ring of its last `limit` request timestamps, so a
+    check compares against the oldest slot and overwrites it: O(1) time and
+    O(limit) memory per identifier. Identifiers are spread over lock shards
+    to keep contention local, and each shard periodically drops identifiers
+    whose requests have all left the window, so memory tracks active clients.
+    """
+    
+    SHARDS = 16
+    SWEEP_INTERVAL = 60  # seconds between idle sweeps of a shard
+    
+    def __init__(self):
+        self._shards = [({}, threading.Lock()) for _ in range(self.SHARDS)]
+        self._next_sweep = [0.0] * self.SHARDS
+    
+    def allow(self, identifier: str, limit: int, window: int) -> bool:
+        """Record a request for identifier; returns False when over the limit."""
+        now = time.time()
+        shard = hash(identifier) % self.SHARDS
+        rings, lock = self._shards[shard]
+        with lock:
+            if now >= self._next_sweep[shard]:
+                self._sweep(rings, now)
+                self._next_sweep[shard] = now + self.SWEEP_INTERVAL
+            
+            ring = rings.get(identifier)
+            if ring is None or len(ring[0]) != limit:
+                ring = rings[identifier] = [[float("-inf")] * limit, 0, window]
+            buffer, head, _window = ring
+            
+            # Oldest of the last `limit` requests still inside the window
+            if now - buffer[head] < window:
+                return False
+            
+            buffer[head] = now
+            ring[1] = (head + 1) % limit
+            ring[2] = window
+            return True
+    
+    @staticmethod
+    def _sweep(rings: Dict[str, List], now: float):
+        """Drop rings whose newest request is outside their window; they behave like fresh ones."""
+        idle = [
+            identifier for identifier, (buffer, head, window) in rings.items()
+            if now - buffer[head - 1] >= window
+        ]
+        for identifier in idle:
+            del rings[identifier]
+
+
+def create_rate_limiter(redis_url: str = None) -> Optional[RedisRateLimiter]:
+    """Create a Redis rate limiter, or None when Redis is unavailable."""
+    try:
+        client = redis.from_url(redis_url or SECURITY_CONFIG.rate_limit_redis_url)
+        client.ping()
+        return RedisRateLimiter(client)
+    except redis.RedisError as e:
+        logger.warning(f"Redis rate limiter unavailable, using in-process limits: {e}")
+        return None
+
+
+class APIKeyUsageWriter:
+    """
+    Coalesces API key usage updates and flushes them in batches.
+    
+    Requests only record usage in memory; a daemon thread writes the
+    accumulated counts with one executemany UPDATE per flush, so commit
+    latency is paid once per batch instead of once per request.
+    """
+    
+    USAGE_UPDATE = (
+        update(APIKey.__table__)
+        .where(APIKey.__table__.c.key_hash == bindparam("h"))
+        .values(
+            usage_count=APIKey.__table__.c.usage_count + bindparam("c"),
+            last_used=bindparam("t"),
+        )
+    )
+    
+    def __init__(self, session_factory, batch_size: int = None, flush_interval: float = None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or SECURITY_CONFIG.api_key_usage_batch_size
+        self.flush_interval = flush_interval or SECURITY_CONFIG.api_key_usage_flush_interval
+        self._pending: Dict[bytes, List] = {}  # key_hash -> [count, last_used]
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="api-key-usage-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+    
+    def record(self, key_hash: bytes, used_at: datetime):
+        """Record one use of an API key."""
+        with self._lock:
+            entry = self._pending.get(key_hash)
+            if entry is None:
+                self._pending[key_hash] = [1, used_at]
+            else:
+                entry[0] += 1
+                entry[1] = used_at
+            self._pending_count += 1
+            if self._pending_count >= self.batch_size:
+                self._wakeup.set()
+    
+    def flush(self) -> int:
+        """Write pending usage to the database; returns the number of keys updated."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+            self._pending_count = 0
+        
+        params = [{"h": key_hash, "c": count, "t": used_at} for key_hash, (count, used_at) in pending.items()]
+        db = self.session_factory()
+        try:
+            db.execute(self.USAGE_UPDATE, params)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to flush API key usage for {len(params)} keys: {e}")
+            return 0
+        finally:
+            db.close()
+        return len(params)
+    
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+class AuditLogWriter:
+    """
+    Buffers security audit events and inserts them in batches.
+    
+    Logging only appends to a bounded in-memory buffer; a daemon thread
+    drains it with multi-row INSERTs. When the buffer is full new events
+    are dropped and counted rather than blocking the request.
+    """
+    
+    def __init__(self, session_factory, buffer_size: int = None, batch_size: int = None,
+                 flush_interval: float = None):
+        self.session_factory = session_factory
+        self.buffer_size = buffer_size or SECURITY_CONFIG.audit_log_buffer_size
+        self.batch_size = batch_size or SECURITY_CONFIG.audit_log_batch_size
+        self.flush_interval = flush_interval or SECURITY_CONFIG.audit_log_flush_interval
+        self.dropped = 0
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+    
+    def record(self, row: Dict[str, Any]) -> bool:
+        """Queue one audit row; returns False if it was dropped."""
+        with self._lock:
+            if len(self._buffer) >= self.buffer_size:
+                self.dropped += 1
+                return False
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size:
+                self._wakeup.set()
+        return True
+    
+    def flush(self) -> int:
+        """Insert all buffered rows; returns the number of rows written."""
+        written = 0
+        while True:
+            with self._lock:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            if not batch:
+                return written
+            
+            db = self.session_factory()
+            try:
+                db.execute(insert(SecurityAuditLog.__table__), batch)
+                db.commit()
+                written += len(batch)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to write {len(batch)} security audit events: {e}")
+                return written
+            finally:
+                db.close()
+    
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+class AuditStreamConsumer:
+    """
+    Drains audit rows appended by the rate limit script into the database.
+    
+    Runs a daemon thread in a Redis consumer group, so each worker process
+    can run one; entries are acknowledged only after their batch commits.
+    Entries left unacknowledged, by a failed write here or a crashed worker,
+    are claimed back with XAUTOCLAIM at startup and then once per idle period.
+    """
+    
+    def __init__(self, client: redis.Redis, session_factory, batch_size: int = None):
+        self.client = client
+        self.session_factory = session_factory
+        self.batch_size = batch_size or SECURITY_CONFIG.audit_log_batch_size
+        self.stream = SECURITY_CONFIG.audit_stream_key
+        self.group = SECURITY_CONFIG.audit_stream_group
+        self.consumer = f"{os.uname().nodename}-{os.getpid()}"
+        self.claim_idle_ms = SECURITY_CONFIG.audit_stream_claim_idle_ms
+        self._claim_cursor = "0-0"
+        self._next_claim = 0.0  # monotonic time of the next claim pass
+        try:
+            client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._thread = threading.Thread(target=self._run, name="audit-stream-consumer", daemon=True)
+        self._thread.start()
+    
+    def drain(self, block_ms: Optional[int] = None) -> int:
+        """Write one batch of stream entries to the database; returns rows written."""
+        entries = self._claim_pending() if time.monotonic() >= self._next_claim else []
+        if not entries:
+            response = self.client.xreadgroup(
+                self.group, self.consumer, {self.stream: ">"}, count=self.batch_size, block=block_ms
+            )
+            entries = [entry for _stream, stream_entries in response or () for entry in stream_entries]
+        if not entries:
+            return 0
+        
+        entry_ids, rows = [], []
+        for entry_id, fields in entries:
+            entry_ids.append(entry_id)
+            if fields:  # claimed entries trimmed from the stream come back empty
+                row = orjson.loads(fields[b"row"])
+                row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+                rows.append(row)
+        
+        db = self.session_factory()
+        try:
+            if rows:
+                db.execute(insert(SecurityAuditLog.__table__), rows)
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to write {len(rows)} streamed security audit events: {e}")
+            # Leave them pending and claim them back once they are idle
+            self._claim_cursor = "0-0"
+            self._next_claim = time.monotonic() + self.claim_idle_ms / 1000
+            return 0
+        finally:
+            db.close()
+        
+        self.client.xack(self.stream, self.group, *entry_ids)
+        return len(rows)
+    
+    def _claim_pending(self) -> List:
+        """Claim the next batch of idle unacknowledged entries."""
+        cursor, entries = self.client.xautoclaim(
+            self.stream, self.group, self.consumer, self.claim_idle_ms,
+            start_id=self._claim_cursor, count=self.batch_size
+        )[:2]
+        self._claim_cursor = cursor
+        if not entries and cursor in (b"0-0", "0-0"):
+            # Pass complete; look again once newer deliveries could be idle
+            self._next_claim = time.monotonic() + self.claim_idle_ms / 1000
+        return entries
+    
+    def _run(self):
+        while True:
+            try:
+                self.drain(block_ms=1000)
+            except redis.RedisError as e:
+                logger.warning(f"Audit stream consumer error: {e}")
+                time.sleep(1)
+
+
+@dataclass(frozen=True)
+class ValidatedAPIKey:
+    """Detached snapshot of a validated API key."""
+    id: int
+    user_id: str
+    key_hash: bytes
+    permissions: List[str]
+    rate_limit: int
+    expires_at: datetime
+
+
+# argon2id for new hashes; bcrypt hashes still verify and are flagged for rehash
+PASSWORD_CONTEXT = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__time_cost=2,
+    argon2__memory_cost=65536,  # KiB
+    argon2__parallelism=1,
+)
+
+# Validated keys by raw key, shared across requests so cache hits skip
+# both the SHA-256 and the database lookup
+_api_key_cache = TTLCache(
+    maxsize=SECURITY_CONFIG.api_key_cache_size,
+    ttl=SECURITY_CONFIG.api_key_cache_ttl,
+)
+_api_key_cache_lock = threading.Lock()
+
+# Verified JWT payloads by token; entries also expire with the token's exp claim
+_token_cache = TTLCache(
+    maxsize=SECURITY_CONFIG.token_cache_size,
+    ttl=SECURITY_CONFIG.token_cache_ttl,
+)
+_token_cache_lock = threading.Lock()
+
+
+def create_async_session_factory(db_session: Session) -> Optional[async_sessionmaker]:
+    """
+    Build an asyncpg session factory for the database behind db_session.
+    
+    Returns None for non-PostgreSQL databases, which keep using the sync session.
+    """
+    url = db_session.get_bind().url
+    if url.get_backend_name() != "postgresql":
+        return None
+    engine = create_async_engine(url.set(drivername="postgresql+asyncpg"), pool_pre_ping=True)
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
 class SecurityManager:
     """
     Comprehensive security management system
+    
+    Methods prefixed with ``a`` are async variants for request paths; they use
+    async_session_factory when configured and otherwise run the sync method
+    in a worker thread.
     """
     
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, rate_limiter: Optional[RedisRateLimiter] = None,
+                 usage_writer: Optional[APIKeyUsageWriter] = None,
+                 async_session_factory: Optional[async_sessionmaker] = None,
+                 audit_writer: Optional[AuditLogWriter] = None):
         self.db = db_session
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.audit_writer = audit_writer
+        self.async_session_factory = async_session_factory
+        self.pwd_context = PASSWORD_CONTEXT
         self.security = HTTPBearer()
-        self._rate_limit_cache = defaultdict(list)
+        self.rate_limiter = rate_limiter
+        self.usage_writer = usage_writer
+        self._local_rate_limiter = InProcessRateLimiter()
         
     def hash_password(self, password: str) -> str:
         """Hash a password securely."""
@@ -156,14 +647,32 @@ class SecurityManager:
         """Verify a password against its hash."""
         return self.pwd_context.verify(plain_password, hashed_password)
     
+    def verify_and_update_password(self, plain_password: str,
+                                   hashed_password: str) -> tuple[bool, Optional[str]]:
+        """Verify a password and return a replacement hash when it uses legacy parameters."""
+        return self.pwd_context.verify_and_update(plain_password, hashed_password)
+    
+    async def ahash_password(self, password: str) -> str:
+        """Hash a password in a worker thread to keep the event loop responsive."""
+        return await asyncio.to_thread(self.pwd_context.hash, password)
+    
+    async def averify_password(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password in a worker thread to keep the event loop responsive."""
+        return await asyncio.to_thread(self.pwd_context.verify, plain_password, hashed_password)
+    
+    async def averify_and_update_password(self, plain_password: str,
+                                          hashed_password: str) -> tuple[bool, Optional[str]]:
+        """Async variant of verify_and_update_password."""
+        return await asyncio.to_thread(self.pwd_context.verify_and_update, plain_password, hashed_password)
+    
     def generate_api_key(self, user_id: str, name: str, permissions: List[str] = None) -> str:
         """Generate a new API key."""
         if permissions is None:
             permissions = ["read"]
         
         # Generate secure random key
-        key = f"{SECURITY_CONFIG['API_KEY_PREFIX']}{secrets.token_urlsafe(32)}"
-        key_hash = hashlib.sha256(key.encode()).hexdigest()
+        key = f"{SECURITY_CONFIG.api_key_prefix}{secrets.token_urlsafe(32)}"
+        key_hash = hashlib.sha256(key.encode('ascii')).digest()
         
         # Store in database
         api_key = APIKey(
@@ -171,8 +680,8 @@ class SecurityManager:
             key_hash=key_hash,
             key_prefix=key[:8],  # Store prefix for identification
             name=name,
-            permissions=json.dumps(permissions),
-            rate_limit=SECURITY_CONFIG["RATE_LIMIT_REQUESTS"],
+            permissions=orjson.dumps(permissions).decode(),
+            rate_limit=SECURITY_CONFIG.rate_limit_requests,
             expires_at=datetime.utcnow() + timedelta(days=365)  # 1 year expiry
         )
         
@@ -182,71 +691,172 @@ class SecurityManager:
         
         return key
     
-    def validate_api_key(self, api_key: str) -> Optional[APIKey]:
-        """Validate an API key and return associated record."""
-        key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+    def validate_api_key(self, api_key: str) -> Optional[ValidatedAPIKey]:
+        """
+        Validate an API key and return a snapshot of its record.
         
-        api_key_record = self.db.query(APIKey).filter(
-            APIKey.key_hash == key_hash,
-            APIKey.is_active == True
-        ).first()
+        Validated keys are cached for API_KEY_CACHE_TTL seconds, so
+        deactivations take effect within that window.
+        """
+        now = datetime.utcnow()
+        validated = self._cached_api_key(api_key, now)
         
-        if api_key_record and api_key_record.expires_at > datetime.utcnow():
-            # Update usage statistics
-            api_key_record.last_used = datetime.utcnow()
-            api_key_record.usage_count += 1
+        if validated is None:
+            key_hash = self._hash_api_key(api_key)
+            if key_hash is None:
+                return None
+            api_key_record = self.db.execute(self._api_key_query(key_hash)).scalars().first()
+            validated = self._cache_api_key(api_key, key_hash, api_key_record, now)
+            if validated is None:
+                return None
+        
+        # Update usage statistics
+        if self.usage_writer is not None:
+            self.usage_writer.record(validated.key_hash, now)
+        else:
+            self.db.execute(self._api_key_usage_update(validated.id, now))
             self.db.commit()
-            return api_key_record
+        return validated
+    
+    async def avalidate_api_key(self, api_key: str) -> Optional[ValidatedAPIKey]:
+        """Async variant of validate_api_key."""
+        if self.async_session_factory is None:
+            return await asyncio.to_thread(self.validate_api_key, api_key)
         
-        return None
+        now = datetime.utcnow()
+        validated = self._cached_api_key(api_key, now)
+        if validated is not None and self.usage_writer is not None:
+            self.usage_writer.record(validated.key_hash, now)
+            return validated
+        
+        async with self.async_session_factory() as session:
+            if validated is None:
+                key_hash = self._hash_api_key(api_key)
+                if key_hash is None:
+                    return None
+                result = await session.execute(self._api_key_query(key_hash))
+                validated = self._cache_api_key(api_key, key_hash, result.scalars().first(), now)
+                if validated is None:
+                    return None
+            
+            # Update usage statistics
+            if self.usage_writer is not None:
+                self.usage_writer.record(validated.key_hash, now)
+            else:
+                await session.execute(self._api_key_usage_update(validated.id, now))
+                await session.commit()
+        return validated
+    
+    @staticmethod
+    def _hash_api_key(api_key: str) -> Optional[bytes]:
+        try:
+            return hashlib.sha256(api_key.encode('ascii')).digest()
+        except UnicodeEncodeError:
+            # Issued keys are URL-safe ASCII
+            return None
+    
+    @staticmethod
+    def _api_key_query(key_hash: bytes):
+        return select(APIKey).where(APIKey.key_hash == key_hash, APIKey.is_active == True)
+    
+    @staticmethod
+    def _api_key_usage_update(api_key_id: int, now: datetime):
+        return (
+            update(APIKey)
+            .where(APIKey.id == api_key_id)
+            .values(last_used=now, usage_count=APIKey.usage_count + 1)
+        )
+    
+    @staticmethod
+    def _cached_api_key(api_key: str, now: datetime) -> Optional[ValidatedAPIKey]:
+        """Return the cached snapshot for api_key, evicting it once expired."""
+        with _api_key_cache_lock:
+            validated = _api_key_cache.get(api_key)
+            if validated is not None and validated.expires_at is not None and validated.expires_at <= now:
+                del _api_key_cache[api_key]
+                return None
+        return validated
+    
+    @staticmethod
+    def _cache_api_key(api_key: str, key_hash: bytes, record: Optional[APIKey],
+                       now: datetime) -> Optional[ValidatedAPIKey]:
+        """Snapshot and cache a freshly loaded key record if it is valid."""
+        if not record or not hmac.compare_digest(record.key_hash, key_hash):
+            return None
+        if record.expires_at is not None and record.expires_at <= now:
+            return None
+        
+        validated = ValidatedAPIKey(
+            id=record.id,
+            user_id=record.user_id,
+            key_hash=key_hash,
+            permissions=orjson.loads(record.permissions or "[]"),
+            rate_limit=record.rate_limit,
+            expires_at=record.expires_at,
+        )
+        with _api_key_cache_lock:
+            _api_key_cache[api_key] = validated
+        return validated
     
-    def check_rate_limit(self, identifier: str, limit: int = None, window: int = None) -> bool:
-        """Check if request is within rate limits."""
+    def check_rate_limit(self, identifier: str, limit: int = None, window: int = None,
+                         audit_event: Optional[SecurityEvent] = None) -> bool:
+        """
+        Check if request is within rate limits.
+        
+        Uses the shared Redis token bucket when a rate limiter is configured,
+        otherwise falls back to per-process tracking. audit_event, if given,
+        is logged when the request is rejected.
+        """
         if limit is None:
-            limit = SECURITY_CONFIG["RATE_LIMIT_REQUESTS"]
+            limit = SECURITY_CONFIG.rate_limit_requests
         if window is None:
-            window = SECURITY_CONFIG["RATE_LIMIT_WINDOW"]
+            window = SECURITY_CONFIG.rate_limit_window
         
-        current_time = time.time()
-        window_start = current_time - window
-        
-        # Clean old entries
-        self._rate_limit_cache[identifier] = [
-            req_time for req_time in self._rate_limit_cache[identifier]
-            if req_time > window_start
-        ]
+        if self.rate_limiter is not None:
+            audit_row = self._audit_row(audit_event) if audit_event is not None else None
+            try:
+                return self.rate_limiter.allow(identifier, limit, window, audit_row)
+            except redis.RedisError as e:
+                logger.warning(f"Redis rate limit check failed, using in-process limits: {e}")
         
-        # Check if under limit
-        if len(self._rate_limit_cache[identifier]) >= limit:
-            return False
+        allowed = self._local_rate_limiter.allow(identifier, limit, window)
+        if not allowed and audit_event is not None:
+            self.log_security_event(audit_event)
+        return allowed
+    
+    async def acheck_rate_limit(self, identifier: str, limit: int = None, window: int = None,
+                                audit_event: Optional[SecurityEvent] = None) -> bool:
+        """Async variant of check_rate_limit; the Redis round trip runs off the event loop."""
+        if self.rate_limiter is not None:
+            return await asyncio.to_thread(self.check_rate_limit, identifier, limit, window, audit_event)
         
-        # Add current request
-        self._rate_limit_cache[identifier].append(current_time)
-        return True
+        allowed = self._local_rate_limiter.allow(
+            identifier,
+            SECURITY_CONFIG.rate_limit_requests if limit is None else limit,
+            SECURITY_CONFIG.rate_limit_window if window is None else window,
+        )
+        if not allowed and audit_event is not None:
+            await self.alog_security_event(audit_event)
+        return allowed
     
     def sanitize_input(self, input_text: str, allowed_tags: List[str] = None) -> str:
         """Sanitize user input to prevent XSS attacks."""
-        if allowed_tags is None:
-            allowed_tags = ['p', 'br', 'strong', 'em', 'u']
-        
         # Clean HTML tags and attributes
-        cleaned = bleach.clean(
+        cleaned = nh3.clean(
             input_text,
-            tags=allowed_tags,
+            tags=SANITIZE_INPUT_TAGS if allowed_tags is None else set(allowed_tags),
             attributes={},
-            protocols=['http', 'https', 'mailto'],
-            strip=True
+            url_schemes=SANITIZE_URL_SCHEMES
         )
         
         # Additional text sanitization
-        cleaned = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', cleaned)
+        cleaned = CONTROL_CHAR_PATTERN.sub('', cleaned)
         
         return cleaned.strip()
     
     def validate_email(self, email: str) -> bool:
         """Validate email format."""
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+        return EMAIL_PATTERN.match(email) is not None
     
     def validate_password_strength(self, password: str) -> Dict[str, Any]:
         """Validate password strength requirements."""
@@ -254,28 +864,28 @@ class SecurityManager:
         score = 0
         
         # Length check
-        if len(password) < SECURITY_CONFIG["PASSWORD_MIN_LENGTH"]:
-            errors.append(f"Password must be at least {SECURITY_CONFIG['PASSWORD_MIN_LENGTH']} characters long")
+        if len(password) < SECURITY_CONFIG.password_min_length:
+            errors.append(f"Password must be at least {SECURITY_CONFIG.password_min_length} characters long")
         else:
             score += 1
         
         # Character variety checks
-        if re.search(r'[a-z]', password):
+        if LOWERCASE_PATTERN.search(password):
             score += 1
         else:
             errors.append("Password must contain lowercase letters")
         
-        if re.search(r'[A-Z]', password):
+        if UPPERCASE_PATTERN.search(password):
             score += 1
         else:
             errors.append("Password must contain uppercase letters")
         
-        if re.search(r'\d', password):
+        if DIGIT_PATTERN.search(password):
             score += 1
         else:
             errors.append("Password must contain numbers")
         
-        if re.search(r'[!@#$%^&*()_+\-=\[\]{};:,.<>?]', password):
+        if SPECIAL_CHAR_PATTERN.search(password):
             score += 1
         else:
             errors.append("Password must contain special characters")
@@ -296,61 +906,121 @@ class SecurityManager:
         }
     
     def log_security_event(self, event: SecurityEvent):
-        """Log security events for audit trail."""
-        audit_log = SecurityAuditLog(
-            event_type=event.event_type,
-            user_id=event.user_id,
-            ip_address=event.ip_address or "",
-            user_agent=event.user_agent or "",
-            endpoint=event.endpoint or "",
-            severity=event.severity.value,
-            details=json.dumps(event.details or {}),
-            resolved=False
-        )
+        """
+        Log security events for audit trail.
+        
+        With an audit writer configured the event is only queued; it is
+        persisted by the writer's next batch.
+        """
+        if self.audit_writer is not None:
+            self.audit_writer.record(self._audit_row(event))
+            return
         
-        self.db.add(audit_log)
+        self.db.add(SecurityAuditLog(**self._audit_row(event)))
         self.db.commit()
     
+    async def alog_security_event(self, event: SecurityEvent):
+        """Async variant of log_security_event."""
+        if self.audit_writer is not None:
+            self.audit_writer.record(self._audit_row(event))
+            return
+        if self.async_session_factory is None:
+            return await asyncio.to_thread(self.log_security_event, event)
+        
+        async with self.async_session_factory() as session:
+            session.add(SecurityAuditLog(**self._audit_row(event)))
+            await session.commit()
+    
+    @staticmethod
+    def _audit_row(event: SecurityEvent) -> Dict[str, Any]:
+        return {
+            "timestamp": datetime.utcnow(),
+            "event_type": event.event_type,
+            "user_id": event.user_id,
+            "ip_address": event.ip_address or "",
+            "user_agent": event.user_agent or "",
+            "endpoint": event.endpoint or "",
+            "severity": event.severity.value,
+            "details": orjson.dumps(event.details or {}).decode(),
+            "resolved": False,
+        }
+    
     def detect_suspicious_activity(self, user_id: str, ip_address: str, 
                                  endpoint: str) -> bool:
         """Detect potentially suspicious activity patterns."""
-        current_time = datetime.utcnow()
+        recent_requests, ip_count = self.db.execute(
+            self._suspicious_activity_query(user_id, ip_address)
+        ).one()
         
-        # Check for rapid successive requests
-        recent_requests = self.db.query(SecurityAuditLog).filter(
-            SecurityAuditLog.user_id == user_id,
-            SecurityAuditLog.timestamp >= current_time - timedelta(minutes=5)
-        ).count()
+        # Check for rapid successive requests, then multiple IPs accessing same account
+        event = (self._rapid_requests_event(user_id, ip_address, endpoint, recent_requests)
+                 or self._multiple_ips_event(user_id, ip_address, ip_count))
+        
+        if event is None:
+            return False
+        self.log_security_event(event)
+        return True
+    
+    async def adetect_suspicious_activity(self, user_id: str, ip_address: str,
+                                          endpoint: str) -> bool:
+        """Async variant of detect_suspicious_activity."""
+        if self.async_session_factory is None:
+            return await asyncio.to_thread(self.detect_suspicious_activity, user_id, ip_address, endpoint)
+        
+        async with self.async_session_factory() as session:
+            result = await session.execute(self._suspicious_activity_query(user_id, ip_address))
+            recent_requests, ip_count = result.one()
         
+        event = (self._rapid_requests_event(user_id, ip_address, endpoint, recent_requests)
+                 or self._multiple_ips_event(user_id, ip_address, ip_count))
+        
+        if event is None:
+            return False
+        await self.alog_security_event(event)
+        return True
+    
+    @staticmethod
+    def _suspicious_activity_query(user_id: str, ip_address: str):
+        """
+        Single scan of the user's last hour returning
+        (requests in the last 5 minutes, distinct other IPs in the last hour).
+        """
+        current_time = datetime.utcnow()
+        return select(
+            func.count().filter(SecurityAuditLog.timestamp >= current_time - timedelta(minutes=5)),
+            func.count(func.distinct(SecurityAuditLog.ip_address)).filter(
+                SecurityAuditLog.ip_address != ip_address
+            ),
+        ).where(
+            SecurityAuditLog.user_id == user_id,
+            SecurityAuditLog.timestamp >= current_time - timedelta(hours=1),
+        )
+    
+    @staticmethod
+    def _rapid_requests_event(user_id: str, ip_address: str, endpoint: str,
+                              recent_requests: int) -> Optional[SecurityEvent]:
         if recent_requests > 50:  # More than 10 requests per minute
-            self.log_security_event(SecurityEvent(
+            return SecurityEvent(
                 event_type="suspicious_activity",
                 user_id=user_id,
                 ip_address=ip_address,
                 endpoint=endpoint,
                 severity=SecurityLevel.HIGH,
                 details={"requests_in_5min": recent_requests}
-            ))
-            return True
-        
-        # Check for multiple IPs accessing same account
-        ip_count = self.db.query(SecurityAuditLog).filter(
-            SecurityAuditLog.user_id == user_id,
-            SecurityAuditLog.timestamp >= current_time - timedelta(hours=1),
-            SecurityAuditLog.ip_address != ip_address
-        ).distinct(SecurityAuditLog.ip_address).count()
-        
+            )
+        return None
+    
+    @staticmethod
+    def _multiple_ips_event(user_id: str, ip_address: str, ip_count: int) -> Optional[SecurityEvent]:
         if ip_count > 3:  # More than 3 different IPs in 1 hour
-            self.log_security_event(SecurityEvent(
+            return SecurityEvent(
                 event_type="multiple_ips",
                 user_id=user_id,
                 ip_address=ip_address,
                 severity=SecurityLevel.MEDIUM,
                 details={"different_ips": ip_count}
-            ))
-            return True
-        
-        return False
+            )
+        return None
     
     def create_access_token(self, data: dict, expires_delta: timedelta = None) -> str:
         """Create JWT access token."""
@@ -358,19 +1028,37 @@ class SecurityManager:
         if expires_delta:
             expire = datetime.utcnow() + expires_delta
         else:
-            expire = datetime.utcnow() + timedelta(minutes=SECURITY_CONFIG["ACCESS_TOKEN_EXPIRE_MINUTES"])
+            expire = datetime.utcnow() + timedelta(minutes=SECURITY_CONFIG.access_token_expire_minutes)
         
         to_encode.update({"exp": expire})
-        encoded_jwt = jwt.encode(to_encode, SECURITY_CONFIG["SECRET_KEY"], algorithm=SECURITY_CONFIG["ALGORITHM"])
+        encoded_jwt = jwt.encode(to_encode, SECURITY_CONFIG.secret_key, algorithm=SECURITY_CONFIG.algorithm)
         return encoded_jwt
     
     def verify_access_token(self, token: str) -> Optional[dict]:
-        """Verify JWT access token."""
+        """
+        Verify JWT access token.
+        
+        Verified payloads are cached per token until the earlier of the
+        token's expiry and TOKEN_CACHE_TTL, so repeat requests skip the
+        signature check and claim parsing.
+        """
+        with _token_cache_lock:
+            payload = _token_cache.get(token)
+        if payload is not None:
+            if payload.get("exp", 0) > time.time():
+                return dict(payload)
+            with _token_cache_lock:
+                _token_cache.pop(token, None)
+        
         try:
-            payload = jwt.decode(token, SECURITY_CONFIG["SECRET_KEY"], algorithms=[SECURITY_CONFIG["ALGORITHM"]])
-            return payload
+            payload = jwt.decode(token, SECURITY_CONFIG.secret_key, algorithms=[SECURITY_CONFIG.algorithm])
         except JWTError:
             return None
+        
+        if "exp" in payload:
+            with _token_cache_lock:
+                _token_cache[token] = payload
+        return dict(payload)
     
     def validate_file_upload(self, file_content: bytes, filename: str, 
                            allowed_extensions: List[str] = None) -> Dict[str, Any]:
@@ -394,21 +1082,11 @@ class SecurityManager:
             }
         
         # Check for malicious content patterns
-        content_str = file_content.decode('utf-8', errors='ignore')
-        malicious_patterns = [
-            r'<script[^>]*>.*?</script>',
-            r'javascript:',
-            r'on\w+\s*=',
-            r'eval\s*\(',
-            r'exec\s*\('
-        ]
-        
-        for pattern in malicious_patterns:
-            if re.search(pattern, content_str, re.IGNORECASE):
-                return {
-                    "valid": False,
-                    "error": "File contains potentially malicious content"
-                }
+        if MALICIOUS_CONTENT_PATTERN.search(file_content):
+            return {
+                "valid": False,
+                "error": "File contains potentially malicious content"
+            }
         
         return {"valid": True}
 
@@ -428,11 +1106,11 @@ class GDPRComplianceManager:
             gdpr_record = GDPRDataRecord(
                 user_id=user_id,
                 data_type=data_type,
-                retention_date=datetime.utcnow() + timedelta(days=SECURITY_CONFIG["GDPR_DATA_RETENTION_DAYS"]),
+                retention_date=datetime.utcnow() + timedelta(days=SECURITY_CONFIG.gdpr_data_retention_days),
                 consent_status=consent_status,
                 consent_date=datetime.utcnow(),
                 legal_basis=legal_basis,
-                processing_purposes=json.dumps(processing_purposes)
+                processing_purposes=orjson.dumps(processing_purposes).decode()
             )
             
             self.db.add(gdpr_record)
@@ -454,7 +1132,7 @@ class GDPRComplianceManager:
             for record in records:
                 record.consent_status = "withdrawn"
                 # Schedule data deletion or anonymization
-                record.deletion_date = datetime.utcnow() + timedelta(days=SECURITY_CONFIG["ANONYMIZATION_DELAY_DAYS"])
+                record.deletion_date = datetime.utcnow() + timedelta(days=SECURITY_CONFIG.anonymization_delay_days)
             
             self.db.commit()
             return True
@@ -486,45 +1164,85 @@ class GDPRComplianceManager:
     def export_user_data(self, user_id: str) -> Dict[str, Any]:
         """Export user data for data portability."""
         try:
-            # Get all user data records
-            records = self.db.query(GDPRDataRecord).filter(
-                GDPRDataRecord.user_id == user_id
-            ).all()
-            
-            exported_data = {
+            return {
                 "user_id": user_id,
                 "export_date": datetime.utcnow().isoformat(),
-                "data_records": []
+                "data_records": list(self._iter_export_records(user_id))
             }
-            
-            for record in records:
-                exported_data["data_records"].append({
-                    "data_type": record.data_type,
-                    "retention_date": record.retention_date.isoformat(),
-                    "consent_status": record.consent_status,
-                    "consent_date": record.consent_date.isoformat(),
-                    "legal_basis": record.legal_basis,
-                    "processing_purposes": json.loads(record.processing_purposes),
-                    "anonymized": record.anonymized
-                })
-            
-            return exported_data
         except Exception as e:
             return {"error": f"Failed to export user data: {str(e)}"}
     
+    def stream_user_data_export(self, user_id: str) -> Iterator[bytes]:
+        """
+        Stream the export_user_data document as JSON chunks.
+        
+        Records are fetched in GDPR_EXPORT_BATCH_SIZE batches from a server-side
+        cursor, so memory stays bounded regardless of how many records the user has.
+        The first batch is fetched and serialized before this returns, so query
+        failures raise here while the caller can still answer with an error status.
+        """
+        records = self._iter_export_records(user_id)
+        first_batch = b",".join(
+            orjson.dumps(record) for record in islice(records, SECURITY_CONFIG.gdpr_export_batch_size)
+        )
+        return self._export_chunks(user_id, first_batch, records)
+    
+    @staticmethod
+    def _export_chunks(user_id: str, first_batch: bytes,
+                       records: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+        yield orjson.dumps({"user_id": user_id, "export_date": datetime.utcnow().isoformat()})[:-1]
+        yield b',"data_records":[' + first_batch
+        for record in records:
+            yield b"," + orjson.dumps(record)
+        yield b"]}"
+    
+    def _iter_export_records(self, user_id: str) -> Iterator[Dict[str, Any]]:
+        records = self.db.execute(
+            select(GDPRDataRecord)
+            .where(GDPRDataRecord.user_id == user_id)
+            .execution_options(yield_per=SECURITY_CONFIG.gdpr_export_batch_size)
+        ).scalars()
+        
+        for record in records:
+            yield {
+                "data_type": record.data_type,
+                "retention_date": record.retention_date.isoformat() if record.retention_date else None,
+                "consent_status": record.consent_status,
+                "consent_date": record.consent_date.isoformat() if record.consent_date else None,
+                "legal_basis": record.legal_basis,
+                "processing_purposes": self._load_processing_purposes(record.processing_purposes),
+                "anonymized": record.anonymized
+            }
+    
+    @staticmethod
+    def _load_processing_purposes(value: Optional[str]) -> Any:
+        """Decode stored purposes; missing values export as [] and invalid JSON as the raw text."""
+        if not value:
+            return []
+        try:
+            return orjson.loads(value)
+        except orjson.JSONDecodeError:
+            return value
+    
     def cleanup_expired_data(self) -> int:
         """Clean up data that has passed retention period."""
         try:
-            expired_records = self.db.query(GDPRDataRecord).filter(
-                GDPRDataRecord.retention_date < datetime.utcnow(),
-                GDPRDataRecord.anonymized == False
-            ).all()
-            
-            for record in expired_records:
-                self.anonymize_user_data(record.user_id)
-            
-            return len(expired_records)
+            result = self.db.execute(
+                update(GDPRDataRecord)
+                .where(
+                    GDPRDataRecord.retention_date < datetime.utcnow(),
+                    GDPRDataRecord.anonymized == False
+                )
+                .values(
+                    anonymized=True,
+                    user_id=literal("anonymized_") + cast(GDPRDataRecord.id, String)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+            return result.rowcount
         except Exception as e:
+            self.db.rollback()
             return 0
 
 
@@ -535,7 +1253,18 @@ class SecurityMiddleware:
     
     def __init__(self, db_session: Session):
         self.db = db_session
-        self.security_manager = SecurityManager(db_session)
+        session_factory = sessionmaker(bind=db_session.get_bind())
+        rate_limiter = create_rate_limiter()
+        self.audit_consumer = (
+            AuditStreamConsumer(rate_limiter.client, session_factory) if rate_limiter else None
+        )
+        self.security_manager = SecurityManager(
+            db_session,
+            rate_limiter=rate_limiter,
+            usage_writer=APIKeyUsageWriter(session_factory),
+            async_session_factory=create_async_session_factory(db_session),
+            audit_writer=AuditLogWriter(session_factory),
+        )
         self.gdpr_manager = GDPRComplianceManager(db_session)
     
     async def __call__(self, request: Request, call_next):
@@ -543,16 +1272,14 @@ class SecurityMiddleware:
         client_ip = self._get_client_ip(request)
         user_agent = request.headers.get("user-agent", "")
         
-        # Rate limiting
-        if not self.security_manager.check_rate_limit(client_ip):
-            self.security_manager.log_security_event(SecurityEvent(
-                event_type="rate_limit_exceeded",
-                ip_address=client_ip,
-                user_agent=user_agent,
-                endpoint=str(request.url.path),
-                severity=SecurityLevel.MEDIUM
-            ))
-            
+        # Rate limiting; rejections are audited by the same call
+        if not await self.security_manager.acheck_rate_limit(client_ip, audit_event=SecurityEvent(
+            event_type="rate_limit_exceeded",
+            ip_address=client_ip,
+            user_agent=user_agent,
+            endpoint=str(request.url.path),
+            severity=SecurityLevel.MEDIUM
+        )):
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="Rate limit exceeded. Please try again later."
@@ -564,7 +1291,7 @@ class SecurityMiddleware:
         
         # Log security events for suspicious activity
         if response.status_code >= 400:
-            self.security_manager.log_security_event(SecurityEvent(
+            await self.security_manager.alog_security_event(SecurityEvent(
                 event_type="error_response",
                 ip_address=client_ip,
                 user_agent=user_agent,
@@ -574,27 +1301,21 @@ class SecurityMiddleware:
             ))
         
         # Add security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        response.raw_headers.extend(SECURITY_HEADERS)
         
         return response
     
     def _get_client_ip(self, request: Request) -> str:
         """Extract client IP address from request."""
+        headers = request.headers
+        
         # Check for forwarded headers
-        forwarded_for = request.headers.get("x-forwarded-for")
+        forwarded_for = headers.get("x-forwarded-for")
         if forwarded_for:
-            return forwarded_for.split(",")[0].strip()
-        
-        real_ip = request.headers.get("x-real-ip")
-        if real_ip:
-            return real_ip
+            return forwarded_for.split(",", 1)[0].strip()
         
         # Fallback to direct connection
-        return request.client.host if request.client else "unknown"
+        return headers.get("x-real-ip") or (request.client.host if request.client else "unknown")
 
 
 # Pydantic models for request validation
@@ -635,10 +1356,21 @@ class ConsentRequest(BaseModel):
 
 
 # Security dependency functions
+# Shared SecurityManager registered by setup_security_framework, so request
+# dependencies reuse its password context, rate limiter and writers
+_security_manager: Optional[SecurityManager] = None
+
+
+def get_security_manager() -> SecurityManager:
+    """Return the process-wide SecurityManager."""
+    if _security_manager is None:
+        raise RuntimeError("Security framework is not initialized; call setup_security_framework first")
+    return _security_manager
+
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer())):
     """Get current authenticated user."""
-    security_manager = SecurityManager(SessionLocal())
-    payload = security_manager.verify_access_token(credentials.credentials)
+    payload = get_security_manager().verify_access_token(credentials.credentials)
     if not payload:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -661,8 +1393,7 @@ async def get_api_key(api_key: str = None, request: Request = None):
             detail="API key required"
         )
     
-    security_manager = SecurityManager(SessionLocal())
-    key_record = security_manager.validate_api_key(api_key)
+    key_record = await get_security_manager().avalidate_api_key(api_key)
     if not key_record:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -675,43 +1406,38 @@ async def get_api_key(api_key: str = None, request: Request = None):
 # Security-focused Pydantic validators
 def validate_portuguese_phone(phone: str) -> bool:
     """Validate Portuguese phone number format."""
-    pattern = r'^(\+351)?[0-9]{9}$'
-    return re.match(pattern, phone.replace(' ', '').replace('-', '')) is not None
+    return PHONE_PATTERN.match(phone.replace(' ', '').replace('-', '')) is not None
 
 
 def validate_nif(nif: str) -> bool:
-    """Validate Portuguese NIF (tax number) format."""
-    pattern = r'^[0-9]{9}$'
-    if not re.match(pattern, nif):
+    """Validate Portuguese NIF (tax number) format and check digit."""
+    if len(nif) != 9 or not nif.isascii() or not nif.isdigit():
         return False
     
-    # Calculate validation checksum
-    check_sum = sum(int(nif[i]) * (10 - i) for i in range(8))
-    check_digit = check_sum % 11
-    if check_digit < 10:
-        return check_digit == int(nif[8])
-    else:
-        return 0 == int(nif[8])
+    # Weighted sum over the ASCII codes directly: the '0' offset contributes
+    # 48 * sum(NIF_WEIGHTS) = 2112 = 11 * 192, which vanishes mod 11
+    digits = nif.encode('ascii')
+    check_digit = 11 - sum(map(operator.mul, digits, NIF_WEIGHTS)) % 11
+    if check_digit >= 10:
+        check_digit = 0
+    return check_digit == digits[8] - 48
 
 
 def sanitize_html_content(content: str) -> str:
     """Sanitize HTML content for safe display."""
-    return bleach.clean(
-        content,
-        tags=['p', 'br', 'strong', 'em', 'u', 'h1', 'h2', 'h3', 'ul', 'ol', 'li'],
-        attributes={},
-        strip=True
-    )
+    return nh3.clean(content, tags=SANITIZE_HTML_TAGS, attributes={})
 
 
 # Security configuration and setup
 def setup_security_framework(app, db_session: Session):
     """Setup comprehensive security framework for the application."""
     
+    global _security_manager
+    
     # Initialize security components
-    security_manager = SecurityManager(db_session)
-    gdpr_manager = GDPRComplianceManager(db_session)
     security_middleware = SecurityMiddleware(db_session)
+    security_manager = _security_manager = security_middleware.security_manager
+    gdpr_manager = GDPRComplianceManager(db_session)
     
     # Add security middleware
     app.middleware("http")(security_middleware)
@@ -770,12 +1496,12 @@ def setup_security_framework(app, db_session: Session):
     @app.get("/api/v1/gdpr/export/{user_id}")
     async def export_user_data(user_id: str):
         """Export user data for GDPR portability."""
-        exported_data = gdpr_manager.export_user_data(user_id)
-        
-        if "error" in exported_data:
-            raise HTTPException(status_code=404, detail=exported_data["error"])
+        try:
+            chunks = gdpr_manager.stream_user_data_export(user_id)
+        except Exception as e:
+            raise HTTPException(status_code=404, detail=f"Failed to export user data: {str(e)}")
         
-        return exported_data
+        return StreamingResponse(chunks, media_type="application/json")
     
     @app.delete("/api/v1/gdpr/delete/{user_id}")
     async def delete_user_data(user_id: str):
@@ -4,18 +4,163 @@ Comprehensive security protection with rate limiting, headers, and monitoring
 """
 
 import time
-import json
 import logging
+from functools import lru_cache
 from typing import Dict, Any, Optional, Callable
 from fastapi import Request, Response, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
-from collections import defaultdict, deque
-from datetime import datetime, timedelta
 import re
 import html
-from .security_validator import SecurityValidator
+import orjson
+import redis
+from .security_validator import validator as security_validator
+
+
+# Request path patterns that indicate probing or injection attempts, by name
+SUSPICIOUS_PATTERNS = {
+    "sql_union": r'union\s+select',
+    "sql_drop": r'drop\s+table',
+    "sql_insert": r'insert\s+into',
+    "sql_update": r'update\s+\w+\s+set',
+    "sql_delete": r'delete\s+from',
+    "script_tag": r'<script',
+    "javascript_uri": r'javascript:',
+    "onerror_handler": r'onerror=',
+    "path_traversal": r'\.\./',
+    "encoded_path_traversal": r'%2e%2e%2f',
+    "eval_call": r'eval\s*\(',
+    "exec_call": r'exec\s*\(',
+}
+
+# Single alternation so a path is scanned once; lastgroup names the match
+SUSPICIOUS_PATTERN = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, pattern in SUSPICIOUS_PATTERNS.items()),
+    re.IGNORECASE
+)
+
+# Response body patterns that indicate sensitive data leakage, by name
+SENSITIVE_RESPONSE_PATTERNS = {
+    "password_field": rb'"password":\s*"[^"]*"',
+    "secret_field": rb'"secret":\s*"[^"]*"',
+    "token_field": rb'"token":\s*"[^"]*"',
+    "key_field": rb'"key":\s*"[^"]*"',
+    "sql_error": rb'SQL\s+syntax',
+    "database_mention": rb'database',
+    "table_mention": rb'table\s+\w+',
+}
+
+# Byte-level alternation so response bodies are scanned once without decoding
+SENSITIVE_RESPONSE_PATTERN = re.compile(
+    b"|".join(b"(?P<%s>%s)" % (name.encode(), pattern) for name, pattern in SENSITIVE_RESPONSE_PATTERNS.items()),
+    re.IGNORECASE
+)
+
+# Path prefixes exempt from security checks
+SECURITY_SKIP_PREFIXES = (
+    "/health",
+    "/metrics",
+    "/favicon.ico",
+    "/static/",
+    "/docs",
+    "/redoc",
+    "/openapi.json",
+)
+
+# Path prefixes exempt from input validation
+VALIDATION_SKIP_PREFIXES = (
+    "/health",
+    "/metrics",
+    "/docs",
+    "/openapi.json",
+)
+
+# Endpoints that require strict security handling
+CRITICAL_ENDPOINT_PREFIXES = (
+    "/analytics/track",
+    "/analytics/user/",
+    "/analytics/system/",
+    "/api/v1/analytics/",
+)
+
+# Endpoints whose responses are checked for data leakage
+RESPONSE_VALIDATION_PREFIXES = (
+    "/analytics/user/",
+    "/analytics/system/",
+    "/api/v1/analytics/",
+)
+
+# Only textual responses can leak sensitive fields worth scanning for
+RESPONSE_SCAN_CONTENT_TYPES = (
+    "application/json",
+    "text/",
+)
+
+# Static security headers added to every checked response
+SECURITY_HEADERS = {
+    'X-Content-Type-Options': 'nosniff',
+    'X-Frame-Options': 'DENY',
+    'X-XSS-Protection': '1; mode=block',
+    'Strict-Transport-Security': 'max-age=31536000; includeSubDomains',
+    'Content-Security-Policy': (
+        "default-src 'self'; "
+        "script-src 'self' 'unsafe-inline'; "
+        "style-src 'self' 'unsafe-inline'; "
+        "img-src 'self' data: https:; "
+        "font-src 'self'; "
+        "connect-src 'self'; "
+        "frame-ancestors 'none';"
+    ),
+    'Referrer-Policy': 'strict-origin-when-cross-origin',
+    'Permissions-Policy': 'geolocation=(), microphone=(), camera=()',
+}
+
+# Fixed error bodies are encoded once; rejections are the hot path under attack
+RATE_LIMITED_BODY = orjson.dumps({
+    "error": "Too Many Requests",
+    "message": "Rate limit exceeded. Please try again later.",
+    "retry_after": 60
+})
+INVALID_CHARACTERS_BODY = orjson.dumps({
+    "error": "Bad Request",
+    "message": "Request contains invalid characters"
+})
+INTERNAL_ERROR_BODY = orjson.dumps({
+    "error": "Internal Server Error",
+    "message": "An error occurred processing your request"
+})
+
+# Bodies larger than this are treated as streamed exports and not scanned
+RESPONSE_SCAN_MAX_BYTES = 1024 * 1024
+
+# Redis keys shared by all workers for rate limit windows and IP blocks
+RATE_LIMIT_KEY_PREFIX = "security_middleware:rate:"
+BLOCKED_IP_KEY_PREFIX = "security_middleware:blocked:"
+
+# Seconds between sweeps of expired IP blocks and stale rate limit buckets
+STATE_SWEEP_INTERVAL = 60
+
+# Most traffic hits a small set of paths, so prefix checks are memoized per path
+PATH_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def should_skip_security_check(path: str) -> bool:
+    """Check if security checks should be skipped for this path"""
+    return path.startswith(SECURITY_SKIP_PREFIXES)
+
+
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def is_critical_endpoint(path: str) -> bool:
+    """Check if endpoint is critical and requires strict security"""
+    return path.startswith(CRITICAL_ENDPOINT_PREFIXES)
+
+
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def requires_response_validation(path: str) -> bool:
+    """Check if response validation is required"""
+    return path.startswith(RESPONSE_VALIDATION_PREFIXES)
 
 
 class AnalyticsSecurityMiddleware(BaseHTTPMiddleware):
@@ -23,90 +168,85 @@ class AnalyticsSecurityMiddleware(BaseHTTPMiddleware):
     Comprehensive security middleware for analytics endpoints
     """
     
-    def __init__(self, app: ASGIApp, rate_limit_per_minute: int = 100):
+    def __init__(self, app: ASGIApp, rate_limit_per_minute: int = 100,
+                 redis_client: Optional[redis.Redis] = None):
         super().__init__(app)
         self.rate_limit = rate_limit_per_minute
+        # Shared store so the limit holds across uvicorn workers; in-process state is the fallback
+        self.redis_client = redis_client
         self.rate_limit_window = 60  # seconds
-        self.request_counts = defaultdict(deque)
-        self.blocked_ips = defaultdict(float)
-        self.security_validator = SecurityValidator()
+        self.request_counts: Dict[str, list] = {}  # ip -> [window start, count, previous count]
+        self.blocked_ips: Dict[str, float] = {}  # ip -> block expiry
+        self._next_sweep = time.monotonic() + STATE_SWEEP_INTERVAL
+        self.security_validator = security_validator
         self.security_logger = logging.getLogger('analytics_security_middleware')
-        
-        # Suspicious patterns to monitor
-        self.suspicious_patterns = [
-            r'union\s+select',
-            r'drop\s+table',
-            r'insert\s+into',
-            r'update\s+\w+\s+set',
-            r'delete\s+from',
-            r'<script',
-            r'javascript:',
-            r'onerror=',
-            r'\.\./',
-            r'%2e%2e%2f',
-            r'eval\s*\(',
-            r'exec\s*\(',
-        ]
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        client_ip = self._get_client_ip(request)
         request_path = request.url.path
-        request_method = request.method
         
         # Skip security checks for health checks and static files
-        if self._should_skip_security_check(request_path):
+        if should_skip_security_check(request_path):
             return await call_next(request)
         
+        client_ip = self._get_client_ip(request)
+        request_method = request.method
+        logger = self.security_logger
+        
+        # One monotonic clock read serves all checks for this request
+        now = time.monotonic()
+        
+        # Periodically drop expired blocks and idle rate limit state
+        if now >= self._next_sweep:
+            self._sweep_expired_state(now)
+        
         # Check if IP is temporarily blocked
-        if self._is_ip_blocked(client_ip):
-            self.security_logger.warning(f"Blocked request from banned IP: {client_ip}")
-            return JSONResponse(
+        if self._is_ip_blocked(client_ip, now):
+            logger.warning("Blocked request from banned IP: %s", client_ip)
+            return ORJSONResponse(
                 status_code=429,
                 content={
                     "error": "Too Many Requests",
                     "message": "Your IP has been temporarily blocked due to suspicious activity",
-                    "retry_after": int(self._get_block_remaining_time(client_ip))
+                    "retry_after": int(self._get_block_remaining_time(client_ip, now))
                 }
             )
         
         # Rate limiting
-        if not self._check_rate_limit(client_ip):
-            self._block_ip(client_ip, duration=300)  # 5 minutes
-            self.security_logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            return JSONResponse(
+        if not self._check_rate_limit(client_ip, now):
+            self._block_ip(client_ip, duration=300, now=now)  # 5 minutes
+            logger.warning("Rate limit exceeded for IP: %s", client_ip)
+            return Response(
+                content=RATE_LIMITED_BODY,
                 status_code=429,
-                content={
-                    "error": "Too Many Requests",
-                    "message": "Rate limit exceeded. Please try again later.",
-                    "retry_after": 60
-                }
+                media_type="application/json"
             )
         
         # Log request for monitoring
         self._log_request(client_ip, request_method, request_path, request.headers)
         
+        # Monitor for suspicious patterns before the handler runs, so rejected
+        # requests never reach downstream code
+        suspicious_pattern = self._find_suspicious_pattern(request_path)
+        if suspicious_pattern:
+            is_critical = is_critical_endpoint(request_path)
+            self._log_suspicious_activity(client_ip, request_method, request_path,
+                                          suspicious_pattern, is_critical)
+            
+            # For critical endpoints, return sanitized response
+            if is_critical:
+                return Response(
+                    content=INVALID_CHARACTERS_BODY,
+                    status_code=400,
+                    media_type="application/json"
+                )
+        
         # Process the request
-        start_time = time.time()
         response = await call_next(request)
-        process_time = time.time() - start_time
+        process_time = time.monotonic() - now
         
         # Add security headers
         response = self._add_security_headers(response)
         
-        # Monitor for suspicious patterns in request
-        if self._contains_suspicious_patterns(request_path):
-            self._log_suspicious_activity(client_ip, request_method, request_path)
-            
-            # For critical endpoints, return sanitized response
-            if self._is_critical_endpoint(request_path):
-                return JSONResponse(
-                    status_code=400,
-                    content={
-                        "error": "Bad Request",
-                        "message": "Request contains invalid characters"
-                    }
-                )
-        
         # Add performance header
         response.headers["X-Process-Time"] = str(process_time)
         
@@ -128,120 +268,154 @@ class AnalyticsSecurityMiddleware(BaseHTTPMiddleware):
     
     def _should_skip_security_check(self, path: str) -> bool:
         """Check if security checks should be skipped for this path"""
-        skip_patterns = [
-            "/health",
-            "/metrics",
-            "/favicon.ico",
-            "/static/",
-            "/docs",
-            "/redoc",
-            "/openapi.json"
-        ]
-        
-        return any(path.startswith(pattern) for pattern in skip_patterns)
+        return should_skip_security_check(path)
     
-    def _check_rate_limit(self, client_ip: str) -> bool:
-        """Check if client is within rate limits"""
-        now = time.time()
-        window_start = now - self.rate_limit_window
+    def _check_rate_limit(self, client_ip: str, now: Optional[float] = None) -> bool:
+        """
+        Check if client is within rate limits
+        
+        With Redis, each window is one counter key per IP, incremented and
+        given an expiry in a single pipelined round trip. Otherwise a sliding
+        window counter in process memory is used: each IP keeps only the
+        counts of the current and previous fixed windows, and the previous
+        count is weighted by how much of it still overlaps the sliding window.
+        """
+        if self.redis_client is not None:
+            try:
+                return self._check_redis_rate_limit(client_ip)
+            except redis.RedisError as e:
+                self.security_logger.warning("Redis rate limit check failed, using in-process limits: %s", e)
         
-        # Clean old entries
-        while self.request_counts[client_ip] and self.request_counts[client_ip][0] < window_start:
-            self.request_counts[client_ip].popleft()
+        if now is None:
+            now = time.monotonic()
+        window = self.rate_limit_window
+        window_start = now - now % window
+        counts = self.request_counts
         
-        # Check current count
-        if len(self.request_counts[client_ip]) >= self.rate_limit:
+        bucket = counts.get(client_ip)
+        if bucket is None or bucket[0] != window_start:
+            # Carry the last window's count only if it directly precedes this one
+            previous = bucket[1] if bucket is not None and bucket[0] == window_start - window else 0
+            bucket = counts[client_ip] = [window_start, 0, previous]
+        
+        estimate = bucket[1]
+        # The weighted term only matters while the previous window had traffic
+        if bucket[2]:
+            estimate += bucket[2] * (1.0 - (now - window_start) / window)
+        if estimate >= self.rate_limit:
             return False
         
         # Add current request
-        self.request_counts[client_ip].append(now)
+        bucket[1] += 1
         return True
     
-    def _is_ip_blocked(self, client_ip: str) -> bool:
-        """Check if IP is currently blocked"""
-        if client_ip in self.blocked_ips:
-            block_time = self.blocked_ips[client_ip]
-            if time.time() < block_time:
-                return True
-            else:
-                # Unblock expired IP
-                del self.blocked_ips[client_ip]
-        return False
+    def _check_redis_rate_limit(self, client_ip: str) -> bool:
+        """Count this request in the shared fixed window for client_ip"""
+        window = self.rate_limit_window
+        # Wall clock, not monotonic: window keys must line up across workers and hosts
+        key = f"{RATE_LIMIT_KEY_PREFIX}{client_ip}:{int(time.time()) // window}"
+        pipe = self.redis_client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, window)
+        count, _ = pipe.execute()
+        return count <= self.rate_limit
     
-    def _block_ip(self, client_ip: str, duration: int = 300):
+    def _is_ip_blocked(self, client_ip: str, now: Optional[float] = None) -> bool:
+        """Check if IP is currently blocked; expired blocks are removed by the sweep"""
+        if self.redis_client is not None:
+            try:
+                return bool(self.redis_client.exists(f"{BLOCKED_IP_KEY_PREFIX}{client_ip}"))
+            except redis.RedisError as e:
+                self.security_logger.warning("Redis block check failed, using in-process blocks: %s", e)
+        
+        if now is None:
+            now = time.monotonic()
+        return now < self.blocked_ips.get(client_ip, float('-inf'))
+    
+    def _sweep_expired_state(self, now: float):
+        """Remove expired IP blocks and rate limit buckets that no longer count"""
+        self.blocked_ips = {ip: until for ip, until in self.blocked_ips.items() if until > now}
+        
+        # Buckets older than the previous window contribute nothing to the estimate
+        previous_window = now - now % self.rate_limit_window - self.rate_limit_window
+        self.request_counts = {
+            ip: bucket for ip, bucket in self.request_counts.items() if bucket[0] >= previous_window
+        }
+        self._next_sweep = now + STATE_SWEEP_INTERVAL
+    
+    def _block_ip(self, client_ip: str, duration: int = 300, now: Optional[float] = None):
         """Temporarily block an IP address"""
-        self.blocked_ips[client_ip] = time.time() + duration
-        self.security_logger.warning(f"Blocked IP {client_ip} for {duration} seconds")
+        if now is None:
+            now = time.monotonic()
+        # Keep a local copy too, so the block still applies if Redis goes away
+        self.blocked_ips[client_ip] = now + duration
+        if self.redis_client is not None:
+            try:
+                self.redis_client.set(f"{BLOCKED_IP_KEY_PREFIX}{client_ip}", 1, ex=duration)
+            except redis.RedisError as e:
+                self.security_logger.warning("Redis block write failed for %s: %s", client_ip, e)
+        self.security_logger.warning("Blocked IP %s for %s seconds", client_ip, duration)
     
-    def _get_block_remaining_time(self, client_ip: str) -> int:
+    def _get_block_remaining_time(self, client_ip: str, now: Optional[float] = None) -> int:
         """Get remaining block time for an IP"""
+        if self.redis_client is not None:
+            try:
+                # TTL is -2 for a missing key and -1 for one without expiry
+                return max(0, self.redis_client.ttl(f"{BLOCKED_IP_KEY_PREFIX}{client_ip}"))
+            except redis.RedisError as e:
+                self.security_logger.warning("Redis block TTL lookup failed: %s", e)
+        
         if client_ip in self.blocked_ips:
-            remaining = self.blocked_ips[client_ip] - time.time()
+            remaining = self.blocked_ips[client_ip] - (time.monotonic() if now is None else now)
             return max(0, int(remaining))
         return 0
     
     def _log_request(self, client_ip: str, method: str, path: str, headers: Dict[str, str]):
         """Log request for security monitoring"""
-        self.security_logger.info(f"Request: {method} {path}", extra={
+        logger = self.security_logger
+        # Skip building the extra dict when INFO is filtered out, as it usually is in production
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        logger.info("Request: %s %s", method, path, extra={
             "client_ip": client_ip,
             "method": method,
             "path": path,
-            "user_agent": headers.get("user-agent", ""),
-            "timestamp": datetime.utcnow().isoformat()
+            "user_agent": headers.get("user-agent", "")
         })
     
     def _contains_suspicious_patterns(self, text: str) -> bool:
         """Check if text contains suspicious patterns"""
-        text_lower = text.lower()
-        return any(re.search(pattern, text_lower) for pattern in self.suspicious_patterns)
+        return self._find_suspicious_pattern(text) is not None
+    
+    def _find_suspicious_pattern(self, text: str) -> Optional[str]:
+        """Return the name of the first suspicious pattern found in text"""
+        match = SUSPICIOUS_PATTERN.search(text)
+        return match.lastgroup if match else None
     
     def _is_critical_endpoint(self, path: str) -> bool:
         """Check if endpoint is critical and requires strict security"""
-        critical_patterns = [
-            "/analytics/track",
-            "/analytics/user/",
-            "/analytics/system/",
-            "/api/v1/analytics/",
-        ]
-        
-        return any(path.startswith(pattern) for pattern in critical_patterns)
+        return is_critical_endpoint(path)
     
-    def _log_suspicious_activity(self, client_ip: str, method: str, path: str):
+    def _log_suspicious_activity(self, client_ip: str, method: str, path: str,
+                                 pattern: Optional[str] = None, is_critical: Optional[bool] = None):
         """Log suspicious activity"""
-        self.security_logger.warning(f"Suspicious activity detected", extra={
+        self.security_logger.warning("Suspicious activity detected", extra={
             "client_ip": client_ip,
             "method": method,
             "path": path,
             "activity_type": "suspicious_pattern",
-            "timestamp": datetime.utcnow().isoformat()
+            "pattern": pattern
         })
         
         # Automatically block IP for critical endpoints
-        if self._is_critical_endpoint(path):
+        if is_critical is None:
+            is_critical = self._is_critical_endpoint(path)
+        if is_critical:
             self._block_ip(client_ip, duration=600)  # 10 minutes
     
     def _add_security_headers(self, response: Response) -> Response:
         """Add comprehensive security headers to response"""
-        # Content Security Policy
-        csp = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline'; "
-            "style-src 'self' 'unsafe-inline'; "
-            "img-src 'self' data: https:; "
-            "font-src 'self'; "
-            "connect-src 'self'; "
-            "frame-ancestors 'none';"
-        )
-        
-        # Add headers
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'DENY'
-        response.headers['X-XSS-Protection'] = '1; mode=block'
-        response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
-        response.headers['Content-Security-Policy'] = csp
-        response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
-        response.headers['Permissions-Policy'] = 'geolocation=(), microphone=(), camera=()'
-        
+        response.headers.update(SECURITY_HEADERS)
         return response
 
 
@@ -252,24 +426,28 @@ class InputValidationMiddleware(BaseHTTPMiddleware):
     
     def __init__(self, app: ASGIApp):
         super().__init__(app)
-        self.security_validator = SecurityValidator()
+        self.security_validator = security_validator
         self.security_logger = logging.getLogger('input_validation_middleware')
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        request_path = request.url.path
+        
         # Skip validation for certain endpoints
-        if self._should_skip_validation(request.url.path):
+        if request_path.startswith(VALIDATION_SKIP_PREFIXES):
             return await call_next(request)
         
+        logger = self.security_logger
+        
         try:
             # Validate request data
             validation_error = await self._validate_request(request)
             if validation_error:
-                self.security_logger.warning(f"Request validation failed", extra={
-                    "path": request.url.path,
+                logger.warning("Request validation failed", extra={
+                    "path": request_path,
                     "client_ip": self._get_client_ip(request),
                     "validation_error": validation_error
                 })
-                return JSONResponse(
+                return ORJSONResponse(
                     status_code=400,
                     content={
                         "error": "Validation Error",
@@ -281,44 +459,31 @@ class InputValidationMiddleware(BaseHTTPMiddleware):
             response = await call_next(request)
             
             # Validate response data for critical endpoints
-            if self._requires_response_validation(request.url.path):
+            if requires_response_validation(request_path):
                 response = await self._validate_response(response, request)
             
             return response
             
         except Exception as e:
-            self.security_logger.error(f"Request processing error: {str(e)}", extra={
-                "path": request.url.path,
+            logger.error("Request processing error: %s", e, extra={
+                "path": request_path,
                 "client_ip": self._get_client_ip(request),
                 "error_type": type(e).__name__
             })
             
-            return JSONResponse(
+            return Response(
+                content=INTERNAL_ERROR_BODY,
                 status_code=500,
-                content={
-                    "error": "Internal Server Error",
-                    "message": "An error occurred processing your request"
-                }
+                media_type="application/json"
             )
     
     def _should_skip_validation(self, path: str) -> bool:
         """Check if validation should be skipped"""
-        skip_patterns = [
-            "/health",
-            "/metrics",
-            "/docs",
-            "/openapi.json"
-        ]
-        return any(path.startswith(pattern) for pattern in skip_patterns)
+        return path.startswith(VALIDATION_SKIP_PREFIXES)
     
     def _requires_response_validation(self, path: str) -> bool:
         """Check if response validation is required"""
-        critical_patterns = [
-            "/analytics/user/",
-            "/analytics/system/",
-            "/api/v1/analytics/"
-        ]
-        return any(path.startswith(pattern) for pattern in critical_patterns)
+        return requires_response_validation(path)
     
     async def _validate_request(self, request: Request) -> Optional[str]:
         """Validate request data"""
@@ -350,7 +515,9 @@ class InputValidationMiddleware(BaseHTTPMiddleware):
                 if body:
                     content_type = request.headers.get('content-type', '')
                     if 'application/json' in content_type:
-                        data = json.loads(body)
+                        data = orjson.loads(body)
+                        # Handlers can reuse the parsed body instead of decoding it again
+                        request.state.parsed_body = data
                         if isinstance(data, dict):
                             # Validate and sanitize event data
                             if 'user_id' in data:
@@ -358,7 +525,7 @@ class InputValidationMiddleware(BaseHTTPMiddleware):
                             
                             if 'data' in data:
                                 self.security_validator.validate_event_data(data['data'])
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 return "Invalid JSON in request body"
             except Exception as e:
                 return f"Request validation error: {str(e)}"
@@ -367,37 +534,31 @@ class InputValidationMiddleware(BaseHTTPMiddleware):
     
     async def _validate_response(self, response: Response, request: Request) -> Response:
         """Validate response data"""
-        # For critical endpoints, ensure response doesn't contain sensitive data
-        if hasattr(response, 'body'):
-            try:
-                response_text = response.body.decode('utf-8')
-                # Check for potential data leakage
-                sensitive_patterns = [
-                    r'"password":\s*"[^"]*"',
-                    r'"secret":\s*"[^"]*"',
-                    r'"token":\s*"[^"]*"',
-                    r'"key":\s*"[^"]*"',
-                    r'SQL\s+syntax',
-                    r'database',
-                    r'table\s+\w+'
-                ]
-                
-                for pattern in sensitive_patterns:
-                    if re.search(pattern, response_text, re.IGNORECASE):
-                        self.security_logger.warning(f"Potential data leakage detected", extra={
-                            "path": request.url.path,
-                            "pattern": pattern
-                        })
-                        # Return sanitized error response
-                        return JSONResponse(
-                            status_code=500,
-                            content={
-                                "error": "Internal Server Error",
-                                "message": "An error occurred processing your request"
-                            }
-                        )
-            except Exception:
-                pass  # Ignore encoding errors
+        # Streaming responses have no buffered body to inspect
+        if isinstance(response, StreamingResponse):
+            return response
+        
+        body = getattr(response, 'body', b'')
+        if not body or len(body) > RESPONSE_SCAN_MAX_BYTES:
+            return response
+        
+        content_type = response.headers.get('content-type', '')
+        if not content_type.startswith(RESPONSE_SCAN_CONTENT_TYPES):
+            return response
+        
+        # Check for potential data leakage directly on the raw bytes
+        match = SENSITIVE_RESPONSE_PATTERN.search(body)
+        if match:
+            self.security_logger.warning("Potential data leakage detected", extra={
+                "path": request.url.path,
+                "pattern": match.lastgroup
+            })
+            # Return sanitized error response
+            return Response(
+                content=INTERNAL_ERROR_BODY,
+                status_code=500,
+                media_type="application/json"
+            )
         
         return response
     
@@ -5,36 +5,68 @@ Comprehensive protection against SQL injection, XSS, and other injection attacks
 
 import re
 import html
+import time
+import secrets
+import string
 import json
+from functools import lru_cache
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Union
-from urllib.parse import urlparse
+from typing import Any, Callable, Dict, List, Optional, Pattern, Sequence, Tuple, Union
+from urllib.parse import urlsplit
 import logging
 from sqlalchemy.exc import SQLAlchemyError
 
 
+# User, session, IP and URL values repeat across events; their checks are memoized per value
+VALIDATION_CACHE_SIZE = 10_000
+
+# Accepted analytics window: up to a year back, with a day of slack for clock skew
+_ONE_YEAR = timedelta(days=365)
+_ONE_DAY = timedelta(days=1)
+
+# Constant part of every security event record; per-event fields are merged onto a copy
+_EVENT_BASE = {"security_event": True}
+
+
 class SecurityValidator:
     """
     Comprehensive input validation and sanitization service
     """
     
     # SQL injection patterns to detect and block
+    # Gaps between keywords may not run past a later occurrence of the opening
+    # token that could start a match of its own. That later attempt then matches
+    # instead, so a value is flagged exactly when an unbounded gap would flag it
+    # (sanitization may keep the earlier, unmatched keyword), while each character
+    # is scanned by at most one attempt and repeated keywords cannot backtrack
+    # quadratically. Quote chains use negated classes for the same reason.
     SQL_INJECTION_PATTERNS = [
-        r"(?i)(\bunion\b.*\bselect\b|\bor\b.*\b1\b=\b1\b|'.*'.*'.*'|\";.*\")",
+        r"(?i)(\bunion\b(?:(?!\bunion\b).)*?\bselect\b|\bor\b(?:(?!\bor\b).)*?\b1\b=\b1\b|'[^'\n]*'[^'\n]*'[^'\n]*'|\";[^\"\n]*\")",
         r"(?i)(exec|execute|script|scripting|javascript:|vbscript:)",
         r"(?i)(\bor\b\s*\d+\s*=\s*\d+|and\s*\d+\s*=\s*\d+)",
         r"(?i)(\bdrop\b\s+\btable\b|\bdelete\b\s+from\s+\b|\binsert\b\s+into\s+\b)",
-        r"(?i)(\bupdate\b\s+\b.*\bset\b|\balter\b\s+\btable\b|\bcreate\b\s+\btable\b)"
+        r"(?i)(\bupdate\b\s++\b(?:(?!\bupdate\b\s++\b).)*?\bset\b|\balter\b\s+\btable\b|\bcreate\b\s+\btable\b)"
     ]
     
-    # XSS patterns to detect and sanitize
+    # Short names for SQL_INJECTION_PATTERNS, by index, used in security event logs
+    SQL_INJECTION_PATTERN_NAMES = (
+        "union_select_or_quote_chain",
+        "script_keyword",
+        "numeric_tautology",
+        "drop_delete_insert",
+        "update_alter_create",
+    )
+    
+    # XSS patterns to detect and sanitize (tag bodies and handler names are
+    # unbounded but, as above, stop at a later opening tag or "on" that could
+    # start a match itself)
     XSS_PATTERNS = [
-        r"<script[^>]*>.*?</script>",
+        r"<script(?:(?!<script)[^>])*+>(?:(?!<script(?:(?!<script|</script)[^>])*+>).)*?</script>",
         r"javascript:",
-        r"on\w+\s*=",
-        r"<iframe[^>]*>.*?</iframe>",
-        r"<object[^>]*>.*?</object>",
-        r"<embed[^>]*>.*?</embed>",
+        r"on(?:(?!on\w)\w)++\s*=",
+        r"<iframe(?:(?!<iframe)[^>])*+>(?:(?!<iframe(?:(?!<iframe|</iframe)[^>])*+>).)*?</iframe>",
+        r"<object(?:(?!<object)[^>])*+>(?:(?!<object(?:(?!<object|</object)[^>])*+>).)*?</object>",
+        r"<embed(?:(?!<embed)[^>])*+>(?:(?!<embed(?:(?!<embed|</embed)[^>])*+>).)*?</embed>",
         r"vbscript:",
         r"data:text/html"
     ]
@@ -49,6 +81,44 @@ class SecurityValidator:
         r"\.\.%5c"
     ]
     
+    # Compiled once so validation calls skip the re module's pattern cache lookup
+    _SQL_RE = tuple(re.compile(pattern, re.IGNORECASE) for pattern in SQL_INJECTION_PATTERNS)
+    _XSS_RE = tuple(re.compile(pattern, re.IGNORECASE | re.DOTALL) for pattern in XSS_PATTERNS)
+    
+    # One alternation per category, so a clean value is scanned once rather than once per pattern
+    _SQL_COMBINED = re.compile(
+        "|".join(f"(?:{pattern.removeprefix('(?i)')})" for pattern in SQL_INJECTION_PATTERNS),
+        re.IGNORECASE
+    )
+    _XSS_COMBINED = re.compile(
+        "|".join(f"(?:{pattern})" for pattern in XSS_PATTERNS),
+        re.IGNORECASE | re.DOTALL
+    )
+    
+    # URLs are screened against every signature set in a single pass; XSS
+    # alternatives keep their DOTALL behaviour through a scoped flag group
+    _URL_THREATS_COMBINED = re.compile(
+        "|".join(
+            [f"(?:{pattern.removeprefix('(?i)')})" for pattern in SQL_INJECTION_PATTERNS]
+            + [f"(?s:{pattern})" for pattern in XSS_PATTERNS]
+        ),
+        re.IGNORECASE
+    )
+    # The handler pattern above starts at the last "on" of a name, which is enough
+    # to detect it; sanitization removes the whole "on..." handler name instead,
+    # matching each word run once and cutting it in _strip_event_handler
+    _EVENT_HANDLER_INDEX = 2
+    _EVENT_HANDLER_RUN = re.compile(r"\b\w++\s*+=")
+    _HANDLER_NAME_START = re.compile(r"on\w", re.IGNORECASE)
+    _UNSAFE_USER_ID_CHARS = re.compile(r'[^\w\-_.@]')
+    _UNSAFE_SESSION_ID_CHARS = re.compile(r'[^\w\-]')
+    _UNSAFE_KEY_CHARS = re.compile(r'[^a-zA-Z0-9_]')
+    _IP_HEX_CHARS = frozenset('0123456789abcdefABCDEF:')
+    _USER_ID_SAFE_CHARS = frozenset(string.ascii_letters + string.digits + '_-.@')
+    
+    # Value types a schema validator checks with an exact type() comparison
+    _SCHEMA_VALUE_TYPES = (str, int, float, bool, type(None))
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.security_events_logger = logging.getLogger('security_events')
@@ -71,17 +141,15 @@ class SecurityValidator:
         if len(user_id_str) > 100:
             raise ValueError("User ID too long")
         
-        # Check for SQL injection patterns
-        if self._contains_sql_injection_patterns(user_id_str):
+        # Check for SQL injection patterns and remove any potentially dangerous characters
+        safe_user_id = _clean_user_id(user_id_str)
+        if safe_user_id is None:
             self._log_security_event("sql_injection_attempt", {
                 "user_id": user_id_str,
-                "pattern_detected": self._detect_patterns(user_id_str, self.SQL_INJECTION_PATTERNS)
+                "sql_pattern_mask": self._detect_patterns(user_id_str, self._SQL_RE)
             })
             raise ValueError("Invalid user ID format")
         
-        # Remove any potentially dangerous characters
-        safe_user_id = re.sub(r'[^\w\-_.@]', '', user_id_str)
-        
         if safe_user_id != user_id_str:
             self._log_security_event("user_id_sanitization", {
                 "original": user_id_str,
@@ -94,21 +162,21 @@ class SecurityValidator:
         """
         Validate and sanitize date range parameters
         """
+        if start_date or end_date:
+            now = datetime.now()
+            min_date = now - _ONE_YEAR
+            max_date = now + _ONE_DAY
+        
         # Validate start_date
         if start_date:
             try:
-                if isinstance(start_date, str):
-                    start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                else:
-                    start_dt = start_date
+                start_dt = self._parse_date(start_date)
                 
                 # Check for reasonable date range (not more than 1 year ago)
-                min_date = datetime.now() - timedelta(days=365)
                 if start_dt < min_date:
                     raise ValueError("Start date too far in the past")
                 
                 # Check for future dates (allow some buffer)
-                max_date = datetime.now() + timedelta(days=1)
                 if start_dt > max_date:
                     raise ValueError("Start date cannot be in the future")
                     
@@ -118,33 +186,36 @@ class SecurityValidator:
         # Validate end_date
         if end_date:
             try:
-                if isinstance(end_date, str):
-                    end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                else:
-                    end_dt = end_date
+                end_dt = self._parse_date(end_date)
                 
                 # Check for reasonable date range
-                min_date = datetime.now() - timedelta(days=365)
                 if end_dt < min_date:
                     raise ValueError("End date too far in the past")
                     
-                max_date = datetime.now() + timedelta(days=1)
                 if end_dt > max_date:
                     raise ValueError("End date cannot be in the future")
                     
             except (ValueError, TypeError) as e:
                 raise ValueError(f"Invalid end date format: {e}")
         
-        # Ensure start_date <= end_date if both provided
+        # Ensure start_date <= end_date if both provided, reusing the parsed values
         if start_date and end_date:
-            start_dt = start_date if not isinstance(start_date, str) else datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            end_dt = end_date if not isinstance(end_date, str) else datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            
             if start_dt > end_dt:
                 raise ValueError("Start date cannot be after end date")
         
         return start_date, end_date
     
+    @staticmethod
+    def _parse_date(value: Any) -> Any:
+        """
+        Parse an ISO 8601 string (with optional trailing 'Z'); other values pass through
+        """
+        if not isinstance(value, str):
+            return value
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        return datetime.fromisoformat(value)
+    
     def validate_event_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Validate and sanitize event data dictionary
@@ -153,19 +224,25 @@ class SecurityValidator:
             raise ValueError("Event data must be a dictionary")
         
         sanitized_data = {}
+        clean_strings = self._screen_string_values(data)
         
         for key, value in data.items():
             # Validate key
-            if not isinstance(key, str) or not key.strip():
+            if not isinstance(key, str):
                 continue
             
             # Sanitize key (alphanumeric and underscore only)
-            safe_key = re.sub(r'[^a-zA-Z0-9_]', '', key.strip())
+            safe_key = _sanitize_event_key(key)
+            if safe_key is None:
+                continue
             
             # Validate and sanitize value
             if isinstance(value, str):
                 # Check for XSS and SQL injection in string values
-                sanitized_value = self._sanitize_string(value)
+                if clean_strings is not None:
+                    sanitized_value = clean_strings[key].strip()
+                else:
+                    sanitized_value = self._sanitize_string(value)
                 
                 # Validate length
                 if len(sanitized_value) > 1000:
@@ -215,6 +292,109 @@ class SecurityValidator:
         
         return sanitized_data
     
+    def make_schema_validator(self, schema: Dict[str, type]) -> Callable[[Any], Dict[str, Any]]:
+        """
+        Build an event data validator specialized for a fixed set of keys and value types.
+        
+        The validator is generated as Python source and compiled once. Payloads
+        with exactly the schema's keys and value types get the same result as
+        validate_event_data without its per-item type dispatch; any other payload,
+        including out-of-range numbers, is handed to validate_event_data.
+        """
+        fields = []
+        safe_keys = set()
+        for key, value_type in schema.items():
+            if not isinstance(key, str):
+                raise ValueError("Schema keys must be strings")
+            if value_type not in self._SCHEMA_VALUE_TYPES:
+                raise ValueError(f"Unsupported schema type for {key!r}: {value_type!r}")
+            
+            # Keys that sanitize to nothing are dropped, as validate_event_data does
+            safe_key = _sanitize_event_key(key)
+            if safe_key is not None:
+                if safe_key in safe_keys:
+                    raise ValueError(f"Schema keys collide after sanitizing: {safe_key!r}")
+                safe_keys.add(safe_key)
+            fields.append((key, safe_key, value_type))
+        
+        source = self._schema_validator_source(fields)
+        namespace: Dict[str, Any] = {}
+        exec(compile(source, f"<schema validator {sorted(schema)}>", "exec"), namespace)
+        # Security events are looked up at call time, so later changes to the
+        # instance's logging (or a patched _log_security_event) still apply
+        return namespace["build"](
+            fallback=self.validate_event_data,
+            escape=self._escape_value,
+            sanitize=self._sanitize_string,
+            may_contain_xss=self._may_contain_xss,
+            sql_search=self._SQL_COMBINED.search,
+            log_event=lambda event_type, details: self._log_security_event(event_type, details),
+        )
+    
+    @staticmethod
+    def _schema_validator_source(fields: Sequence[Tuple[str, Optional[str], type]]) -> str:
+        """
+        Generate the source of a validator factory for (key, safe_key, type) fields
+        """
+        kept = [(index, key, safe_key, value_type)
+                for index, (key, safe_key, value_type) in enumerate(fields) if safe_key is not None]
+        
+        lines = [
+            "def build(fallback, escape, sanitize, may_contain_xss, sql_search, log_event):",
+            "    def validate(data):",
+            f"        if type(data) is not dict or len(data) != {len(fields)}:",
+            "            return fallback(data)",
+            "        try:",
+        ]
+        lines += [f"            v{index} = data[{key!r}]" for index, (key, _, _) in enumerate(fields)]
+        lines += [
+            "        except KeyError:",
+            "            return fallback(data)",
+        ]
+        
+        checks = []
+        for index, _, _, value_type in kept:
+            if value_type is type(None):
+                checks.append(f"v{index} is not None")
+            else:
+                checks.append(f"type(v{index}) is not {value_type.__name__}")
+            if value_type is int:
+                checks.append(f"not -1000000 <= v{index} <= 1000000")
+            elif value_type is float:
+                checks.append(f"not -1000000.0 <= v{index} <= 1000000.0")
+        if checks:
+            lines.append(f"        if {' or '.join(checks)}:")
+            lines.append("            return fallback(data)")
+        
+        strings = [(index, safe_key) for index, _, safe_key, value_type in kept if value_type is str]
+        if strings:
+            # Same single screening pass over the escaped values as _screen_string_values
+            lines += [f"        e{index} = escape(v{index})" for index, _ in strings]
+            joined = " + '\\x00' + ".join(f"e{index}" for index, _ in strings)
+            lines.append(f"        joined = {joined}")
+            lines.append("        if may_contain_xss(joined) or sql_search(joined):")
+            lines += [f"            s{index} = sanitize(v{index})" for index, _ in strings]
+            lines.append("        else:")
+            lines += [f"            s{index} = e{index}.strip()" for index, _ in strings]
+            for index, safe_key in strings:
+                lines += [
+                    f"        if len(s{index}) > 1000:",
+                    f"            s{index} = s{index}[:1000]",
+                    "            log_event('data_truncated', {",
+                    f"                'key': {safe_key!r},",
+                    f"                'original_length': len(v{index}),",
+                    "                'truncated_length': 1000",
+                    "            })",
+                ]
+        
+        items = ", ".join(
+            f"{safe_key!r}: {'s' if value_type is str else 'v'}{index}"
+            for index, _, safe_key, value_type in kept
+        )
+        lines.append(f"        return {{{items}}}")
+        lines.append("    return validate")
+        return "\n".join(lines) + "\n"
+    
     def validate_session_id(self, session_id: Any) -> str:
         """
         Validate and sanitize session ID
@@ -224,21 +404,15 @@ class SecurityValidator:
         
         session_id_str = str(session_id).strip()
         
-        # Check for injection patterns
-        if self._contains_sql_injection_patterns(session_id_str):
+        # Check for injection patterns and length, keeping only safe characters
+        safe_session_id = _clean_session_id(session_id_str)
+        if safe_session_id is None:
             self._log_security_event("session_id_injection_attempt", {
                 "session_id": session_id_str,
-                "pattern_detected": self._detect_patterns(session_id_str, self.SQL_INJECTION_PATTERNS)
+                "sql_pattern_mask": self._detect_patterns(session_id_str, self._SQL_RE)
             })
             return self._generate_safe_session_id()
         
-        # Check length
-        if len(session_id_str) > 100:
-            raise ValueError("Session ID too long")
-        
-        # Use only safe characters
-        safe_session_id = re.sub(r'[^\w\-]', '', session_id_str)
-        
         if not safe_session_id:
             return self._generate_safe_session_id()
         
@@ -253,17 +427,10 @@ class SecurityValidator:
         
         ip_str = str(ip_address).strip()
         
-        # Basic IP validation
-        ip_pattern = r'^(\d{1,3}\.){3}\d{1,3}$|^[a-fA-F0-9:]+$'
-        if not re.match(ip_pattern, ip_str):
-            self._log_security_event("invalid_ip_format", {
-                "ip_address": ip_str
-            })
-            return None
-        
-        # Check for suspicious patterns
-        if self._contains_sql_injection_patterns(ip_str):
-            self._log_security_event("ip_injection_attempt", {
+        # Basic IP validation and check for suspicious patterns
+        rejection = _check_ip_address(ip_str)
+        if rejection is not None:
+            self._log_security_event(rejection, {
                 "ip_address": ip_str
             })
             return None
@@ -285,56 +452,87 @@ class SecurityValidator:
             })
             return None
         
-        try:
-            parsed = urlparse(url_str)
-            
-            # Only allow safe protocols
-            if parsed.scheme not in ['http', 'https', '']:
-                self._log_security_event("unsafe_url_protocol", {
-                    "scheme": parsed.scheme,
-                    "url": url_str
-                })
-                return None
-            
-            # Check for injection patterns
-            if self._contains_sql_injection_patterns(url_str) or self._contains_xss_patterns(url_str):
-                self._log_security_event("url_injection_attempt", {
-                    "url": url_str
-                })
-                return None
-            
+        rejection, detail = _check_url(url_str)
+        if rejection is None:
             return url_str
-            
-        except Exception as e:
-            self._log_security_event("url_parsing_error", {
-                "url": url_str,
-                "error": str(e)
-            })
+        
+        if rejection == "unsafe_url_protocol":
+            details = {"scheme": detail, "url": url_str}
+        elif rejection == "url_parsing_error":
+            details = {"url": url_str, "error": detail}
+        else:
+            details = {"url": url_str}
+        self._log_security_event(rejection, details)
+        return None
+    
+    def _screen_string_values(self, data: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        """
+        Escape all string values and screen them with one regex pass.
+        
+        Returns the escaped values by key when none of them can trigger an XSS
+        or SQL injection removal, or None when they need per-value sanitizing.
+        The NUL separator is a non-word character, so word boundaries behave
+        as they would at the edges of each value; matches spanning two values
+        only cause a fall back to the per-value path.
+        """
+        string_keys = [key for key, value in data.items() if isinstance(key, str) and isinstance(value, str)]
+        if len(string_keys) < 2:
             return None
+        
+        escaped = [self._escape_value(data[key]) for key in string_keys]
+        joined = '\x00'.join(escaped)
+        if self._may_contain_xss(joined) or self._SQL_COMBINED.search(joined):
+            return None
+        return dict(zip(string_keys, escaped))
+    
+    @staticmethod
+    def _escape_value(value: str) -> str:
+        """
+        Remove null bytes and HTML escape a string value
+        """
+        # html.escape is kept over a str.translate table: translate drops to its
+        # slow path for multi-character replacements and measured 2-5x slower on
+        # typical short values, while five str.replace scans cost little on clean text
+        if '\x00' in value:
+            value = value.replace('\x00', '')
+        return html.escape(value)
+    
+    @classmethod
+    def _strip_event_handler(cls, match: re.Match) -> str:
+        """
+        Drop a "name=" run from its first "on" followed by a word character
+        """
+        run = match.group()
+        start = cls._HANDLER_NAME_START.search(run)
+        return run if start is None else run[:start.start()]
     
     def _sanitize_string(self, value: str) -> str:
         """
         Sanitize string to remove XSS and injection patterns
         """
-        # Remove null bytes
-        value = value.replace('\x00', '')
-        
-        # HTML escape to prevent XSS
-        sanitized = html.escape(value)
+        # Remove null bytes and HTML escape to prevent XSS
+        sanitized = self._escape_value(value)
         
-        # Remove potentially dangerous patterns
-        for pattern in self.XSS_PATTERNS:
-            sanitized = re.sub(pattern, '', sanitized, flags=re.IGNORECASE | re.DOTALL)
+        # Remove potentially dangerous patterns. The removal passes only run after
+        # a combined scan hits: if no single pattern matches up front, none of
+        # them would have removed anything.
+        if self._may_contain_xss(sanitized) and self._XSS_COMBINED.search(sanitized):
+            for index, pattern in enumerate(self._XSS_RE):
+                if index == self._EVENT_HANDLER_INDEX:
+                    sanitized = self._EVENT_HANDLER_RUN.sub(self._strip_event_handler, sanitized)
+                else:
+                    sanitized = pattern.sub('', sanitized)
         
-        # Remove SQL injection patterns
-        for pattern in self.SQL_INJECTION_PATTERNS:
-            if re.search(pattern, sanitized, re.IGNORECASE):
+        # Remove SQL injection patterns. These are already search-only on clean
+        # values, and the separate searches measured faster than _SQL_COMBINED.
+        for pattern in self._SQL_RE:
+            if pattern.search(sanitized):
                 self._log_security_event("sanitization_removal", {
                     "original": value,
-                    "pattern": pattern,
+                    "pattern": pattern.pattern,
                     "sanitized": sanitized
                 })
-                sanitized = re.sub(pattern, '[REMOVED]', sanitized, flags=re.IGNORECASE)
+                sanitized = pattern.sub('[REMOVED]', sanitized)
         
         return sanitized.strip()
     
@@ -342,46 +540,65 @@ class SecurityValidator:
         """
         Check if value contains SQL injection patterns
         """
-        for pattern in self.SQL_INJECTION_PATTERNS:
-            if re.search(pattern, value, re.IGNORECASE):
-                return True
-        return False
+        return self._SQL_COMBINED.search(value) is not None
     
     def _contains_xss_patterns(self, value: str) -> bool:
         """
         Check if value contains XSS patterns
         """
-        for pattern in self.XSS_PATTERNS:
-            if re.search(pattern, value, re.IGNORECASE | re.DOTALL):
-                return True
-        return False
+        return self._may_contain_xss(value) and self._XSS_COMBINED.search(value) is not None
     
-    def _detect_patterns(self, value: str, patterns: List[str]) -> List[str]:
+    @staticmethod
+    def _may_contain_xss(value: str) -> bool:
         """
-        Detect which patterns are present in the value
+        Cheap pre-screen: every XSS signature needs '<', ':' or '=' to match
         """
-        detected = []
-        for pattern in patterns:
-            if re.search(pattern, value, re.IGNORECASE):
-                detected.append(pattern)
-        return detected
+        return '<' in value or ':' in value or '=' in value
+    
+    def _detect_patterns(self, value: str, patterns: Sequence[Pattern[str]]) -> int:
+        """
+        Detect which patterns are present in the value, as a bitmask of pattern indexes
+        """
+        mask = 0
+        for bit, pattern in enumerate(patterns):
+            if pattern.search(value):
+                mask |= 1 << bit
+        return mask
+    
+    @staticmethod
+    def _mask_to_names(mask: int, names: Sequence[str]) -> List[str]:
+        """
+        Expand a pattern bitmask into the names of the detected patterns
+        """
+        return [name for bit, name in enumerate(names) if mask >> bit & 1]
     
     def _generate_safe_session_id(self) -> str:
         """
         Generate a safe session ID
         """
-        import uuid
-        return f"safe_{uuid.uuid4().hex[:16]}"
+        return f"safe_{secrets.token_hex(8)}"
     
     def _log_security_event(self, event_type: str, details: Dict[str, Any]):
         """
         Log security events for monitoring and alerting
         """
-        self.security_events_logger.warning(f"Security event: {event_type}", extra={
-            "security_event": True,
+        logger = self.security_events_logger
+        if not logger.isEnabledFor(logging.WARNING):
+            return
+        
+        # Pattern names are only materialized for events that are actually logged
+        sql_pattern_mask = details.get("sql_pattern_mask")
+        if sql_pattern_mask is not None:
+            details = {**details, "pattern_detected": self._mask_to_names(
+                sql_pattern_mask, self.SQL_INJECTION_PATTERN_NAMES
+            )}
+        
+        # Epoch float timestamp; formatters convert it only if they emit it
+        logger.warning("Security event: %s", event_type, extra={
+            **_EVENT_BASE,
             "event_type": event_type,
             "details": details,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": time.time()
         })
     
     def handle_secure_error(self, error: Exception) -> Dict[str, Any]:
@@ -389,10 +606,11 @@ class SecurityValidator:
         Handle errors securely without exposing sensitive information
         """
         # Log the actual error for debugging (with context)
-        self.logger.error(f"Analytics service error: {type(error).__name__}", extra={
-            "error_type": type(error).__name__,
+        error_type = type(error).__name__
+        self.logger.error("Analytics service error: %s", error_type, extra={
+            "error_type": error_type,
             "error_message": str(error),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": time.time()
         })
         
         # Return safe error response
@@ -413,4 +631,97 @@ class SecurityValidator:
                 'success': False,
                 'error': 'An unexpected error occurred. Please try again.',
                 'error_code': 'INTERNAL_ERROR'
-            }
\ No newline at end of file
+            }
+
+
+# Shared instance: the validator holds no per-call state, so one object serves the process
+validator = SecurityValidator()
+
+validate_user_id = validator.validate_user_id
+validate_session_id = validator.validate_session_id
+validate_date_range = validator.validate_date_range
+validate_event_data = validator.validate_event_data
+make_schema_validator = validator.make_schema_validator
+validate_ip_address = validator.validate_ip_address
+validate_url = validator.validate_url
+handle_secure_error = validator.handle_secure_error
+
+
+# Cached checks return verdicts only; the validator methods still log a
+# security event on every rejected call, cache hit or not.
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _clean_user_id(user_id_str: str) -> Optional[str]:
+    """
+    Strip unsafe characters from a user ID; None if it contains SQL injection patterns
+    """
+    if SecurityValidator._SQL_COMBINED.search(user_id_str):
+        return None
+    # Typical IDs are plain ASCII and already clean, so the whitelist substitution can be skipped
+    if SecurityValidator._USER_ID_SAFE_CHARS.issuperset(user_id_str):
+        return user_id_str
+    return SecurityValidator._UNSAFE_USER_ID_CHARS.sub('', user_id_str)
+
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _clean_session_id(session_id_str: str) -> Optional[str]:
+    """
+    Strip unsafe characters from a session ID; None if it contains SQL injection patterns
+    """
+    if SecurityValidator._SQL_COMBINED.search(session_id_str):
+        return None
+    if len(session_id_str) > 100:
+        raise ValueError("Session ID too long")
+    return SecurityValidator._UNSAFE_SESSION_ID_CHARS.sub('', session_id_str)
+
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _sanitize_event_key(key: str) -> Optional[str]:
+    """
+    Reduce an event data key to alphanumerics and underscores; None for blank keys
+    """
+    stripped = key.strip()
+    if not stripped:
+        return None
+    return SecurityValidator._UNSAFE_KEY_CHARS.sub('', stripped)
+
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _check_ip_address(ip_str: str) -> Optional[str]:
+    """
+    Return the security event type that rejects an IP address, or None if it is valid
+    """
+    # Dotted quad of 1-3 digit groups, or a non-empty run of hex digits and colons.
+    # No SQL signature can match within those characters, so no injection scan follows.
+    parts = ip_str.split('.')
+    if len(parts) == 4:
+        valid = all(0 < len(part) <= 3 and part.isdecimal() for part in parts)
+    elif len(parts) == 1:
+        valid = bool(ip_str) and SecurityValidator._IP_HEX_CHARS.issuperset(ip_str)
+    else:
+        valid = False
+    return None if valid else "invalid_ip_format"
+
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _check_url(url_str: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Return (event type, detail) for a rejected URL, or (None, None) if it is safe
+    """
+    # Only the scheme is needed, so skip urlparse's extra ;params split.
+    # urlsplit still strips the tabs, newlines and leading control characters
+    # browsers ignore, so "jav\tascript:" is seen as the javascript scheme.
+    try:
+        scheme = urlsplit(url_str).scheme
+    except Exception as e:
+        return "url_parsing_error", str(e)
+    
+    # Only allow safe protocols
+    if scheme not in ('http', 'https', ''):
+        return "unsafe_url_protocol", scheme
+    
+    # Check for injection patterns
+    if SecurityValidator._URL_THREATS_COMBINED.search(url_str):
+        return "url_injection_attempt", None
+    
+    return None, None
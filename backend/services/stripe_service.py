@@ -3,18 +3,53 @@ Stripe Payment Service
 Handles all Stripe API operations including customers, subscriptions, payments, and webhooks.
 """
 
+import asyncio
+import atexit
 import json
+import logging
 import os
+import threading
 import stripe
-from typing import Optional, Dict, Any, List
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
 from sqlalchemy.orm import Session, selectinload, joinedload
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
 from datetime import datetime, timezone
 
 from ..app.models import (
     StripeCustomer, StripeSubscription, Payment, PaymentMethod,
     WebhookEvent, User, PaymentStatus, SubscriptionStatus
 )
+from .redis_cache import cache, CacheKeys
+
+logger = logging.getLogger(__name__)
+
+# Webhook bursts run on their own small pool so they cannot starve the default
+# executor that the other async variants share with the rest of the app
+WEBHOOK_EXECUTOR_WORKERS = 4
+
+# Stripe lookups that run alongside another Stripe call within one request
+LOOKUP_EXECUTOR_WORKERS = 4
+
+# Prices are immutable in Stripe once created, so the fields subscriptions need
+# are cached in Redis and in a small per-process front cache
+PRICE_CACHE_TTL = int(os.getenv("STRIPE_PRICE_CACHE_TTL", "86400"))  # 24 hours
+_price_l1 = TTLCache(maxsize=256, ttl=PRICE_CACHE_TTL)
+_price_l1_lock = threading.Lock()
+
+# A user's Stripe customer never changes once created; the TTL only bounds memory
+# and how long another worker's view can lag
+CUSTOMER_CACHE_SIZE = 10_000
+CUSTOMER_CACHE_TTL = 3600
+
+# Backends whose INSERT supports ON CONFLICT DO NOTHING ... RETURNING, letting the
+# webhook dedupe check and the event insert share one statement
+_CONFLICT_IGNORING_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
 
 
 class StripeService:
@@ -33,6 +68,21 @@ class StripeService:
         
         # Stripe webhook endpoint secret
         self.webhook_secret = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+        
+        # stripe-python 7.x only ships a blocking HTTP client, so the async variants
+        # below run the sync methods in worker threads
+        self._webhook_executor = ThreadPoolExecutor(
+            max_workers=WEBHOOK_EXECUTOR_WORKERS, thread_name_prefix="stripe-webhook"
+        )
+        atexit.register(self._webhook_executor.shutdown)
+        self._lookup_executor = ThreadPoolExecutor(
+            max_workers=LOOKUP_EXECUTOR_WORKERS, thread_name_prefix="stripe-lookup"
+        )
+        atexit.register(self._lookup_executor.shutdown)
+        
+        # user_id -> (StripeCustomer.id, stripe_customer_id)
+        self._customer_ids = TTLCache(maxsize=CUSTOMER_CACHE_SIZE, ttl=CUSTOMER_CACHE_TTL)
+        self._customer_ids_lock = threading.Lock()
     
     def create_customer(self, db: Session, user_id: int, email: str, name: str = None, 
                        description: str = None, metadata: Dict[str, Any] = None) -> StripeCustomer:
@@ -68,9 +118,17 @@ class StripeService:
         db.add(db_customer)
         db.commit()
         db.refresh(db_customer)
+        self._remember_customer(db_customer)
         
         return db_customer
     
+    async def acreate_customer(self, db: Session, user_id: int, email: str, name: str = None,
+                               description: str = None, metadata: Dict[str, Any] = None) -> StripeCustomer:
+        """Async variant of create_customer."""
+        return await asyncio.to_thread(
+            self.create_customer, db, user_id, email, name, description, metadata
+        )
+    
     def get_or_create_customer(self, db: Session, user_id: int) -> Optional[StripeCustomer]:
         """
         Get existing customer or create new one.
@@ -80,6 +138,7 @@ class StripeService:
         ).first()
         
         if customer:
+            self._remember_customer(customer)
             return customer
         
         # Create new customer
@@ -95,6 +154,36 @@ class StripeService:
             metadata={"subscription_tier": user.subscription_tier}
         )
     
+    def _get_customer_ids(self, db: Session, user_id: int) -> Optional[Tuple[int, str]]:
+        """
+        Get (StripeCustomer.id, stripe_customer_id) for a user, from the cache or
+        a column-only query. Returns None if the user has no Stripe customer.
+        """
+        with self._customer_ids_lock:
+            customer_ids = self._customer_ids.get(user_id)
+        if customer_ids is not None:
+            return customer_ids
+        
+        row = db.query(StripeCustomer.id, StripeCustomer.stripe_customer_id).filter(
+            StripeCustomer.user_id == user_id
+        ).first()
+        if row is None:
+            return None
+        
+        customer_ids = (row.id, row.stripe_customer_id)
+        with self._customer_ids_lock:
+            self._customer_ids[user_id] = customer_ids
+        return customer_ids
+    
+    def _remember_customer(self, customer: StripeCustomer):
+        """Cache the Stripe customer IDs of a loaded customer record."""
+        with self._customer_ids_lock:
+            self._customer_ids[customer.user_id] = (customer.id, customer.stripe_customer_id)
+    
+    async def aget_or_create_customer(self, db: Session, user_id: int) -> Optional[StripeCustomer]:
+        """Async variant of get_or_create_customer."""
+        return await asyncio.to_thread(self.get_or_create_customer, db, user_id)
+    
     def create_payment_intent(self, db: Session, customer_id: int, amount: int, 
                             currency: str = "eur", description: str = None,
                             metadata: Dict[str, Any] = None, 
@@ -103,18 +192,16 @@ class StripeService:
         Create a payment intent for processing payments.
         """
         # Get customer
-        stripe_customer = db.query(StripeCustomer).filter(
-            StripeCustomer.user_id == customer_id
-        ).first()
-        
-        if not stripe_customer:
+        customer_ids = self._get_customer_ids(db, customer_id)
+        if not customer_ids:
             raise ValueError(f"Stripe customer for user {customer_id} not found")
+        customer_pk, stripe_customer_id = customer_ids
         
         # Create Stripe payment intent
         params = {
             "amount": amount,
             "currency": currency,
-            "customer": stripe_customer.stripe_customer_id,
+            "customer": stripe_customer_id,
             "automatic_payment_methods": {
                 "enabled": True,
                 "allow_redirects": "never"
@@ -134,7 +221,7 @@ class StripeService:
         
         # Create local payment record
         payment = Payment(
-            customer_id=stripe_customer.id,
+            customer_id=customer_pk,
             stripe_payment_intent_id=stripe_payment_intent.id,
             amount=amount,
             currency=currency,
@@ -150,6 +237,16 @@ class StripeService:
         
         return payment
     
+    async def acreate_payment_intent(self, db: Session, customer_id: int, amount: int,
+                                     currency: str = "eur", description: str = None,
+                                     metadata: Dict[str, Any] = None,
+                                     customer_email: str = None) -> Payment:
+        """Async variant of create_payment_intent."""
+        return await asyncio.to_thread(
+            self.create_payment_intent, db, customer_id, amount,
+            currency, description, metadata, customer_email
+        )
+    
     def create_subscription(self, db: Session, user_id: int, price_id: str,
                           trial_days: int = None, metadata: Dict[str, Any] = None) -> StripeSubscription:
         """
@@ -170,19 +267,27 @@ class StripeService:
         Raises:
             ValueError: If the Stripe customer for the user cannot be found or created.
         """
-        # 1. Get or create the Stripe customer for the given user.
-        #    A user must have an associated Stripe customer record to create a subscription.
-        stripe_customer = self.get_or_create_customer(db, user_id)
-        if not stripe_customer:
-            raise ValueError(f"Could not find or create Stripe customer for user {user_id}")
-        
-        # 2. Retrieve price information from Stripe.
-        #    This ensures the price_id is valid and fetches details like product ID and amount.
-        price = stripe.Price.retrieve(price_id)
+        # 1. Get or create the Stripe customer for the given user, and
+        # 2. retrieve price information (cached; Stripe is only asked on a miss).
+        #    A user must have an associated Stripe customer record to create a subscription;
+        #    the price lookup ensures the price_id is valid and fetches product ID and amount.
+        customer_ids = self._get_customer_ids(db, user_id)
+        if customer_ids is None:
+            # Creating the customer is a Stripe round trip. The price lookup does not
+            # use the session, so it runs on a worker thread in the meantime.
+            price_future = self._lookup_executor.submit(self._get_price, price_id)
+            stripe_customer = self.get_or_create_customer(db, user_id)
+            if not stripe_customer:
+                raise ValueError(f"Could not find or create Stripe customer for user {user_id}")
+            customer_ids = (stripe_customer.id, stripe_customer.stripe_customer_id)
+            price = price_future.result()
+        else:
+            price = self._get_price(price_id)
+        customer_pk, stripe_customer_id = customer_ids
         
         # 3. Prepare subscription parameters for the Stripe API call.
         subscription_params = {
-            "customer": stripe_customer.stripe_customer_id,
+            "customer": stripe_customer_id,
             "items": [{"price": price_id}],
             "payment_behavior": "default_incomplete", # Ensures payment method is collected if needed
             "payment_settings": {
@@ -205,13 +310,13 @@ class StripeService:
         # 5. Create a local database record for the new subscription.
         #    This mirrors essential Stripe subscription data in our system.
         subscription = StripeSubscription(
-            customer_id=stripe_customer.id,
+            customer_id=customer_pk,
             stripe_subscription_id=stripe_subscription.id,
             status=SubscriptionStatus(stripe_subscription.status), # Map Stripe status to our enum
             price_id=price_id,
-            product_id=price.product,
+            product_id=price["product"],
             currency=stripe_subscription.currency,
-            amount=price.unit_amount if price.unit_amount else 0, # Amount in cents
+            amount=price["unit_amount"] if price["unit_amount"] else 0, # Amount in cents
             current_period_start=datetime.fromtimestamp(
                 stripe_subscription.current_period_start, tz=timezone.utc
             ),
@@ -227,6 +332,45 @@ class StripeService:
         
         return subscription
     
+    async def acreate_subscription(self, db: Session, user_id: int, price_id: str,
+                                   trial_days: int = None, metadata: Dict[str, Any] = None) -> StripeSubscription:
+        """Async variant of create_subscription."""
+        return await asyncio.to_thread(
+            self.create_subscription, db, user_id, price_id, trial_days, metadata
+        )
+    
+    def _get_price(self, price_id: str) -> Dict[str, Any]:
+        """
+        Get the product, unit amount and currency of a Stripe price, checking the
+        in-process cache and Redis before calling Stripe.
+        """
+        with _price_l1_lock:
+            price = _price_l1.get(price_id)
+        if price is not None:
+            return price
+        
+        key = CacheKeys.stripe_price(price_id)
+        price = cache.get(key)
+        if price is None:
+            stripe_price = stripe.Price.retrieve(price_id)
+            price = {
+                "product": stripe_price.product,
+                "unit_amount": stripe_price.unit_amount,
+                "currency": stripe_price.currency,
+            }
+            cache.set_background(key, price, PRICE_CACHE_TTL)
+        
+        with _price_l1_lock:
+            _price_l1[price_id] = price
+        return price
+    
+    @staticmethod
+    def invalidate_price_cache() -> int:
+        """Drop all cached Stripe prices, e.g. after editing prices in the dashboard."""
+        with _price_l1_lock:
+            _price_l1.clear()
+        return cache.delete_pattern(CacheKeys.stripe_price("*"))
+    
     def get_subscription(self, db: Session, subscription_id: str) -> StripeSubscription:
         """
         Get subscription from database.
@@ -271,6 +415,13 @@ class StripeService:
         
         return subscription
     
+    async def aupdate_subscription(self, db: Session, subscription_id: str,
+                                   price_id: str = None, metadata: Dict[str, Any] = None) -> StripeSubscription:
+        """Async variant of update_subscription."""
+        return await asyncio.to_thread(
+            self.update_subscription, db, subscription_id, price_id, metadata
+        )
+    
     def cancel_subscription(self, db: Session, subscription_id: str, 
                           prorate: bool = True) -> StripeSubscription:
         """
@@ -297,27 +448,36 @@ class StripeService:
         
         return subscription
     
-    def create_customer_portal_session(self, customer_id: int, 
+    async def acancel_subscription(self, db: Session, subscription_id: str,
+                                   prorate: bool = True) -> StripeSubscription:
+        """Async variant of cancel_subscription."""
+        return await asyncio.to_thread(self.cancel_subscription, db, subscription_id, prorate)
+    
+    def create_customer_portal_session(self, db: Session, customer_id: int, 
                                       return_url: str = None) -> Dict[str, Any]:
         """
         Create a Stripe customer portal session.
         """
         # Get Stripe customer ID
-        stripe_customer = db.query(StripeCustomer).filter(
-            StripeCustomer.user_id == customer_id
-        ).first()
-        
-        if not stripe_customer:
+        customer_ids = self._get_customer_ids(db, customer_id)
+        if not customer_ids:
             raise ValueError(f"Stripe customer for user {customer_id} not found")
         
         # Create portal session
         portal_session = stripe.billing_portal.Session.create(
-            customer=stripe_customer.stripe_customer_id,
+            customer=customer_ids[1],
             return_url=return_url or os.getenv("FRONTEND_URL", "http://localhost:3000")
         )
         
         return {"url": portal_session.url}
     
+    async def acreate_customer_portal_session(self, db: Session, customer_id: int,
+                                              return_url: str = None) -> Dict[str, Any]:
+        """Async variant of create_customer_portal_session."""
+        return await asyncio.to_thread(
+            self.create_customer_portal_session, db, customer_id, return_url
+        )
+    
     def construct_webhook_event(self, payload: bytes, signature: str) -> stripe.Event:
         """
         Constructs and validates a Stripe webhook event. This is a critical security step
@@ -366,32 +526,20 @@ class StripeService:
         Returns:
             True if the event was successfully processed, False otherwise.
         """
-        # 1. Idempotency check: Prevent reprocessing of duplicate events.
-        #    Stripe can send the same event multiple times, so it's crucial to check
-        #    if this event ID has already been recorded and processed.
-        existing_event = db.query(WebhookEvent).filter(
-            WebhookEvent.stripe_event_id == event.id
-        ).first()
+        # 1. Record the incoming webhook event, unless it was already recorded.
+        #    Stripe can send the same event multiple times, so the insert doubles as
+        #    the idempotency check; this provides an audit trail as well.
+        event_row_id = self._record_webhook_event(db, event)
         
-        if existing_event:
+        if event_row_id is None:
             logger.info(f"Webhook event {event.id} (type: {event.type}) already processed. Skipping.")
-            return existing_event.processed # Return its previous processing status
-        
-        # 2. Record the incoming webhook event in the local database.
-        #    This provides an audit trail and allows for manual inspection or reprocessing if needed.
-        webhook_event = WebhookEvent(
-            stripe_event_id=event.id,
-            event_type=event.type,
-            api_version=event.api_version,
-            created=datetime.fromtimestamp(event.created, tz=timezone.utc),
-            data=json.dumps(event.data.object.to_dict()), # Store the full event data
-            livemode=event.livemode
-        )
-        
-        db.add(webhook_event)
+            # Return its previous processing status
+            return db.query(WebhookEvent.processed).filter(
+                WebhookEvent.stripe_event_id == event.id
+            ).scalar()
         
         try:
-            # 3. Delegate event handling to specific private methods based on event type.
+            # 2. Delegate event handling to specific private methods based on event type.
             #    This keeps the logic modular and easier to manage for different event types.
             if event.type == "payment_intent.succeeded":
                 self._handle_payment_intent_succeeded(db, event.data.object)
@@ -408,71 +556,109 @@ class StripeService:
             elif event.type == "invoice.payment_failed":
                 self._handle_invoice_payment_failed(db, event.data.object)
             
-            # 4. Mark the webhook event as successfully processed.
-            webhook_event.processed = True
-            webhook_event.processed_at = datetime.utcnow()
+            # 3. Mark the webhook event as successfully processed.
+            db.execute(
+                update(WebhookEvent)
+                .where(WebhookEvent.id == event_row_id)
+                .values(processed=True, processed_at=datetime.utcnow())
+            )
             
             db.commit() # Commit all changes within this transaction
             logger.info(f"Successfully processed webhook event {event.id} (type: {event.type}).")
             return True
             
         except Exception as e:
-            # 5. Handle errors during event processing.
-            #    Rollback the transaction, log the error, and mark the event as failed.
+            # 4. Handle errors during event processing.
+            #    Rolling back also drops the event row, so Stripe's retry of this
+            #    event is processed again rather than skipped as a duplicate.
             db.rollback() # Rollback any changes made during this event's processing
-            webhook_event.error_message = str(e)
-            webhook_event.processed = False # Mark as not processed due to error
-            db.commit() # Commit the error state
             logger.error(f"Error processing webhook event {event.id} (type: {event.type}): {e}")
             return False
     
+    def _record_webhook_event(self, db: Session, event: stripe.Event) -> Optional[int]:
+        """
+        Insert the webhook event row unless one with the same Stripe event ID exists.
+        
+        Returns:
+            The new row's ID, or None if the event was already recorded.
+        """
+        values = {
+            "stripe_event_id": event.id,
+            "event_type": event.type,
+            "api_version": event.api_version,
+            "created": datetime.fromtimestamp(event.created, tz=timezone.utc),
+            "data": json.dumps(event.data.object.to_dict()), # Store the full event data
+            "livemode": event.livemode,
+        }
+        
+        conflict_ignoring_insert = _CONFLICT_IGNORING_INSERTS.get(db.get_bind().dialect.name)
+        if conflict_ignoring_insert is None:
+            existing_id = db.query(WebhookEvent.id).filter(
+                WebhookEvent.stripe_event_id == event.id
+            ).scalar()
+            if existing_id is not None:
+                return None
+            return db.execute(insert(WebhookEvent).values(**values)).inserted_primary_key[0]
+        
+        return db.execute(
+            conflict_ignoring_insert(WebhookEvent)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=[WebhookEvent.stripe_event_id])
+            .returning(WebhookEvent.id)
+        ).scalar()
+    
+    async def ahandle_webhook_event(self, db: Session, event: stripe.Event) -> bool:
+        """Async variant of handle_webhook_event, run on the dedicated webhook pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._webhook_executor, self.handle_webhook_event, db, event
+        )
+    
     def _handle_payment_intent_succeeded(self, db: Session, payment_intent: stripe.PaymentIntent):
         """Handle successful payment intent."""
         # Update payment record
-        payment = db.query(Payment).filter(
-            Payment.stripe_payment_intent_id == payment_intent.id
-        ).first()
-        
-        if payment:
-            payment.status = PaymentStatus.succeeded
-            payment.updated_at = datetime.utcnow()
+        db.execute(
+            update(Payment)
+            .where(Payment.stripe_payment_intent_id == payment_intent.id)
+            .values(status=PaymentStatus.succeeded, updated_at=datetime.utcnow())
+        )
     
     def _handle_payment_intent_failed(self, db: Session, payment_intent: stripe.PaymentIntent):
         """Handle failed payment intent."""
         # Update payment record
-        payment = db.query(Payment).filter(
-            Payment.stripe_payment_intent_id == payment_intent.id
-        ).first()
-        
-        if payment:
-            payment.status = PaymentStatus.failed
-            payment.updated_at = datetime.utcnow()
+        db.execute(
+            update(Payment)
+            .where(Payment.stripe_payment_intent_id == payment_intent.id)
+            .values(status=PaymentStatus.failed, updated_at=datetime.utcnow())
+        )
     
     def _handle_subscription_created(self, db: Session, subscription: stripe.Subscription):
         """Handle subscription creation."""
-        # Find customer
-        stripe_customer = db.query(StripeCustomer).filter(
+        # Find the customer and any existing record of this subscription in one query
+        row = db.query(StripeCustomer.id, StripeSubscription).outerjoin(
+            StripeSubscription,
+            StripeSubscription.stripe_subscription_id == subscription.id
+        ).filter(
             StripeCustomer.stripe_customer_id == subscription.customer
         ).first()
         
-        if stripe_customer:
-            # Update or create subscription record
-            existing_sub = db.query(StripeSubscription).filter(
-                StripeSubscription.stripe_subscription_id == subscription.id
-            ).first()
+        if row:
+            customer_pk, existing_sub = row
             
+            # Update or create subscription record
             if existing_sub:
                 existing_sub.status = SubscriptionStatus(subscription.status)
             else:
                 # Create new subscription record
+                price = subscription.items.data[0].price if subscription.items.data else None
                 new_subscription = StripeSubscription(
-                    customer_id=stripe_customer.id,
+                    customer_id=customer_pk,
                     stripe_subscription_id=subscription.id,
                     status=SubscriptionStatus(subscription.status),
-                    price_id=subscription.items.data[0].price.id if subscription.items.data else None,
-                    product_id=subscription.items.data[0].price.product if subscription.items.data else None,
+                    price_id=price.id if price else None,
+                    product_id=price.product if price else None,
                     currency=subscription.currency,
-                    amount=subscription.items.data[0].price.unit_amount if subscription.items.data and subscription.items.data[0].price.unit_amount else 0,
+                    amount=price.unit_amount if price and price.unit_amount else 0,
                     current_period_start=datetime.fromtimestamp(subscription.current_period_start, tz=timezone.utc),
                     current_period_end=datetime.fromtimestamp(subscription.current_period_end, tz=timezone.utc)
                 )
@@ -488,72 +674,73 @@ class StripeService:
             db: The SQLAlchemy database session.
             subscription: The Stripe Subscription object from the webhook event data.
         """
-        # Find the existing subscription record in the local database using its Stripe ID.
-        existing_sub = db.query(StripeSubscription).filter(
-            StripeSubscription.stripe_subscription_id == subscription.id
-        ).first()
-        
-        if existing_sub:
-            # Update the local subscription's status to match Stripe's current status.
-            existing_sub.status = SubscriptionStatus(subscription.status)
-            
-            # Update the current period start and end dates. These can change due to
-            # upgrades, downgrades, or other subscription modifications.
-            existing_sub.current_period_start = datetime.fromtimestamp(
-                subscription.current_period_start, tz=timezone.utc
+        # Update the local subscription record in place, matched by its Stripe ID.
+        result = db.execute(
+            update(StripeSubscription)
+            .where(StripeSubscription.stripe_subscription_id == subscription.id)
+            .values(
+                # Match Stripe's current status.
+                status=SubscriptionStatus(subscription.status),
+                
+                # The current period can change due to upgrades, downgrades,
+                # or other subscription modifications.
+                current_period_start=datetime.fromtimestamp(
+                    subscription.current_period_start, tz=timezone.utc
+                ),
+                current_period_end=datetime.fromtimestamp(
+                    subscription.current_period_end, tz=timezone.utc
+                ),
+                
+                # Cancellation fields are populated if the subscription is
+                # scheduled for cancellation or has been canceled.
+                cancel_at=datetime.fromtimestamp(
+                    subscription.cancel_at, tz=timezone.utc
+                ) if subscription.cancel_at else None,
+                cancel_at_period_end=subscription.cancel_at_period_end,
+                canceled_at=datetime.fromtimestamp(
+                    subscription.canceled_at, tz=timezone.utc
+                ) if subscription.canceled_at else None,
             )
-            existing_sub.current_period_end = datetime.fromtimestamp(
-                subscription.current_period_end, tz=timezone.utc
-            )
-            
-            # Update cancellation-related fields. These fields are populated if the
-            # subscription is scheduled for cancellation or has been canceled.
-            existing_sub.cancel_at = datetime.fromtimestamp(
-                subscription.cancel_at, tz=timezone.utc
-            ) if subscription.cancel_at else None
-            existing_sub.cancel_at_period_end = subscription.cancel_at_period_end
-            existing_sub.canceled_at = datetime.fromtimestamp(
-                subscription.canceled_at, tz=timezone.utc
-            ) if subscription.canceled_at else None
-        else:
+        )
+        
+        if result.rowcount == 0:
             # Log a warning if the subscription is not found locally. This might indicate
             # an out-of-sync state or an event for a subscription not created by our system.
             logger.warning(f"Received subscription.updated event for unknown subscription ID: {subscription.id}")
     
     def _handle_subscription_deleted(self, db: Session, subscription: stripe.Subscription):
         """Handle subscription deletion."""
-        # Find and mark as canceled
-        existing_sub = db.query(StripeSubscription).filter(
-            StripeSubscription.stripe_subscription_id == subscription.id
-        ).first()
-        
-        if existing_sub:
-            existing_sub.status = SubscriptionStatus.canceled
-            existing_sub.canceled_at = datetime.fromtimestamp(
-                subscription.canceled_at, tz=timezone.utc
-            ) if subscription.canceled_at else None
+        # Mark as canceled
+        db.execute(
+            update(StripeSubscription)
+            .where(StripeSubscription.stripe_subscription_id == subscription.id)
+            .values(
+                status=SubscriptionStatus.canceled,
+                canceled_at=datetime.fromtimestamp(
+                    subscription.canceled_at, tz=timezone.utc
+                ) if subscription.canceled_at else None
+            )
+        )
     
     def _handle_invoice_payment_succeeded(self, db: Session, invoice: stripe.Invoice):
         """Handle successful invoice payment."""
         # Update subscription status if needed
         if invoice.subscription:
-            subscription = db.query(StripeSubscription).filter(
-                StripeSubscription.stripe_subscription_id == invoice.subscription
-            ).first()
-            
-            if subscription:
-                subscription.status = SubscriptionStatus.active
+            db.execute(
+                update(StripeSubscription)
+                .where(StripeSubscription.stripe_subscription_id == invoice.subscription)
+                .values(status=SubscriptionStatus.active)
+            )
     
     def _handle_invoice_payment_failed(self, db: Session, invoice: stripe.Invoice):
         """Handle failed invoice payment."""
         # Update subscription status if needed
         if invoice.subscription:
-            subscription = db.query(StripeSubscription).filter(
-                StripeSubscription.stripe_subscription_id == invoice.subscription
-            ).first()
-            
-            if subscription:
-                subscription.status = SubscriptionStatus.past_due
+            db.execute(
+                update(StripeSubscription)
+                .where(StripeSubscription.stripe_subscription_id == invoice.subscription)
+                .values(status=SubscriptionStatus.past_due)
+            )
     
     def get_user_subscriptions(self, db: Session, user_id: int) -> List[StripeSubscription]:
             """Get all subscriptions for a user with eager loading of customer info."""
@@ -571,16 +758,17 @@ class StripeService:
     
     def get_customer_portal_url(self, db: Session, user_id: int) -> str:
         """Get Stripe customer portal URL for a user."""
-        stripe_customer = db.query(StripeCustomer).filter(
-            StripeCustomer.user_id == user_id
-        ).first()
-        
-        if not stripe_customer:
+        customer_ids = self._get_customer_ids(db, user_id)
+        if not customer_ids:
             raise ValueError(f"Stripe customer for user {user_id} not found")
         
         portal_session = stripe.billing_portal.Session.create(
-            customer=stripe_customer.stripe_customer_id,
+            customer=customer_ids[1],
             return_url=os.getenv("FRONTEND_URL", "http://localhost:3000/dashboard")
         )
         
-        return portal_session.url
\ No newline at end of file
+        return portal_session.url
+    
+    async def aget_customer_portal_url(self, db: Session, user_id: int) -> str:
+        """Async variant of get_customer_portal_url."""
+        return await asyncio.to_thread(self.get_customer_portal_url, db, user_id)
@@ -0,0 +1,52 @@
+"""
+Test suite for database engine pool configuration
+Tests the create_engine options chosen for SQLite, pooled PostgreSQL and PgBouncer setups
+"""
+
+import pytest
+from unittest.mock import patch
+from sqlalchemy.pool import NullPool
+
+from backend import database
+
+
+@pytest.mark.database
+class TestEngineOptions:
+    """Test suite for database engine options."""
+
+    def test_sqlite_uses_connect_args_only(self):
+        """Test that SQLite engines keep the single-thread check disabled and no pool sizing."""
+        options = database.engine_options("sqlite:///./finehero.db")
+
+        assert options == {"connect_args": {"check_same_thread": False}}
+
+    def test_postgresql_pool_follows_settings(self):
+        """Test that server databases get the configured pool size, timeouts and pre-ping."""
+        with patch.multiple(database.settings, DB_USE_NULLPOOL=False, DB_POOL_SIZE=9,
+                            DB_MAX_OVERFLOW=10, DB_POOL_TIMEOUT=5, DB_POOL_RECYCLE=1800):
+            options = database.engine_options("postgresql://user@db/finehero")
+
+        assert options == {
+            "pool_size": 9,
+            "max_overflow": 10,
+            "pool_timeout": 5,
+            "pool_recycle": 1800,
+            "pool_pre_ping": True,
+        }
+
+    def test_pgbouncer_disables_app_side_pooling(self):
+        """Test that DB_USE_NULLPOOL hands pooling to the external pooler."""
+        with patch.object(database.settings, "DB_USE_NULLPOOL", True):
+            options = database.engine_options("postgresql://user@pgbouncer/finehero")
+
+        assert options == {"poolclass": NullPool}
+
+    def test_quality_scoring_engine_uses_shared_pool_options(self):
+        """Test that the quality scoring engine is sized by the same settings as the app engine."""
+        from backend.services import quality_scoring_system
+
+        url = "postgresql://user@db/finehero"
+        with patch.object(quality_scoring_system, "create_engine") as create_engine:
+            quality_scoring_system.QualityScoringEngine(url)
+
+        create_engine.assert_called_once_with(url, **database.engine_options(url))
@@ -5,6 +5,7 @@ Comprehensive testing for payment functionality.
 
 import pytest
 import os
+import threading
 from unittest.mock import Mock, patch, MagicMock
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -13,11 +14,12 @@ from sqlalchemy.orm import sessionmaker
 os.environ["STRIPE_SECRET_KEY"] = "sk_test_1234567890"
 os.environ["STRIPE_WEBHOOK_SECRET"] = "whsec_1234567890"
 
-from backend.app.models import Base, User, StripeCustomer, StripeSubscription, Payment
+from backend.app.models import Base, User, StripeCustomer, StripeSubscription, Payment, WebhookEvent
 from backend.app.schemas_payment import (
     StripeCustomerCreate, PaymentIntentCreate, SubscriptionCreate,
     CustomerPortalRequest
 )
+from backend.services import stripe_service as stripe_service_module
 from backend.services.stripe_service import StripeService
 
 
@@ -159,6 +161,40 @@ class TestPaymentSystem:
         assert payment.description == "Test payment"
         assert payment.stripe_payment_intent_id == "pi_test123"
     
+    def test_customer_ids_are_cached_per_user(self, setup_database, setup_stripe_service, setup_user):
+        """Test that payment and portal calls reuse the cached Stripe customer IDs."""
+        customer = setup_stripe_service.get_or_create_customer(
+            db=setup_database,
+            user_id=setup_user.id
+        )
+        
+        with patch.object(setup_database, "query", wraps=setup_database.query) as query:
+            for _ in range(3):
+                payment = setup_stripe_service.create_payment_intent(
+                    db=setup_database,
+                    customer_id=setup_user.id,
+                    amount=2000
+                )
+            setup_stripe_service.get_customer_portal_url(setup_database, setup_user.id)
+        
+        query.assert_not_called()
+        assert payment.customer_id == customer.id
+    
+    def test_customer_ids_are_loaded_once_on_miss(self, setup_database, setup_stripe_service, setup_user):
+        """Test that an uncached customer is looked up once and then served from the cache."""
+        customer = setup_stripe_service.get_or_create_customer(
+            db=setup_database,
+            user_id=setup_user.id
+        )
+        setup_stripe_service._customer_ids.clear()
+        
+        with patch.object(setup_database, "query", wraps=setup_database.query) as query:
+            first = setup_stripe_service._get_customer_ids(setup_database, setup_user.id)
+            second = setup_stripe_service._get_customer_ids(setup_database, setup_user.id)
+        
+        assert first == second == (customer.id, "cus_test123")
+        assert query.call_count == 1
+    
     def test_create_subscription(self, setup_database, setup_stripe_service, setup_user):
         """Test creating a subscription."""
         # First create a customer
@@ -184,6 +220,71 @@ class TestPaymentSystem:
         assert subscription.price_id == "price_test123"
         assert subscription.stripe_subscription_id == "sub_test123"
     
+    def test_price_lookups_are_cached(self, setup_stripe_service):
+        """Test that a price is fetched from Stripe once and then served locally."""
+        with patch.object(stripe_service_module.cache, "get", return_value=None), \
+             patch.object(stripe_service_module.cache, "set_background") as set_background:
+            first = setup_stripe_service._get_price("price_cached_once")
+            second = setup_stripe_service._get_price("price_cached_once")
+        
+        assert first == second
+        assert first["product"] == "prod_test123"
+        assert first["unit_amount"] == 2000
+        stripe_service_module.stripe.Price.retrieve.assert_called_once_with("price_cached_once")
+        set_background.assert_called_once()
+    
+    def test_price_lookup_uses_redis_before_stripe(self, setup_stripe_service):
+        """Test that a Redis hit avoids the Stripe round trip."""
+        cached_price = {"product": "prod_cached", "unit_amount": 500, "currency": "eur"}
+        with patch.object(stripe_service_module.cache, "get", return_value=cached_price):
+            price = setup_stripe_service._get_price("price_in_redis")
+        
+        assert price == cached_price
+        stripe_service_module.stripe.Price.retrieve.assert_not_called()
+    
+    def test_invalidate_price_cache(self, setup_stripe_service):
+        """Test that invalidation clears local prices and the Redis keys."""
+        stripe_service_module._price_l1["price_stale"] = {"product": "prod_old"}
+        with patch.object(stripe_service_module.cache, "delete_pattern", return_value=1) as delete_pattern:
+            StripeService.invalidate_price_cache()
+        
+        assert "price_stale" not in stripe_service_module._price_l1
+        delete_pattern.assert_called_once_with("stripe_price:*")
+    
+    def test_new_customer_price_lookup_runs_concurrently(self, setup_database, setup_stripe_service, setup_user):
+        """Test that the price is fetched on a worker thread while the customer is created."""
+        thread_names = []
+        
+        def get_price(price_id):
+            thread_names.append(threading.current_thread().name)
+            return {"product": "prod_test123", "unit_amount": 2000, "currency": "eur"}
+        
+        with patch.object(setup_stripe_service, "_get_price", side_effect=get_price):
+            subscription = setup_stripe_service.create_subscription(
+                db=setup_database,
+                user_id=setup_user.id,
+                price_id="price_test123"
+            )
+        
+        assert thread_names[0].startswith("stripe-lookup")
+        assert subscription.product_id == "prod_test123"
+    
+    def test_known_customer_price_lookup_runs_inline(self, setup_database, setup_stripe_service, setup_user):
+        """Test that no worker thread is used when the customer is already cached."""
+        setup_stripe_service.get_or_create_customer(
+            db=setup_database,
+            user_id=setup_user.id
+        )
+        
+        with patch.object(setup_stripe_service._lookup_executor, "submit") as submit:
+            setup_stripe_service.create_subscription(
+                db=setup_database,
+                user_id=setup_user.id,
+                price_id="price_test123"
+            )
+        
+        submit.assert_not_called()
+    
     def test_cancel_subscription(self, setup_database, setup_stripe_service, setup_user):
         """Test canceling a subscription."""
         # Create subscription first
@@ -237,6 +338,161 @@ class TestPaymentSystem:
         assert webhook_event.processed is True
         assert webhook_event.event_type == "payment_intent.succeeded"
     
+    def test_create_customer_portal_session(self, setup_database, setup_stripe_service, setup_user):
+        """Test portal session creation looks the customer up in the given session."""
+        setup_stripe_service.get_or_create_customer(
+            db=setup_database,
+            user_id=setup_user.id
+        )
+        
+        with patch('backend.services.stripe_service.stripe.billing_portal.Session.create',
+                   return_value=MagicMock(url="https://billing.test/session")):
+            portal = setup_stripe_service.create_customer_portal_session(
+                db=setup_database,
+                customer_id=setup_user.id
+            )
+        
+        assert portal == {"url": "https://billing.test/session"}
+    
+    @pytest.mark.asyncio
+    async def test_async_variants_delegate_to_sync_methods(self, setup_stripe_service):
+        """Test async variants run the sync implementation off the event loop."""
+        db = MagicMock()
+        with patch.object(setup_stripe_service, "create_subscription", return_value="sub") as create:
+            result = await setup_stripe_service.acreate_subscription(db, 1, "price_test123")
+        
+        assert result == "sub"
+        create.assert_called_once_with(db, 1, "price_test123", None, None)
+    
+    @pytest.mark.asyncio
+    async def test_async_webhook_handling_uses_dedicated_pool(self, setup_stripe_service):
+        """Test webhook events are handled on the webhook worker pool."""
+        thread_names = []
+        
+        def handle(db, event):
+            thread_names.append(threading.current_thread().name)
+            return True
+        
+        with patch.object(setup_stripe_service, "handle_webhook_event", side_effect=handle):
+            result = await setup_stripe_service.ahandle_webhook_event(MagicMock(), MagicMock())
+        
+        assert result is True
+        assert thread_names[0].startswith("stripe-webhook")
+    
+    def _make_webhook_event(self, event_id, event_type="invoice.payment_failed"):
+        """Build a mock Stripe event with no subscription attached."""
+        mock_event = MagicMock()
+        mock_event.id = event_id
+        mock_event.type = event_type
+        mock_event.data.object.to_dict.return_value = {}
+        mock_event.data.object.subscription = None
+        mock_event.api_version = "2023-10-16"
+        mock_event.created = 1678886400
+        mock_event.livemode = False
+        return mock_event
+    
+    def test_duplicate_webhook_event_is_not_reprocessed(self, setup_database, setup_stripe_service):
+        """Test that a redelivered event returns its recorded status without running handlers."""
+        event = self._make_webhook_event("evt_duplicate")
+        assert setup_stripe_service.handle_webhook_event(setup_database, event) is True
+        
+        with patch.object(setup_stripe_service, "_handle_invoice_payment_failed") as handler:
+            assert setup_stripe_service.handle_webhook_event(setup_database, event) is True
+        
+        handler.assert_not_called()
+        assert setup_database.query(WebhookEvent).filter(
+            WebhookEvent.stripe_event_id == "evt_duplicate"
+        ).count() == 1
+    
+    def test_failed_webhook_event_is_retried(self, setup_database, setup_stripe_service):
+        """Test that an event whose handler fails is processed again on redelivery."""
+        event = self._make_webhook_event("evt_retry")
+        with patch.object(setup_stripe_service, "_handle_invoice_payment_failed",
+                          side_effect=RuntimeError("db down")):
+            assert setup_stripe_service.handle_webhook_event(setup_database, event) is False
+        
+        assert setup_stripe_service.handle_webhook_event(setup_database, event) is True
+    
+    def test_subscription_created_links_customer(self, setup_database, setup_stripe_service, setup_user):
+        """Test that subscription.created records a new subscription for a known customer."""
+        customer = setup_stripe_service.get_or_create_customer(
+            db=setup_database,
+            user_id=setup_user.id
+        )
+        stripe_subscription = MagicMock()
+        stripe_subscription.id = "sub_from_webhook"
+        stripe_subscription.customer = customer.stripe_customer_id
+        stripe_subscription.status = "active"
+        stripe_subscription.currency = "eur"
+        stripe_subscription.items.data = []
+        stripe_subscription.current_period_start = 1678886400
+        stripe_subscription.current_period_end = 1681564800
+        
+        setup_stripe_service._handle_subscription_created(setup_database, stripe_subscription)
+        setup_database.commit()
+        
+        subscription = setup_stripe_service.get_subscription(setup_database, "sub_from_webhook")
+        assert subscription.customer_id == customer.id
+    
+    def test_payment_intent_succeeded_updates_payment(self, setup_database, setup_stripe_service, setup_user):
+        """Test that payment_intent.succeeded flips the payment status in place."""
+        setup_stripe_service.get_or_create_customer(
+            db=setup_database,
+            user_id=setup_user.id
+        )
+        payment = setup_stripe_service.create_payment_intent(
+            db=setup_database,
+            customer_id=setup_user.id,
+            amount=2000
+        )
+        
+        setup_stripe_service._handle_payment_intent_succeeded(setup_database, MagicMock(id="pi_test123"))
+        setup_database.commit()
+        setup_database.refresh(payment)
+        
+        assert payment.status.value == "succeeded"
+    
+    def test_subscription_updated_writes_all_fields(self, setup_database, setup_stripe_service, setup_user):
+        """Test that subscription.updated updates status, periods and cancellation fields."""
+        subscription = setup_stripe_service.create_subscription(
+            db=setup_database,
+            user_id=setup_user.id,
+            price_id="price_test123"
+        )
+        stripe_subscription = MagicMock()
+        stripe_subscription.id = subscription.stripe_subscription_id
+        stripe_subscription.status = "past_due"
+        stripe_subscription.current_period_start = 1681564800
+        stripe_subscription.current_period_end = 1684156800
+        stripe_subscription.cancel_at = 1684156800
+        stripe_subscription.cancel_at_period_end = True
+        stripe_subscription.canceled_at = None
+        
+        setup_stripe_service._handle_subscription_updated(setup_database, stripe_subscription)
+        setup_database.commit()
+        setup_database.refresh(subscription)
+        
+        assert subscription.status.value == "past_due"
+        assert subscription.cancel_at_period_end is True
+        assert subscription.cancel_at is not None
+        assert subscription.canceled_at is None
+    
+    def test_subscription_updated_warns_for_unknown_subscription(self, setup_database, setup_stripe_service):
+        """Test that an update matching no local subscription is logged."""
+        stripe_subscription = MagicMock()
+        stripe_subscription.id = "sub_unknown"
+        stripe_subscription.status = "active"
+        stripe_subscription.current_period_start = 1681564800
+        stripe_subscription.current_period_end = 1684156800
+        stripe_subscription.cancel_at = None
+        stripe_subscription.canceled_at = None
+        stripe_subscription.cancel_at_period_end = False
+        
+        with patch.object(stripe_service_module.logger, "warning") as warning:
+            setup_stripe_service._handle_subscription_updated(setup_database, stripe_subscription)
+        
+        warning.assert_called_once()
+    
     def test_get_user_subscriptions(self, setup_database, setup_stripe_service, setup_user):
         """Test getting user subscriptions."""
         # Create subscription
@@ -0,0 +1,170 @@
+"""
+Quality scoring system tests.
+
+This module tests the quality scoring engine against a temporary SQLite database:
+- Snapshot scoring parity with scoring the full document
+- Batch quality assessment score updates
+- Quality distribution quartiles on small arrays
+- Feedback aggregation with a single IN query
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from sqlalchemy import event, select
+
+from backend.app.models import LegalDocument
+from backend.services import quality_scoring_system
+from backend.services.quality_scoring_system import QualityScoringEngine
+
+LEGAL_TEXT = (
+    "Artigo 48.º do Código da Estrada. Nos termos do Decreto-Lei n.º 114/94, "
+    "a contraordenação por excesso de velocidade é punida com coima. "
+    "O condutor pode apresentar defesa junto da ANSR no prazo de 15 dias úteis.\n"
+)
+
+DOCUMENTS = [
+    {"id": 1, "title": "Código da Estrada", "source_url": "https://dre.pt/ansr/codigo",
+     "publication_date": date(2023, 5, 1), "jurisdiction": "Portugal", "document_type": "law",
+     "extracted_text": LEGAL_TEXT * 40, "quality_score": 0.9},
+    {"id": 2, "title": "Parecer", "source_url": "https://example.com/parecer",
+     "publication_date": None, "jurisdiction": None, "document_type": "precedent",
+     "extracted_text": "Texto curto sem referências.", "quality_score": 0.3},
+    {"id": 3, "title": None, "source_url": None,
+     "publication_date": date(2010, 1, 1), "jurisdiction": "Lisboa", "document_type": None,
+     "extracted_text": None, "quality_score": 0.7},
+]
+
+SCORING_COLUMNS = ("id", "title", "source_url", "publication_date",
+                   "jurisdiction", "document_type", "extracted_text")
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Quality scoring engine over a SQLite database holding DOCUMENTS."""
+    scoring_engine = QualityScoringEngine(f"sqlite:///{tmp_path / 'quality.db'}")
+    LegalDocument.__table__.create(scoring_engine.engine)
+    with scoring_engine.engine.begin() as conn:
+        conn.execute(LegalDocument.__table__.insert(), DOCUMENTS)
+    yield scoring_engine
+    scoring_engine.engine.dispose()
+
+
+def full_document(values):
+    """Stand-in for a loaded LegalDocument, with the source name carried by its URL."""
+    return SimpleNamespace(**values, source=values["source_url"] or "")
+
+
+@pytest.mark.services
+class TestSnapshotScoring:
+    """Test suite for scoring plain document snapshots in worker processes."""
+
+    @pytest.mark.parametrize("values", DOCUMENTS, ids=lambda values: str(values["id"]))
+    def test_score_row_matches_full_document_scoring(self, engine, values):
+        """Test that scoring a column tuple gives the same scores as scoring the whole document."""
+        today = date(2024, 6, 1)
+        quality_scoring_system._init_scoring_worker(engine.database_url, today)
+
+        result = quality_scoring_system._score_row(tuple(values[column] for column in SCORING_COLUMNS))
+        expected = engine.calculate_comprehensive_quality_score(full_document(values), today)
+
+        assert result == {
+            "id": values["id"],
+            "quality_score": expected.overall_score,
+            "relevance_score": expected.relevance_score,
+            "freshness_score": expected.freshness_score,
+            "authority_score": expected.authority_score,
+        }
+
+    def test_batch_assessment_stores_scores(self, engine):
+        """Test that batch assessment writes every document's scores and reports them."""
+        with patch.object(quality_scoring_system, "ProcessPoolExecutor", ThreadPoolExecutor):
+            report = engine.batch_quality_assessment(batch_size=2)
+
+        today = date.today()
+        expected = {
+            values["id"]: engine.calculate_comprehensive_quality_score(full_document(values), today).overall_score
+            for values in DOCUMENTS
+        }
+        with engine.engine.connect() as conn:
+            stored = dict(conn.execute(select(LegalDocument.id, LegalDocument.quality_score)).all())
+
+        assert stored == pytest.approx(expected)
+        assert report["total_documents_processed"] == len(DOCUMENTS)
+        assert report["average_quality_score"] == pytest.approx(np.mean(list(expected.values())))
+
+
+@pytest.mark.services
+class TestQualityDistribution:
+    """Test suite for quality score distribution statistics."""
+
+    @pytest.mark.parametrize("size", [1, 2, 3, 4, 5, 7, 10])
+    def test_quartiles_match_numpy_percentile(self, engine, size):
+        """Test that partition-based quartiles equal np.percentile on small arrays."""
+        scores = np.random.default_rng(size).random(size)
+
+        statistics = engine._summarize_quality_scores(scores)["statistics"]
+
+        assert statistics["percentile_25"] == pytest.approx(np.percentile(scores, 25))
+        assert statistics["median"] == pytest.approx(np.median(scores))
+        assert statistics["percentile_75"] == pytest.approx(np.percentile(scores, 75))
+        assert statistics["min"] == scores.min() and statistics["max"] == scores.max()
+
+    def test_tier_counts_follow_thresholds(self, engine):
+        """Test that scores are counted into high, medium and low tiers."""
+        distribution = engine._summarize_quality_scores([0.95, 0.8, 0.7, 0.6, 0.59, 0.1])
+
+        assert (distribution["high_quality"], distribution["medium_quality"],
+                distribution["low_quality"]) == (2, 2, 2)
+
+    def test_empty_scores_give_empty_summary(self, engine):
+        """Test that no scores produce an empty distribution."""
+        assert engine._summarize_quality_scores([]) == {}
+
+
+@pytest.mark.services
+class TestFeedbackAnalysis:
+    """Test suite for aggregating user feedback against stored quality scores."""
+
+    FEEDBACK = [
+        {"document_id": 1, "rating": 5},
+        {"document_id": 3, "rating": 4},
+        {"document_id": 2, "rating": 1},
+        {"document_id": 2, "rating": 3},
+        {"document_id": 1},
+        {"document_id": 99, "rating": 5},
+        {"rating": 5},
+    ]
+
+    def test_feedback_scores_are_averaged_per_sentiment(self, engine):
+        """Test that positive and negative averages use the scores of the rated documents."""
+        analysis = engine._analyze_feedback_patterns(self.FEEDBACK)
+
+        assert analysis["positive_feedback_count"] == 4
+        assert analysis["negative_feedback_count"] == 2
+        # Ratings below 4, including unrated feedback, count against the document
+        assert analysis["positive_documents_avg_quality"] == pytest.approx((0.9 + 0.7) / 2)
+        assert analysis["negative_documents_avg_quality"] == pytest.approx((0.3 + 0.3 + 0.9) / 3)
+        assert analysis["quality_threshold_feedback_ratio"] == pytest.approx(2 / 3)
+
+    def test_feedback_scores_are_fetched_in_one_query(self, engine):
+        """Test that referenced documents are loaded with a single SELECT."""
+        statements = []
+        event.listen(engine.engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        engine._analyze_feedback_patterns(self.FEEDBACK)
+
+        assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+
+    def test_feedback_without_scored_documents(self, engine):
+        """Test that feedback on unknown documents leaves both averages at zero."""
+        analysis = engine._analyze_feedback_patterns([{"document_id": 99, "rating": 5}])
+
+        assert analysis["positive_documents_avg_quality"] == 0
+        assert analysis["negative_documents_avg_quality"] == 0
+        assert analysis["quality_threshold_feedback_ratio"] == float("inf")
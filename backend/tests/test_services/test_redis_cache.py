@@ -0,0 +1,433 @@
+"""
+Redis cache tests.
+
+This module tests the Redis caching layer against a mocked Redis client:
+- Pipelined bulk writes
+- Single-command SET with expiry
+- Fire-and-forget background writes
+- Cache warming for legal documents
+- SCAN-based pattern invalidation
+- Read-only cache status reporting
+- Tagged JSON/MessagePack serialization
+- Lazy connection health tracking and explicit health pings
+- In-process legal document front cache (private copies, write-through)
+- MGET batch reads
+- Hashed default keys for the cached decorator
+- Async client operations
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from cachetools import TTLCache
+
+from services import redis_cache
+from services.redis_cache import RedisCache, CacheKeys, FineHeroCache
+
+
+@pytest.fixture
+def mock_client():
+    """Mocked Redis client returned by the connection factory."""
+    client = MagicMock()
+    client.ping.return_value = True
+    return client
+
+
+@pytest.fixture
+def mock_async_client():
+    """Mocked asyncio Redis client."""
+    return AsyncMock()
+
+
+@pytest.fixture
+def redis_cache_instance(mock_client, mock_async_client):
+    """RedisCache connected to the mocked clients."""
+    with patch.dict("os.environ", {"REDIS_URL": ""}), \
+         patch("services.redis_cache.redis.Redis", return_value=mock_client), \
+         patch("services.redis_cache.aioredis.Redis", return_value=mock_async_client):
+        return RedisCache()
+
+
+@pytest.mark.services
+class TestPipelinedWrites:
+    """Test suite for pipelined cache writes."""
+
+    def test_mset_many_uses_single_pipeline_round_trip(self, redis_cache_instance, mock_client):
+        """Test that bulk writes are buffered in one pipeline."""
+        pipe = mock_client.pipeline.return_value
+        pipe.execute.return_value = [True, True]
+
+        stored = redis_cache_instance.mset_many([
+            ("key:1", {"a": 1}, 60),
+            ("key:2", {"b": 2}, None)
+        ])
+
+        assert stored == 2
+        mock_client.pipeline.assert_called_once_with(transaction=False)
+        assert [c.kwargs["ex"] for c in pipe.set.call_args_list] == [60, None]
+        pipe.execute.assert_called_once()
+        mock_client.set.assert_not_called()
+
+    def test_mset_many_chunks_large_batches(self, redis_cache_instance, mock_client):
+        """Test that large batches are flushed once per chunk."""
+        pipe = mock_client.pipeline.return_value
+        pipe.execute.side_effect = lambda: [True] * redis_cache.PIPELINE_CHUNK_SIZE
+
+        items = [(f"key:{i}", [i], 60) for i in range(redis_cache.PIPELINE_CHUNK_SIZE * 2)]
+        stored = redis_cache_instance.mset_many(items)
+
+        assert stored == len(items)
+        assert pipe.execute.call_count == 2
+
+    def test_warm_cache_legal_documents_pipelines_writes(self, redis_cache_instance):
+        """Test that cache warming sends all documents in one bulk write."""
+        documents = [{"id": 1, "title": "Artigo 48"}, {"title": "sem id"}, {"id": 2}]
+
+        with patch.object(redis_cache, "cache", redis_cache_instance), \
+             patch.object(redis_cache_instance, "mset_many", return_value=2) as mset_many:
+            count = FineHeroCache.warm_cache_legal_documents(documents)
+
+        assert count == 2
+        items = mset_many.call_args[0][0]
+        assert [key for key, _, _ in items] == [
+            CacheKeys.legal_document("1"), CacheKeys.legal_document("2")
+        ]
+
+
+@pytest.mark.services
+class TestSingleCommandWrites:
+    """Test suite for single-command writes."""
+
+    def test_set_with_ttl_is_one_set_ex_command(self, redis_cache_instance, mock_client):
+        """Test that a TTL write is sent as SET ... EX instead of SETEX."""
+        redis_cache_instance.set("fine:1", {"id": 1}, 60)
+
+        mock_client.set.assert_called_once()
+        assert mock_client.set.call_args.kwargs["ex"] == 60
+        mock_client.setex.assert_not_called()
+
+    def test_set_without_ttl_omits_expiry(self, redis_cache_instance, mock_client):
+        """Test that a write without TTL does not set an expiry."""
+        redis_cache_instance.set("fine:1", {"id": 1})
+
+        assert mock_client.set.call_args.kwargs["ex"] is None
+
+@pytest.mark.services
+class TestBackgroundWrites:
+    """Test suite for fire-and-forget cache writes."""
+
+    def test_set_background_runs_on_writer_pool(self, redis_cache_instance, mock_client):
+        """Test that queued writes reach Redis from the writer pool."""
+        assert redis_cache_instance.set_background("legal_doc:1", {"id": 1}, 60)
+
+        redis_cache_instance._write_pool.shutdown(wait=True)
+        mock_client.set.assert_called_once()
+
+    def test_cache_legal_document_does_not_wait_for_redis(self, redis_cache_instance):
+        """Test that caching a document queues the write instead of blocking."""
+        with patch.object(redis_cache, "cache", redis_cache_instance), \
+             patch.object(redis_cache_instance, "set") as blocking_set, \
+             patch.object(redis_cache_instance, "set_background", return_value=True) as set_background:
+            assert FineHeroCache.cache_legal_document({"id": 1}, "1")
+
+        blocking_set.assert_not_called()
+        set_background.assert_called_once_with(
+            CacheKeys.legal_document("1"), {"id": 1}, redis_cache_instance.document_cache_ttl
+        )
+
+@pytest.mark.services
+class TestPatternDeletes:
+    """Test suite for pattern-based invalidation."""
+
+    def test_delete_pattern_scans_instead_of_keys(self, redis_cache_instance, mock_client):
+        """Test that pattern deletes never issue the blocking KEYS command."""
+        mock_client.scan_iter.return_value = iter(["legal_doc:1", "legal_doc:2"])
+        pipe = mock_client.pipeline.return_value
+        pipe.execute.return_value = [1, 1]
+
+        deleted = redis_cache_instance.delete_pattern("legal_doc:*")
+
+        assert deleted == 2
+        mock_client.keys.assert_not_called()
+        mock_client.scan_iter.assert_called_once_with(match="legal_doc:*", count=redis_cache.SCAN_COUNT)
+        assert pipe.delete.call_count == 2
+        pipe.execute.assert_called_once()
+
+    def test_delete_pattern_without_matches(self, redis_cache_instance, mock_client):
+        """Test that an empty scan skips the pipeline round trip."""
+        mock_client.scan_iter.return_value = iter([])
+
+        assert redis_cache_instance.delete_pattern("fines:*") == 0
+        mock_client.pipeline.return_value.execute.assert_not_called()
+
+
+@pytest.mark.services
+class TestCacheStatus:
+    """Test suite for cache status reporting."""
+
+    def test_count_pattern_is_read_only(self, redis_cache_instance, mock_client):
+        """Test that counting keys does not delete them."""
+        mock_client.scan_iter.return_value = iter(["fine:1", "fine:2", "fine:3"])
+
+        assert redis_cache_instance.count_pattern("fine:*") == 3
+        mock_client.delete.assert_not_called()
+
+    def test_get_cache_status_does_not_invalidate(self, redis_cache_instance):
+        """Test that reporting status leaves cached entries in place."""
+        with patch.object(redis_cache, "cache", redis_cache_instance), \
+             patch.object(redis_cache_instance, "get_stats", return_value={"status": "connected"}), \
+             patch.object(redis_cache_instance, "count_pattern", return_value=5) as count_pattern, \
+             patch.object(redis_cache_instance, "delete_pattern") as delete_pattern:
+            status = FineHeroCache.get_cache_status()
+
+        delete_pattern.assert_not_called()
+        assert count_pattern.call_count == 4
+        assert status["cache_patterns"]["legal_documents"] == 5
+
+
+@pytest.mark.services
+class TestSerialization:
+    """Test suite for tagged value serialization."""
+
+    @pytest.mark.parametrize("value", [
+        {"artigo": "48º", "coima": 60.0, "tags": ["estacionamento"]},
+        [1, "dois", {"três": 3}],
+        ("tuple", 1),
+        0.75,
+        b"\x00\xff\xfe binary"
+    ])
+    def test_round_trip(self, redis_cache_instance, value):
+        """Test that serialized values decode back to the original."""
+        decoded = redis_cache_instance._deserialize(redis_cache_instance._serialize(value))
+        assert decoded == value
+
+    def test_untagged_binary_is_returned_unchanged(self, redis_cache_instance):
+        """Test that non-UTF-8 bytes without a tag are not decoded lossily."""
+        raw = b"\x93NUMPY\xff\xfe\x80"
+
+        assert redis_cache_instance._deserialize(raw) == raw
+
+    def test_untagged_json_is_still_readable(self, redis_cache_instance):
+        """Test that entries written before the tagged format still decode."""
+        assert redis_cache_instance._deserialize('{"artigo": "48º"}'.encode("utf-8")) == {"artigo": "48º"}
+
+    def test_structured_values_use_json(self, redis_cache_instance):
+        """Test that JSON-serializable dicts and lists are stored as tagged JSON."""
+        assert redis_cache_instance._serialize({"a": 1})[:1] == redis_cache.JSON_TAG
+        assert redis_cache_instance._serialize([1, 2])[:1] == redis_cache.JSON_TAG
+
+    def test_non_json_structures_fall_back_to_msgpack(self, redis_cache_instance):
+        """Test that structures holding bytes are stored as tagged MessagePack."""
+        value = {"pdf": b"%PDF-1.4\xff"}
+        serialized = redis_cache_instance._serialize(value)
+
+        assert serialized[:1] == redis_cache.MSGPACK_TAG
+        assert redis_cache_instance._deserialize(serialized) == value
+
+    def test_get_decodes_stored_bytes(self, redis_cache_instance, mock_client):
+        """Test that get dispatches on the stored format tag."""
+        mock_client.get.return_value = redis_cache_instance._serialize({"id": 7})
+
+        assert redis_cache_instance.get("legal_doc:7") == {"id": 7}
+
+
+@pytest.mark.services
+class TestConnectionHandling:
+    """Test suite for lazy connection health tracking."""
+
+    def test_is_connected_does_not_ping(self, redis_cache_instance, mock_client):
+        """Test that health checks do not cost a round trip."""
+        mock_client.ping.reset_mock()
+
+        assert redis_cache_instance.is_connected()
+        mock_client.ping.assert_not_called()
+
+    def test_connection_error_disables_cache_until_backoff(self, redis_cache_instance, mock_client):
+        """Test that a failed command marks the cache disconnected and backs off."""
+        mock_client.get.side_effect = redis_cache.redis.ConnectionError("connection reset")
+
+        assert redis_cache_instance.get("fine:1") is None
+        with patch("services.redis_cache.redis.Redis") as redis_factory:
+            assert not redis_cache_instance.is_connected()
+            redis_factory.assert_not_called()
+
+    def test_reconnects_after_backoff(self, redis_cache_instance, mock_client):
+        """Test that the cache reconnects once the backoff delay has passed."""
+        mock_client.exists.side_effect = redis_cache.redis.TimeoutError("timed out")
+        redis_cache_instance.exists("fine:1")
+        redis_cache_instance._next_reconnect_at = 0.0
+
+        with patch("services.redis_cache.redis.Redis", return_value=MagicMock()):
+            assert redis_cache_instance.is_connected()
+
+    def test_ping_detects_outage(self, redis_cache_instance, mock_client):
+        """Test that the health ping round-trips and drops the client when Redis is down."""
+        assert redis_cache_instance.ping()
+
+        mock_client.ping.side_effect = redis_cache.redis.ConnectionError("connection refused")
+
+        assert not redis_cache_instance.ping()
+        assert redis_cache_instance._client is None
+
+
+@pytest.mark.services
+class TestLegalDocumentFrontCache:
+    """Test suite for the in-process legal document cache."""
+
+    @pytest.fixture
+    def front_cache(self, redis_cache_instance):
+        """Empty front cache with the global cache pointed at the mocked client."""
+        with patch.object(redis_cache, "cache", redis_cache_instance), \
+             patch.object(redis_cache, "_legal_document_l1", TTLCache(maxsize=16, ttl=60)) as l1, \
+             patch.object(redis_cache, "legal_document_l1_enabled", True):
+            yield l1
+
+    def test_hot_document_skips_redis(self, front_cache, redis_cache_instance):
+        """Test that a repeated lookup is served from process memory."""
+        with patch.object(redis_cache_instance, "get", return_value={"id": 1}) as redis_get:
+            assert FineHeroCache.get_legal_document("1") == {"id": 1}
+            assert FineHeroCache.get_legal_document("1") == {"id": 1}
+
+        redis_get.assert_called_once_with(CacheKeys.legal_document("1"))
+
+    def test_invalidation_clears_front_cache(self, front_cache, redis_cache_instance):
+        """Test that invalidating a document also drops the local copy."""
+        front_cache[CacheKeys.legal_document("1")] = {"id": 1, "stale": True}
+
+        with patch.object(redis_cache_instance, "delete", return_value=True):
+            FineHeroCache.invalidate_legal_document("1")
+
+        assert CacheKeys.legal_document("1") not in front_cache
+
+    def test_callers_get_private_copies(self, front_cache, redis_cache_instance):
+        """Test that mutating a returned document does not change what later callers see."""
+        with patch.object(redis_cache_instance, "get", return_value={"id": 1, "tags": ["a"]}):
+            first = FineHeroCache.get_legal_document("1")
+        first["tags"].append("mutated")
+
+        second = FineHeroCache.get_legal_document("1")
+
+        assert second == {"id": 1, "tags": ["a"]}
+        assert second is not first
+
+    def test_cached_document_is_written_through(self, front_cache, redis_cache_instance):
+        """Test that a queued write is visible locally before Redis acknowledges it."""
+        with patch.object(redis_cache_instance, "set_background", return_value=True), \
+             patch.object(redis_cache_instance, "get", return_value={"id": 1, "version": 1}) as redis_get:
+            FineHeroCache.cache_legal_document({"id": 1, "version": 2}, "1")
+
+            assert FineHeroCache.get_legal_document("1") == {"id": 1, "version": 2}
+
+        redis_get.assert_not_called()
+
+    def test_read_racing_a_write_does_not_refill_stale_value(self, front_cache, redis_cache_instance):
+        """Test that a Redis read overlapping a local write leaves the new value cached."""
+        def stale_read(key):
+            # The document is re-cached while this read is in flight
+            FineHeroCache.cache_legal_document({"id": 1, "version": 2}, "1")
+            return {"id": 1, "version": 1}
+
+        with patch.object(redis_cache_instance, "set_background", return_value=True), \
+             patch.object(redis_cache_instance, "get", side_effect=stale_read):
+            assert FineHeroCache.get_legal_document("1") == {"id": 1, "version": 1}
+            assert FineHeroCache.get_legal_document("1") == {"id": 1, "version": 2}
+
+
+@pytest.mark.services
+class TestBatchReads:
+    """Test suite for MGET-based batch reads."""
+
+    def test_get_many_uses_single_mget(self, redis_cache_instance, mock_client):
+        """Test that batch reads issue one MGET and skip missing keys."""
+        serialize = redis_cache_instance._serialize
+        mock_client.mget.return_value = [serialize({"id": 1}), None, serialize({"id": 3})]
+
+        result = redis_cache_instance.get_many(["fine:1", "fine:2", "fine:3"])
+
+        assert result == {"fine:1": {"id": 1}, "fine:3": {"id": 3}}
+        mock_client.mget.assert_called_once_with(["fine:1", "fine:2", "fine:3"])
+        mock_client.get.assert_not_called()
+
+    def test_get_legal_documents_fetches_only_local_misses(self, redis_cache_instance):
+        """Test that documents in the front cache are not requested from Redis."""
+        l1 = TTLCache(maxsize=16, ttl=60)
+        l1[CacheKeys.legal_document("1")] = redis_cache_instance._serialize({"id": 1})
+
+        with patch.object(redis_cache, "cache", redis_cache_instance), \
+             patch.object(redis_cache, "_legal_document_l1", l1), \
+             patch.object(redis_cache, "legal_document_l1_enabled", True), \
+             patch.object(redis_cache_instance, "get_many",
+                          return_value={CacheKeys.legal_document("2"): {"id": 2}}) as get_many:
+            documents = FineHeroCache.get_legal_documents(["1", "2", "3"])
+
+        assert documents == {"1": {"id": 1}, "2": {"id": 2}}
+        get_many.assert_called_once_with([CacheKeys.legal_document("2"), CacheKeys.legal_document("3")])
+
+
+@pytest.mark.services
+class TestCachedDecoratorKeys:
+    """Test suite for default cache key generation."""
+
+    @staticmethod
+    def lookup(*args, **kwargs):
+        return args, kwargs
+
+    def test_keys_are_fixed_size(self):
+        """Test that large arguments do not grow the key."""
+        short_key = redis_cache._default_cache_key(self.lookup, ("a",), {})
+        long_key = redis_cache._default_cache_key(self.lookup, ("a" * 10000,), {})
+
+        assert len(short_key) == len(long_key)
+        assert short_key.startswith(f"{__name__}.TestCachedDecoratorKeys.lookup:")
+
+    def test_separator_in_arguments_does_not_collide(self):
+        """Test that argument boundaries are part of the key."""
+        joined = redis_cache._default_cache_key(self.lookup, ("a:b",), {})
+        split = redis_cache._default_cache_key(self.lookup, ("a", "b"), {})
+
+        assert joined != split
+
+    def test_kwargs_order_is_canonical(self):
+        """Test that keyword argument order does not change the key."""
+        first = redis_cache._default_cache_key(self.lookup, (), {"page": 1, "per_page": 20})
+        second = redis_cache._default_cache_key(self.lookup, (), {"per_page": 20, "page": 1})
+
+        assert first == second
+
+
+@pytest.mark.services
+class TestAsyncOperations:
+    """Test suite for the asyncio client."""
+
+    @pytest.mark.asyncio
+    async def test_aget_awaits_async_client(self, redis_cache_instance, mock_client, mock_async_client):
+        """Test that async reads go through the asyncio client only."""
+        mock_async_client.get.return_value = redis_cache_instance._serialize({"id": 1})
+
+        assert await redis_cache_instance.aget("fine:1") == {"id": 1}
+        mock_client.get.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_aset_sets_expiry_in_one_command(self, redis_cache_instance, mock_async_client):
+        """Test that async writes pass the TTL with the SET command."""
+        mock_async_client.set.return_value = True
+
+        assert await redis_cache_instance.aset("fine:1", {"id": 1}, 60)
+        assert mock_async_client.set.call_args.kwargs["ex"] == 60
+
+    @pytest.mark.asyncio
+    async def test_async_cached_uses_cache_on_hit(self, redis_cache_instance):
+        """Test that a cached coroutine is not awaited again on a hit."""
+        calls = []
+
+        @redis_cache.async_cached(ttl=60)
+        async def load(doc_id):
+            calls.append(doc_id)
+            return {"id": doc_id}
+
+        with patch.object(redis_cache, "cache", redis_cache_instance), \
+             patch.object(redis_cache_instance, "aget", AsyncMock(side_effect=[None, {"id": 1}])), \
+             patch.object(redis_cache_instance, "aset", AsyncMock(return_value=True)):
+            assert await load(1) == {"id": 1}
+            assert await load(1) == {"id": 1}
+
+        assert calls == [1]
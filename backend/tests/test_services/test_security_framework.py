@@ -0,0 +1,780 @@
+"""
+Security framework tests.
+
+This module tests the security framework against mocked dependencies:
+- Redis token bucket rate limiting
+- Audit stream writes fused into rate limit rejections
+- Batched API key usage writes
+- Cached API key validation
+- Hex to raw digest API key hash migration
+- Malicious upload content scanning
+- Async session variants
+- Buffered audit log writes
+- Suspicious activity detection
+- Streaming GDPR data export and early failure handling
+- Bulk retention cleanup
+- In-process ring buffer rate limiting and idle eviction
+- HTML input sanitization
+- Shared SecurityManager for request dependencies
+- Portuguese NIF validation
+- Cached JWT verification
+- Precomputed security response headers
+"""
+
+import dataclasses
+import hashlib
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import orjson
+import redis
+from fastapi import HTTPException
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+from infrastructure.migrations.api_key_hash_binary_migration import APIKeyHashMigration
+
+from services import security_framework
+from services.security_framework import (
+    APIKey,
+    APIKeyUsageWriter,
+    AuditLogWriter,
+    AuditStreamConsumer,
+    GDPRComplianceManager,
+    InProcessRateLimiter,
+    RedisRateLimiter,
+    SecurityEvent,
+    SecurityLevel,
+    SecurityManager,
+    SecurityMiddleware,
+    get_security_manager,
+    sanitize_html_content,
+    validate_nif,
+)
+
+
+@pytest.fixture
+def mock_redis():
+    """Mocked Redis client with a loaded rate limit script."""
+    client = MagicMock()
+    client.script_load.return_value = "sha"
+    return client
+
+
+@pytest.fixture
+def mock_db():
+    """Mocked SQLAlchemy session."""
+    return MagicMock()
+
+
+@pytest.fixture(autouse=True)
+def clear_shared_caches():
+    """Isolate the shared API key and token caches between tests."""
+    security_framework._api_key_cache.clear()
+    security_framework._token_cache.clear()
+    yield
+    security_framework._api_key_cache.clear()
+    security_framework._token_cache.clear()
+
+
+def make_api_key_record(raw_key: str, expires_at: datetime):
+    """Build a mocked APIKey row matching raw_key."""
+    return MagicMock(
+        id=1,
+        user_id="user-1",
+        key_hash=hashlib.sha256(raw_key.encode()).digest(),
+        permissions='["read"]',
+        rate_limit=100,
+        expires_at=expires_at,
+    )
+
+
+@pytest.mark.services
+class TestRedisRateLimiting:
+    """Test suite for the Redis token bucket rate limiter."""
+
+    def test_allow_uses_cached_script(self, mock_redis):
+        """Test that checks run the preloaded script by SHA."""
+        mock_redis.evalsha.return_value = [1, 0, b""]
+
+        limiter = RedisRateLimiter(mock_redis)
+
+        assert limiter.allow("1.2.3.4", 100, 3600) is True
+        args = mock_redis.evalsha.call_args.args
+        assert args[:5] == ("sha", 1, "rate_limit:1.2.3.4", 100, 3600)
+
+    def test_allow_reloads_flushed_script(self, mock_redis):
+        """Test that a flushed script cache falls back to EVAL."""
+        mock_redis.evalsha.side_effect = redis.exceptions.NoScriptError()
+        mock_redis.eval.return_value = [0, 36, b""]
+
+        limiter = RedisRateLimiter(mock_redis)
+
+        assert limiter.allow("1.2.3.4", 100, 3600) is False
+        mock_redis.eval.assert_called_once()
+
+    def test_check_rate_limit_delegates_to_redis(self, mock_redis, mock_db):
+        """Test that SecurityManager uses the shared bucket when configured."""
+        mock_redis.evalsha.return_value = [0, 10, b""]
+        manager = SecurityManager(mock_db, rate_limiter=RedisRateLimiter(mock_redis))
+
+        assert manager.check_rate_limit("client", limit=1, window=60) is False
+        assert not any(rings for rings, _ in manager._local_rate_limiter._shards)
+
+    def test_check_rate_limit_falls_back_when_redis_fails(self, mock_redis, mock_db):
+        """Test that Redis errors degrade to in-process limits."""
+        mock_redis.evalsha.side_effect = redis.ConnectionError()
+        manager = SecurityManager(mock_db, rate_limiter=RedisRateLimiter(mock_redis))
+
+        assert manager.check_rate_limit("client", limit=1, window=60) is True
+        assert manager.check_rate_limit("client", limit=1, window=60) is False
+
+
+    def test_rejection_audit_row_rides_on_rate_limit_call(self, mock_redis, mock_db):
+        """Test that the audit row is sent with the check instead of logged separately."""
+        mock_redis.evalsha.return_value = [0, 10, b"1-0"]
+        audit_writer = MagicMock()
+        manager = SecurityManager(mock_db, rate_limiter=RedisRateLimiter(mock_redis),
+                                  audit_writer=audit_writer)
+
+        allowed = manager.check_rate_limit("client", audit_event=SecurityEvent(
+            event_type="rate_limit_exceeded", ip_address="client"
+        ))
+
+        assert allowed is False
+        args = mock_redis.evalsha.call_args.args
+        assert args[6] == security_framework.SECURITY_CONFIG.audit_stream_key
+        assert orjson.loads(args[8])["event_type"] == "rate_limit_exceeded"
+        audit_writer.record.assert_not_called()
+
+    def test_local_fallback_logs_rejection(self, mock_db):
+        """Test that in-process rejections still reach the audit log."""
+        audit_writer = MagicMock()
+        manager = SecurityManager(mock_db, audit_writer=audit_writer)
+        event = SecurityEvent(event_type="rate_limit_exceeded", ip_address="client")
+
+        assert manager.check_rate_limit("client", limit=1, window=60, audit_event=event) is True
+        assert manager.check_rate_limit("client", limit=1, window=60, audit_event=event) is False
+        audit_writer.record.assert_called_once()
+
+    def test_stream_consumer_acks_after_commit(self, mock_redis):
+        """Test that streamed audit rows are inserted and then acknowledged."""
+        row = SecurityManager._audit_row(SecurityEvent(event_type="rate_limit_exceeded"))
+        mock_redis.xautoclaim.return_value = [b"0-0", [], []]
+        mock_redis.xreadgroup.return_value = [
+            (b"security_audit_events", [(b"1-0", {b"row": orjson.dumps(row)})])
+        ]
+        session = MagicMock()
+        with patch("services.security_framework.threading.Thread"):
+            consumer = AuditStreamConsumer(mock_redis, lambda: session)
+
+        assert consumer.drain() == 1
+        inserted = session.execute.call_args.args[1]
+        assert inserted[0]["timestamp"] == row["timestamp"]
+        session.commit.assert_called_once()
+        mock_redis.xack.assert_called_once_with(consumer.stream, consumer.group, b"1-0")
+
+    def test_stream_consumer_claims_pending_entries_at_startup(self, mock_redis):
+        """Test that entries left unacknowledged by an earlier worker are written before new reads."""
+        row = SecurityManager._audit_row(SecurityEvent(event_type="rate_limit_exceeded"))
+        mock_redis.xautoclaim.return_value = [b"0-0", [(b"1-0", {b"row": orjson.dumps(row)})], []]
+        with patch("services.security_framework.threading.Thread"):
+            consumer = AuditStreamConsumer(mock_redis, MagicMock)
+
+        assert consumer.drain() == 1
+        assert mock_redis.xautoclaim.call_args.args[3] == consumer.claim_idle_ms
+        mock_redis.xreadgroup.assert_not_called()
+        mock_redis.xack.assert_called_once_with(consumer.stream, consumer.group, b"1-0")
+
+    def test_stream_consumer_retries_entries_after_failed_commit(self, mock_redis):
+        """Test that a failed write leaves entries unacknowledged and claims them back once idle."""
+        row = SecurityManager._audit_row(SecurityEvent(event_type="rate_limit_exceeded"))
+        entry = (b"1-0", {b"row": orjson.dumps(row)})
+        mock_redis.xautoclaim.return_value = [b"0-0", [], []]
+        mock_redis.xreadgroup.return_value = [(b"security_audit_events", [entry])]
+        failing, healthy = MagicMock(), MagicMock()
+        failing.commit.side_effect = RuntimeError("database unavailable")
+        sessions = iter([failing, healthy])
+        with patch("services.security_framework.threading.Thread"):
+            consumer = AuditStreamConsumer(mock_redis, lambda: next(sessions))
+
+        with patch("services.security_framework.time.monotonic", return_value=1000.0):
+            assert consumer.drain() == 0
+            mock_redis.xack.assert_not_called()
+            failing.rollback.assert_called_once()
+            mock_redis.xreadgroup.return_value = []
+            assert consumer.drain() == 0  # not idle yet: no claim, nothing new
+            assert mock_redis.xautoclaim.call_count == 1
+
+        mock_redis.xautoclaim.return_value = [b"0-0", [entry], []]
+        with patch("services.security_framework.time.monotonic",
+                   return_value=1000.0 + consumer.claim_idle_ms / 1000):
+            assert consumer.drain() == 1
+
+        assert mock_redis.xautoclaim.call_args.kwargs["start_id"] == "0-0"
+        healthy.commit.assert_called_once()
+        mock_redis.xack.assert_called_once_with(consumer.stream, consumer.group, b"1-0")
+
+
+@pytest.mark.services
+class TestAPIKeyUsageBatching:
+    """Test suite for batched API key usage writes."""
+
+    def test_usage_is_coalesced_per_key(self):
+        """Test that repeated uses of a key flush as one row."""
+        session = MagicMock()
+        writer = APIKeyUsageWriter(lambda: session, flush_interval=60)
+        first, last = datetime(2024, 1, 1, 12, 0), datetime(2024, 1, 1, 12, 5)
+
+        writer.record(b"hash-a", first)
+        writer.record(b"hash-a", last)
+        writer.record(b"hash-b", first)
+
+        assert writer.flush() == 2
+        params = session.execute.call_args.args[1]
+        assert {"h": b"hash-a", "c": 2, "t": last} in params
+        session.commit.assert_called_once()
+        assert writer.flush() == 0
+
+    def test_validate_api_key_defers_commit_to_writer(self, mock_db):
+        """Test that validation records usage instead of committing."""
+        record = make_api_key_record("fh_test", datetime.utcnow() + timedelta(days=1))
+        mock_db.execute.return_value.scalars.return_value.first.return_value = record
+        writer = MagicMock()
+        manager = SecurityManager(mock_db, usage_writer=writer)
+
+        assert manager.validate_api_key("fh_test").user_id == "user-1"
+        writer.record.assert_called_once()
+        mock_db.commit.assert_not_called()
+
+
+@pytest.mark.services
+class TestAPIKeyValidationCache:
+    """Test suite for cached API key validation."""
+
+    def test_cache_hit_skips_database(self, mock_db):
+        """Test that a second validation is served from the cache."""
+        record = make_api_key_record("fh_test", datetime.utcnow() + timedelta(days=1))
+        mock_db.execute.return_value.scalars.return_value.first.return_value = record
+        manager = SecurityManager(mock_db, usage_writer=MagicMock())
+
+        first = manager.validate_api_key("fh_test")
+        second = manager.validate_api_key("fh_test")
+
+        assert first is second
+        assert first.permissions == ["read"]
+        assert mock_db.execute.call_count == 1
+
+    def test_expired_cached_key_is_rejected(self, mock_db):
+        """Test that keys expiring while cached stop validating."""
+        record = make_api_key_record("fh_test", datetime.utcnow() + timedelta(days=1))
+        mock_db.execute.return_value.scalars.return_value.first.return_value = record
+        manager = SecurityManager(mock_db, usage_writer=MagicMock())
+        validated = manager.validate_api_key("fh_test")
+        record.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        security_framework._api_key_cache["fh_test"] = dataclasses.replace(
+            validated, expires_at=record.expires_at
+        )
+
+        assert manager.validate_api_key("fh_test") is None
+        assert "fh_test" not in security_framework._api_key_cache
+
+    def test_unknown_key_is_not_cached(self, mock_db):
+        """Test that failed validations are not memoized."""
+        mock_db.execute.return_value.scalars.return_value.first.return_value = None
+        manager = SecurityManager(mock_db, usage_writer=MagicMock())
+
+        assert manager.validate_api_key("fh_unknown") is None
+        assert "fh_unknown" not in security_framework._api_key_cache
+
+
+@pytest.mark.services
+class TestAPIKeyHashMigration:
+    """Test suite for converting stored hex API key hashes to raw digests."""
+
+    @pytest.fixture
+    def database_url(self, tmp_path):
+        """SQLite database holding one API key stored with the old hex hash."""
+        url = f"sqlite:///{tmp_path / 'keys.db'}"
+        engine = create_engine(url)
+        APIKey.__table__.create(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                text("INSERT INTO api_keys (id, user_id, key_hash, is_active) VALUES (1, 'user-1', :h, 1)"),
+                {"h": hashlib.sha256(b"fh_legacy").hexdigest()},
+            )
+        engine.dispose()
+        return url
+
+    def test_hex_hashes_are_converted(self, database_url):
+        """Test that a key issued before the change is found by its raw digest after migrating."""
+        migration = APIKeyHashMigration(database_url)
+
+        assert migration.run_migration() == 1
+        with Session(migration.engine) as session:
+            record = session.execute(
+                select(APIKey).where(APIKey.key_hash == SecurityManager._hash_api_key("fh_legacy"))
+            ).scalars().first()
+
+        assert record is not None and record.user_id == "user-1"
+
+    def test_migration_is_idempotent_and_reversible(self, database_url):
+        """Test that rerunning converts nothing and rollback restores the hex form."""
+        migration = APIKeyHashMigration(database_url)
+        migration.run_migration()
+
+        assert migration.run_migration() == 0
+        assert migration.rollback_migration() == 1
+        with migration.engine.connect() as conn:
+            stored = conn.execute(text("SELECT key_hash FROM api_keys")).scalar()
+        assert stored == hashlib.sha256(b"fh_legacy").hexdigest()
+
+
+@pytest.mark.services
+class TestFileUploadScanning:
+    """Test suite for upload content scanning."""
+
+    @pytest.mark.parametrize("payload", [
+        b"<SCRIPT type='text/javascript'>alert(1)</script>",
+        b"<a href='JavaScript:void(0)'>",
+        b"<img onerror = 'x'>",
+        b"eval (payload)",
+        b"os.exec(cmd)",
+    ])
+    def test_malicious_patterns_are_rejected(self, mock_db, payload):
+        """Test that each malicious pattern is caught in raw bytes."""
+        manager = SecurityManager(mock_db)
+
+        result = manager.validate_file_upload(b"%PDF-1.4\xff\xfe " + payload, "fine.pdf")
+
+        assert result["valid"] is False
+
+    def test_clean_binary_upload_is_accepted(self, mock_db):
+        """Test that undecodable bytes do not break scanning."""
+        manager = SecurityManager(mock_db)
+
+        result = manager.validate_file_upload(b"%PDF-1.4\x00\xff\xfe evaluation report", "fine.pdf")
+
+        assert result == {"valid": True}
+
+
+@pytest.mark.services
+class TestAsyncSessionPaths:
+    """Test suite for the async SecurityManager variants."""
+
+    @pytest.fixture
+    def async_session(self):
+        """Mocked AsyncSession usable as an async context manager."""
+        session = AsyncMock()
+        session.add = MagicMock()
+        session.__aenter__.return_value = session
+        return session
+
+    @pytest.mark.asyncio
+    async def test_avalidate_api_key_uses_async_session(self, mock_db, async_session):
+        """Test that async validation queries through the async session."""
+        record = make_api_key_record("fh_async", datetime.utcnow() + timedelta(days=1))
+        result = MagicMock()
+        result.scalars.return_value.first.return_value = record
+        async_session.execute.return_value = result
+        writer = MagicMock()
+        manager = SecurityManager(mock_db, usage_writer=writer,
+                                  async_session_factory=MagicMock(return_value=async_session))
+
+        validated = await manager.avalidate_api_key("fh_async")
+
+        assert validated.user_id == "user-1"
+        writer.record.assert_called_once()
+        mock_db.execute.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_alog_security_event_commits_asynchronously(self, mock_db, async_session):
+        """Test that audit events are written without the sync session."""
+        manager = SecurityManager(mock_db, async_session_factory=MagicMock(return_value=async_session))
+
+        await manager.alog_security_event(SecurityEvent(
+            event_type="error_response",
+            ip_address="1.2.3.4",
+            severity=SecurityLevel.LOW,
+        ))
+
+        async_session.add.assert_called_once()
+        async_session.commit.assert_awaited_once()
+        mock_db.commit.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_acheck_rate_limit_runs_redis_check_in_thread(self, mock_redis, mock_db):
+        """Test that the Redis token bucket is consulted off the event loop."""
+        mock_redis.evalsha.return_value = [0, 10, b""]
+        manager = SecurityManager(mock_db, rate_limiter=RedisRateLimiter(mock_redis))
+
+        with patch("services.security_framework.asyncio.to_thread",
+                   AsyncMock(return_value=False)) as to_thread:
+            assert await manager.acheck_rate_limit("client", limit=1, window=60) is False
+
+        to_thread.assert_awaited_once_with(manager.check_rate_limit, "client", 1, 60, None)
+
+    @pytest.mark.asyncio
+    async def test_acheck_rate_limit_local_fallback_logs_rejection(self, mock_db):
+        """Test that in-process rejections are audited through the async logger."""
+        audit_writer = MagicMock()
+        manager = SecurityManager(mock_db, audit_writer=audit_writer)
+        event = SecurityEvent(event_type="rate_limit_exceeded", ip_address="client")
+
+        assert await manager.acheck_rate_limit("client", limit=1, window=60, audit_event=event) is True
+        assert await manager.acheck_rate_limit("client", limit=1, window=60, audit_event=event) is False
+        audit_writer.record.assert_called_once()
+
+
+@pytest.mark.services
+class TestAuditLogBuffering:
+    """Test suite for buffered audit log writes."""
+
+    def test_log_security_event_only_enqueues(self, mock_db):
+        """Test that logging with a writer stays off the database."""
+        writer = MagicMock()
+        manager = SecurityManager(mock_db, audit_writer=writer)
+
+        manager.log_security_event(SecurityEvent(event_type="rate_limit_exceeded", ip_address="1.2.3.4"))
+
+        row = writer.record.call_args.args[0]
+        assert row["event_type"] == "rate_limit_exceeded"
+        assert row["severity"] == SecurityLevel.MEDIUM.value
+        mock_db.commit.assert_not_called()
+
+    def test_flush_inserts_in_batches(self):
+        """Test that buffered rows are written in batch-sized inserts."""
+        session = MagicMock()
+        writer = AuditLogWriter(lambda: session, batch_size=2, flush_interval=60)
+        writer._wakeup.set = MagicMock()
+        for i in range(3):
+            writer.record({"event_type": f"event-{i}"})
+
+        assert writer.flush() == 3
+        assert [len(c.args[1]) for c in session.execute.call_args_list] == [2, 1]
+
+    def test_full_buffer_drops_new_events(self):
+        """Test that a full buffer drops and counts events instead of blocking."""
+        writer = AuditLogWriter(MagicMock(), buffer_size=1, flush_interval=60)
+
+        assert writer.record({"event_type": "kept"}) is True
+        assert writer.record({"event_type": "dropped"}) is False
+        assert writer.dropped == 1
+
+
+@pytest.mark.services
+class TestSuspiciousActivityDetection:
+    """Test suite for suspicious activity detection."""
+
+    def test_both_aggregates_come_from_one_query(self, mock_db):
+        """Test that request and IP counts are read in a single round trip."""
+        mock_db.execute.return_value.one.return_value = (2, 1)
+        manager = SecurityManager(mock_db, audit_writer=MagicMock())
+
+        assert manager.detect_suspicious_activity("user-1", "1.2.3.4", "/api") is False
+        assert mock_db.execute.call_count == 1
+
+    @pytest.mark.parametrize("counts, event_type", [
+        ((51, 0), "suspicious_activity"),
+        ((10, 4), "multiple_ips"),
+    ])
+    def test_thresholds_log_events(self, mock_db, counts, event_type):
+        """Test that exceeding either threshold logs the matching event."""
+        mock_db.execute.return_value.one.return_value = counts
+        writer = MagicMock()
+        manager = SecurityManager(mock_db, audit_writer=writer)
+
+        assert manager.detect_suspicious_activity("user-1", "1.2.3.4", "/api") is True
+        assert writer.record.call_args.args[0]["event_type"] == event_type
+
+
+@pytest.mark.services
+class TestGDPRExport:
+    """Test suite for GDPR data export."""
+
+    @staticmethod
+    def make_record(data_type):
+        return MagicMock(
+            data_type=data_type,
+            retention_date=datetime(2030, 1, 1),
+            consent_status="granted",
+            consent_date=datetime(2024, 1, 1),
+            legal_basis="consent",
+            processing_purposes='["analytics"]',
+            anonymized=False,
+        )
+
+    @pytest.mark.parametrize("count", [0, 1, 3])
+    def test_stream_matches_materialized_export(self, mock_db, count):
+        """Test that the streamed document parses to the same export."""
+        records = [self.make_record(f"type-{i}") for i in range(count)]
+        mock_db.execute.side_effect = lambda *_: MagicMock(scalars=MagicMock(return_value=iter(records)))
+        manager = GDPRComplianceManager(mock_db)
+
+        streamed = orjson.loads(b"".join(manager.stream_user_data_export("user-1")))
+        exported = manager.export_user_data("user-1")
+
+        assert streamed["user_id"] == "user-1"
+        assert streamed["data_records"] == exported["data_records"]
+        assert len(streamed["data_records"]) == count
+
+    def test_records_after_first_batch_are_streamed(self, mock_db):
+        """Test that records beyond the eagerly fetched batch still form valid JSON."""
+        records = [self.make_record(f"type-{i}") for i in range(5)]
+        mock_db.execute.return_value.scalars.return_value = iter(records)
+        manager = GDPRComplianceManager(mock_db)
+        config = dataclasses.replace(security_framework.SECURITY_CONFIG, gdpr_export_batch_size=2)
+
+        with patch.object(security_framework, "SECURITY_CONFIG", config):
+            chunks = manager.stream_user_data_export("user-1")
+        streamed = orjson.loads(b"".join(chunks))
+
+        assert [r["data_type"] for r in streamed["data_records"]] == [f"type-{i}" for i in range(5)]
+
+    def test_query_failure_raises_before_streaming(self, mock_db):
+        """Test that a failing first fetch raises before any bytes are produced."""
+        mock_db.execute.side_effect = RuntimeError("database unavailable")
+        manager = GDPRComplianceManager(mock_db)
+
+        with pytest.raises(RuntimeError):
+            manager.stream_user_data_export("user-1")
+
+    def test_missing_dates_and_invalid_purposes_are_exported(self, mock_db):
+        """Test that NULL dates and malformed purposes do not break the document."""
+        record = self.make_record("profile")
+        record.retention_date = None
+        record.consent_date = None
+        record.processing_purposes = "analytics, billing"
+        mock_db.execute.return_value.scalars.return_value = iter([record])
+        manager = GDPRComplianceManager(mock_db)
+
+        exported = orjson.loads(b"".join(manager.stream_user_data_export("user-1")))["data_records"][0]
+
+        assert exported["retention_date"] is None and exported["consent_date"] is None
+        assert exported["processing_purposes"] == "analytics, billing"
+
+    @pytest.mark.asyncio
+    async def test_export_route_maps_early_failure_to_404(self, mock_db):
+        """Test that the export endpoint still answers with an HTTP error when the first fetch fails."""
+        from fastapi import FastAPI
+
+        app = FastAPI()
+        with patch("services.security_framework.create_rate_limiter", return_value=None), \
+             patch("services.security_framework.threading.Thread"):
+            security_framework.setup_security_framework(app, mock_db)
+        export = next(route.endpoint for route in app.routes
+                      if getattr(route, "path", None) == "/api/v1/gdpr/export/{user_id}")
+        mock_db.execute.side_effect = RuntimeError("database unavailable")
+
+        with pytest.raises(HTTPException) as excinfo:
+            await export("user-1")
+
+        assert excinfo.value.status_code == 404
+
+
+@pytest.mark.services
+class TestGDPRCleanup:
+    """Test suite for retention cleanup."""
+
+    def test_cleanup_is_single_bulk_update(self, mock_db):
+        """Test that expired records are anonymized in one statement."""
+        mock_db.execute.return_value.rowcount = 42
+        manager = GDPRComplianceManager(mock_db)
+
+        assert manager.cleanup_expired_data() == 42
+        assert mock_db.execute.call_count == 1
+        mock_db.commit.assert_called_once()
+        mock_db.query.assert_not_called()
+
+
+@pytest.mark.services
+class TestInProcessRateLimiting:
+    """Test suite for the in-process ring buffer rate limiter."""
+
+    def test_rejects_once_limit_reached_within_window(self):
+        """Test that the limit-th request inside the window is the last allowed."""
+        limiter = InProcessRateLimiter()
+
+        assert [limiter.allow("client", 3, 60) for _ in range(4)] == [True, True, True, False]
+
+    def test_allows_again_after_window(self, monkeypatch):
+        """Test that slots free up once the oldest request leaves the window."""
+        clock = iter([0.0, 1.0, 2.0, 60.0, 60.5])
+        monkeypatch.setattr(security_framework.time, "time", lambda: next(clock))
+        limiter = InProcessRateLimiter()
+
+        assert [limiter.allow("client", 2, 60) for _ in range(5)] == [True, True, False, True, False]
+
+    def test_identifiers_are_independent(self):
+        """Test that one identifier's usage does not limit another."""
+        limiter = InProcessRateLimiter()
+        limiter.allow("a", 1, 60)
+
+        assert limiter.allow("a", 1, 60) is False
+        assert limiter.allow("b", 1, 60) is True
+
+    def test_idle_identifiers_are_evicted(self, monkeypatch):
+        """Test that identifiers whose requests have left the window are swept, and active ones kept."""
+        clock = iter([0.0, 0.0, 50.0, 100.0, 100.0])
+        monkeypatch.setattr(security_framework.time, "time", lambda: next(clock))
+        monkeypatch.setattr(InProcessRateLimiter, "SHARDS", 1)
+        limiter = InProcessRateLimiter()
+        limiter.allow("idle", 1, 60)
+        limiter.allow("slow", 1, 600)
+        limiter.allow("active", 1, 60)
+
+        assert limiter.allow("new", 1, 60) is True
+        rings, _lock = limiter._shards[0]
+        assert set(rings) == {"slow", "active", "new"}
+        assert limiter.allow("active", 1, 60) is False
+
+
+@pytest.mark.services
+class TestSanitization:
+    """Test suite for HTML sanitization."""
+
+    def test_sanitize_input_strips_disallowed_markup(self, mock_db):
+        """Test that scripts, attributes and control characters are removed."""
+        manager = SecurityManager(mock_db)
+
+        cleaned = manager.sanitize_input(
+            '<p onclick="x()">Fine <em>paid</em><script>alert(1)</script></p>\x07 '
+        )
+
+        assert cleaned == "<p>Fine <em>paid</em></p>"
+
+    def test_sanitize_html_content_keeps_structure_tags(self):
+        """Test that headings and lists survive display sanitization."""
+        cleaned = sanitize_html_content('<h1>Appeal</h1><ul><li>Item</li></ul><a href="x">link</a>')
+
+        assert cleaned == "<h1>Appeal</h1><ul><li>Item</li></ul>link"
+
+
+@pytest.mark.services
+class TestSharedSecurityManager:
+    """Test suite for the process-wide SecurityManager."""
+
+    def test_requires_setup(self, monkeypatch):
+        """Test that dependencies fail loudly before setup."""
+        monkeypatch.setattr(security_framework, "_security_manager", None)
+
+        with pytest.raises(RuntimeError):
+            get_security_manager()
+
+    @pytest.mark.asyncio
+    async def test_get_api_key_reuses_registered_manager(self, monkeypatch):
+        """Test that the API key dependency does not build a manager per request."""
+        manager = MagicMock()
+        manager.avalidate_api_key = AsyncMock(return_value="record")
+        monkeypatch.setattr(security_framework, "_security_manager", manager)
+        request = MagicMock()
+        request.headers = {"Authorization": "Bearer fh_test"}
+
+        assert await security_framework.get_api_key(request=request) == "record"
+        manager.avalidate_api_key.assert_awaited_once_with("fh_test")
+
+
+@pytest.mark.services
+class TestNIFValidation:
+    """Test suite for Portuguese NIF validation."""
+
+    @pytest.mark.parametrize("nif", ["123456789", "501964843", "999999990"])
+    def test_valid_nifs(self, nif):
+        """Test NIFs with correct mod-11 check digits."""
+        assert validate_nif(nif) is True
+
+    @pytest.mark.parametrize("nif", ["123456788", "12345678", "1234567890", "12345678a", "١٢٣٤٥٦٧٨٩"])
+    def test_invalid_nifs(self, nif):
+        """Test wrong check digits, lengths and non-ASCII digits."""
+        assert validate_nif(nif) is False
+
+
+@pytest.mark.services
+class TestAccessTokenCache:
+    """Test suite for cached JWT verification."""
+
+    def test_repeat_verification_skips_decode(self, mock_db):
+        """Test that a verified token is served from the cache."""
+        manager = SecurityManager(mock_db)
+        token = manager.create_access_token({"sub": "user-1"})
+
+        with patch("services.security_framework.jwt.decode", wraps=security_framework.jwt.decode) as decode:
+            first = manager.verify_access_token(token)
+            second = manager.verify_access_token(token)
+
+        assert first == second
+        assert first["sub"] == "user-1"
+        assert decode.call_count == 1
+
+    def test_expired_cached_token_is_rejected(self, mock_db):
+        """Test that cached payloads stop validating at their exp claim."""
+        manager = SecurityManager(mock_db)
+        security_framework._token_cache["stale-token"] = {"sub": "user-1", "exp": 0}
+
+        assert manager.verify_access_token("stale-token") is None
+        assert "stale-token" not in security_framework._token_cache
+
+    def test_callers_cannot_mutate_cached_payload(self, mock_db):
+        """Test that returned payloads are copies of the cached entry."""
+        manager = SecurityManager(mock_db)
+        token = manager.create_access_token({"sub": "user-1"})
+
+        manager.verify_access_token(token)["sub"] = "someone-else"
+
+        assert manager.verify_access_token(token)["sub"] == "user-1"
+
+
+@pytest.mark.services
+class TestSecurityMiddlewareHeaders:
+    """Test suite for security response headers."""
+
+    @pytest.fixture
+    def middleware(self, mock_db):
+        """SecurityMiddleware without Redis or background writers."""
+        with patch("services.security_framework.create_rate_limiter", return_value=None), \
+             patch("services.security_framework.threading.Thread"):
+            return SecurityMiddleware(mock_db)
+
+    @pytest.mark.asyncio
+    async def test_headers_are_appended_once(self, middleware):
+        """Test that all security headers are added in one extend."""
+        from starlette.requests import Request
+        from starlette.responses import Response
+
+        request = Request({"type": "http", "method": "GET", "path": "/", "headers": [], "client": ("1.2.3.4", 0)})
+        response = await middleware(request, AsyncMock(return_value=Response("ok")))
+
+        assert response.headers["x-frame-options"] == "DENY"
+        assert response.headers["strict-transport-security"] == "max-age=31536000; includeSubDomains"
+        assert response.headers.getlist("x-content-type-options") == ["nosniff"]
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_is_awaited(self, middleware):
+        """Test that the middleware uses the async rate limit check."""
+        from starlette.requests import Request
+        from starlette.responses import Response
+
+        middleware.security_manager.check_rate_limit = MagicMock()
+        middleware.security_manager.acheck_rate_limit = AsyncMock(return_value=False)
+        request = Request({"type": "http", "method": "GET", "path": "/", "headers": [], "client": ("1.2.3.4", 0)})
+
+        with pytest.raises(HTTPException) as excinfo:
+            await middleware(request, AsyncMock(return_value=Response("ok")))
+
+        assert excinfo.value.status_code == 429
+        middleware.security_manager.acheck_rate_limit.assert_awaited_once()
+        middleware.security_manager.check_rate_limit.assert_not_called()
+
+    def test_client_ip_prefers_first_forwarded_address(self, middleware):
+        """Test forwarded, real-ip and direct client address resolution."""
+        request = MagicMock()
+        request.headers = {"x-forwarded-for": "10.0.0.1, 10.0.0.2", "x-real-ip": "10.0.0.9"}
+        assert middleware._get_client_ip(request) == "10.0.0.1"
+
+        request.headers = {"x-real-ip": "10.0.0.9"}
+        assert middleware._get_client_ip(request) == "10.0.0.9"
+
+        request.headers = {}
+        request.client.host = "1.2.3.4"
+        assert middleware._get_client_ip(request) == "1.2.3.4"
@@ -0,0 +1,411 @@
+"""
+Security middleware tests.
+
+This module tests the analytics security middlewares in isolation:
+- Fused suspicious path pattern matching
+- Per-IP rate limiting, locally and through Redis
+- Memoized path prefix checks
+- IP blocking and periodic state sweeps
+- Request body validation
+- Sensitive data leakage checks on responses
+- Security response headers
+- Request logging
+"""
+
+import json
+
+import pytest
+import redis
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi.responses import ORJSONResponse
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+from services import security_middleware
+from services.security_middleware import AnalyticsSecurityMiddleware, InputValidationMiddleware
+
+
+@pytest.fixture
+def analytics_middleware():
+    """AnalyticsSecurityMiddleware wrapping a dummy ASGI app."""
+    return AnalyticsSecurityMiddleware(MagicMock(), rate_limit_per_minute=3)
+
+
+@pytest.mark.services
+class TestSuspiciousPatterns:
+    """Test suite for suspicious request path detection."""
+
+    @pytest.mark.parametrize("path, pattern", [
+        ("/api/v1/analytics/x UNION   SELECT", "sql_union"),
+        ("/files/../../etc/passwd", "path_traversal"),
+        ("/files/%2E%2E%2Fsecret", "encoded_path_traversal"),
+        ("/search?q=<script>", "script_tag"),
+        ("/run/eval (1)", "eval_call"),
+    ])
+    def test_matching_pattern_is_named(self, analytics_middleware, path, pattern):
+        """Test that the fused pattern reports which pattern fired."""
+        assert analytics_middleware._find_suspicious_pattern(path) == pattern
+        assert analytics_middleware._contains_suspicious_patterns(path) is True
+
+    def test_clean_path_does_not_match(self, analytics_middleware):
+        """Test that ordinary analytics paths pass."""
+        assert analytics_middleware._find_suspicious_pattern("/api/v1/analytics/user/42/events") is None
+
+
+@pytest.mark.services
+class TestRateLimiting:
+    """Test suite for per-IP rate limiting."""
+
+    def test_limit_applies_within_window(self, analytics_middleware):
+        """Test that requests beyond the limit inside one window are rejected."""
+        results = [analytics_middleware._check_rate_limit("1.2.3.4") for _ in range(4)]
+
+        assert results == [True, True, True, False]
+        assert analytics_middleware._check_rate_limit("5.6.7.8") is True
+
+    def test_requests_allowed_after_window(self, analytics_middleware, monkeypatch):
+        """Test that capacity returns once old requests leave the window."""
+        clock = iter([0.0, 1.0, 2.0, 3.0, 60.5, 61.5, 119.0, 200.0])
+        monkeypatch.setattr(security_middleware.time, "monotonic", lambda: next(clock))
+
+        results = [analytics_middleware._check_rate_limit("1.2.3.4") for _ in range(8)]
+
+        # The previous window's 3 requests are weighted by their remaining overlap
+        assert results == [True, True, True, False, True, False, True, True]
+
+    def test_bucket_is_constant_size(self, analytics_middleware):
+        """Test that per-IP state does not grow with request volume."""
+        for _ in range(10):
+            analytics_middleware._check_rate_limit("1.2.3.4")
+
+        assert len(analytics_middleware.request_counts["1.2.3.4"]) == 3
+
+
+@pytest.mark.services
+class TestSuspiciousRequestHandling:
+    """Test suite for rejecting suspicious requests before they reach handlers."""
+
+    @pytest.mark.asyncio
+    async def test_critical_suspicious_request_skips_handler(self, analytics_middleware):
+        """Test that a suspicious critical-endpoint request is rejected without calling the app."""
+        call_next = AsyncMock()
+
+        response = await analytics_middleware.dispatch(make_request(path="/analytics/track/../etc"), call_next)
+
+        assert response.status_code == 400
+        assert response.body == security_middleware.INVALID_CHARACTERS_BODY
+        call_next.assert_not_awaited()
+        assert analytics_middleware._is_ip_blocked("1.2.3.4") is True
+
+    @pytest.mark.asyncio
+    async def test_non_critical_suspicious_request_is_logged_and_served(self, analytics_middleware):
+        """Test that suspicious requests to other endpoints are logged but still handled."""
+        call_next = AsyncMock(return_value=Response(b"{}", media_type="application/json"))
+        analytics_middleware.security_logger = MagicMock()
+
+        response = await analytics_middleware.dispatch(make_request(path="/reports/eval(1)"), call_next)
+
+        assert response.status_code == 200
+        call_next.assert_awaited_once()
+        analytics_middleware.security_logger.warning.assert_called()
+
+
+@pytest.mark.services
+class TestClientIP:
+    """Test suite for client IP extraction."""
+
+    def test_forwarded_ip_uses_first_hop(self, analytics_middleware):
+        """Test that the originating client is taken from the X-Forwarded-For chain."""
+        request = make_request(headers={"X-Forwarded-For": "9.8.7.6, 10.0.0.1"})
+
+        assert analytics_middleware._get_client_ip(request) == "9.8.7.6"
+
+    def test_direct_client_ip_is_used_without_proxy_headers(self, analytics_middleware):
+        """Test that the connection address is used when no proxy headers are present."""
+        assert analytics_middleware._get_client_ip(make_request()) == "1.2.3.4"
+
+
+@pytest.fixture
+def redis_middleware():
+    """AnalyticsSecurityMiddleware backed by a mocked Redis client."""
+    return AnalyticsSecurityMiddleware(MagicMock(), rate_limit_per_minute=3, redis_client=MagicMock())
+
+
+@pytest.mark.services
+class TestRedisRateLimiting:
+    """Test suite for rate limiting and IP blocks shared through Redis."""
+
+    def test_rate_limit_uses_one_pipeline(self, redis_middleware):
+        """Test that a check increments and expires the window key in one pipeline."""
+        pipe = redis_middleware.redis_client.pipeline.return_value
+        pipe.execute.return_value = [4, True]
+
+        assert redis_middleware._check_rate_limit("1.2.3.4") is False
+        key = pipe.incr.call_args[0][0]
+        assert key.startswith(security_middleware.RATE_LIMIT_KEY_PREFIX + "1.2.3.4:")
+        pipe.expire.assert_called_once_with(key, 60)
+        assert redis_middleware.request_counts == {}
+
+    def test_rate_limit_falls_back_when_redis_fails(self, redis_middleware):
+        """Test that in-process limits apply when Redis is unreachable."""
+        redis_middleware.redis_client.pipeline.return_value.execute.side_effect = redis.ConnectionError()
+
+        results = [redis_middleware._check_rate_limit("1.2.3.4") for _ in range(4)]
+
+        assert results == [True, True, True, False]
+
+    def test_block_is_shared_through_redis(self, redis_middleware):
+        """Test that blocks are written with an expiry and read back from Redis."""
+        client = redis_middleware.redis_client
+        client.exists.return_value = 1
+        client.ttl.return_value = 250
+
+        redis_middleware._block_ip("1.2.3.4", duration=300)
+
+        client.set.assert_called_once_with(security_middleware.BLOCKED_IP_KEY_PREFIX + "1.2.3.4", 1, ex=300)
+        assert redis_middleware._is_ip_blocked("1.2.3.4") is True
+        assert redis_middleware._get_block_remaining_time("1.2.3.4") == 250
+
+    def test_local_block_applies_when_redis_fails(self, redis_middleware):
+        """Test that a block recorded locally still holds during a Redis outage."""
+        client = redis_middleware.redis_client
+        client.set.side_effect = redis.ConnectionError()
+        client.exists.side_effect = redis.ConnectionError()
+
+        redis_middleware._block_ip("1.2.3.4", duration=300)
+
+        assert redis_middleware._is_ip_blocked("1.2.3.4") is True
+
+
+@pytest.mark.services
+class TestPathPredicates:
+    """Test suite for memoized path prefix checks."""
+
+    @pytest.mark.parametrize("path, skip, critical, validate", [
+        ("/health", True, False, False),
+        ("/static/app.js", True, False, False),
+        ("/analytics/track", False, True, False),
+        ("/api/v1/analytics/user/1", False, True, True),
+        ("/api/v1/fines", False, False, False),
+    ])
+    def test_prefix_classification(self, analytics_middleware, path, skip, critical, validate):
+        """Test that each path is classified by its prefix."""
+        assert analytics_middleware._should_skip_security_check(path) is skip
+        assert analytics_middleware._is_critical_endpoint(path) is critical
+        assert security_middleware.requires_response_validation(path) is validate
+
+    def test_repeated_paths_hit_cache(self):
+        """Test that repeated lookups of a path are served from the cache."""
+        security_middleware.is_critical_endpoint.cache_clear()
+
+        for _ in range(3):
+            security_middleware.is_critical_endpoint("/analytics/track")
+
+        assert security_middleware.is_critical_endpoint.cache_info().hits == 2
+
+
+@pytest.mark.services
+class TestIPBlocking:
+    """Test suite for temporary IP blocks."""
+
+    def test_block_expires_without_request(self, analytics_middleware, monkeypatch):
+        """Test that blocks lapse by time and are pruned by the sweep."""
+        now = [1000.0]
+        monkeypatch.setattr(security_middleware.time, "monotonic", lambda: now[0])
+        analytics_middleware._block_ip("1.2.3.4", duration=300)
+
+        assert analytics_middleware._is_ip_blocked("1.2.3.4") is True
+        now[0] += 301
+        assert analytics_middleware._is_ip_blocked("1.2.3.4") is False
+        assert "1.2.3.4" in analytics_middleware.blocked_ips
+
+        analytics_middleware._sweep_expired_state(now[0])
+        assert "1.2.3.4" not in analytics_middleware.blocked_ips
+
+    def test_sweep_keeps_buckets_that_still_count(self, analytics_middleware):
+        """Test that only buckets older than the previous window are dropped."""
+        analytics_middleware.request_counts = {
+            "current": [600.0, 1, 0],
+            "previous": [540.0, 1, 0],
+            "stale": [480.0, 1, 0],
+        }
+
+        analytics_middleware._sweep_expired_state(610.0)
+
+        assert set(analytics_middleware.request_counts) == {"current", "previous"}
+
+
+def make_request(method="GET", path="/api/v1/analytics/track", body=b"", headers=None):
+    """Build a Starlette request with a fixed body."""
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    raw_headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": b"",
+        "headers": raw_headers,
+        "client": ("1.2.3.4", 0),
+        "path_params": {},
+    }, receive)
+
+
+@pytest.fixture
+def validation_middleware():
+    """InputValidationMiddleware wrapping a dummy ASGI app."""
+    return InputValidationMiddleware(MagicMock())
+
+
+@pytest.mark.services
+class TestRequestBodyValidation:
+    """Test suite for request body validation."""
+
+    @pytest.mark.asyncio
+    async def test_parsed_body_is_shared_with_handlers(self, validation_middleware):
+        """Test that the validated JSON body is left on request.state."""
+        request = make_request("POST", body=b'{"event": "view"}', headers={"Content-Type": "application/json"})
+
+        assert await validation_middleware._validate_request(request) is None
+        assert request.state.parsed_body == {"event": "view"}
+
+    @pytest.mark.asyncio
+    async def test_invalid_json_is_rejected(self, validation_middleware):
+        """Test that malformed JSON bodies fail validation."""
+        request = make_request("POST", body=b'{"event":', headers={"Content-Type": "application/json"})
+
+        assert await validation_middleware._validate_request(request) == "Invalid JSON in request body"
+
+
+@pytest.mark.services
+class TestResponseValidation:
+    """Test suite for sensitive data leakage checks on responses."""
+
+    @pytest.mark.asyncio
+    async def test_leaking_response_is_replaced(self, validation_middleware):
+        """Test that a response exposing a secret field is swapped for a generic error."""
+        response = Response(b'{"user": 1, "Password": "hunter2"}', media_type="application/json")
+
+        result = await validation_middleware._validate_response(response, make_request())
+
+        assert result is not response
+        assert result.status_code == 500
+
+    @pytest.mark.asyncio
+    async def test_clean_response_is_returned_unchanged(self, validation_middleware):
+        """Test that responses without sensitive content pass through."""
+        response = Response(b'{"events": 3}', media_type="application/json")
+
+        assert await validation_middleware._validate_response(response, make_request()) is response
+
+    def test_fused_pattern_reports_matching_name(self):
+        """Test that the fused byte pattern identifies which check matched."""
+        match = security_middleware.SENSITIVE_RESPONSE_PATTERN.search(b'error in SQL  syntax near')
+
+        assert match.lastgroup == "sql_error"
+
+    @pytest.mark.asyncio
+    async def test_binary_response_is_not_scanned(self, validation_middleware):
+        """Test that non-textual responses skip the leakage scan."""
+        response = Response(b'"password": "x"', media_type="application/octet-stream")
+
+        assert await validation_middleware._validate_response(response, make_request()) is response
+
+    @pytest.mark.asyncio
+    async def test_oversized_response_is_not_scanned(self, validation_middleware):
+        """Test that bodies above the scan cap are passed through."""
+        body = b'{"password": "x", "pad": "' + b"a" * security_middleware.RESPONSE_SCAN_MAX_BYTES + b'"}'
+        response = Response(body, media_type="application/json")
+
+        assert await validation_middleware._validate_response(response, make_request()) is response
+
+    @pytest.mark.asyncio
+    async def test_streaming_response_is_not_scanned(self, validation_middleware):
+        """Test that streaming responses are passed through untouched."""
+        response = StreamingResponse(iter([b'{"password": "x"}']), media_type="application/json")
+
+        assert await validation_middleware._validate_response(response, make_request()) is response
+
+
+@pytest.mark.services
+class TestSecurityHeaders:
+    """Test suite for security response headers."""
+
+    def test_all_security_headers_are_added(self, analytics_middleware):
+        """Test that every static security header is set on the response."""
+        response = analytics_middleware._add_security_headers(Response(b"{}", media_type="application/json"))
+
+        for name, value in security_middleware.SECURITY_HEADERS.items():
+            assert response.headers[name] == value
+        assert "frame-ancestors 'none'" in response.headers["content-security-policy"]
+
+    def test_existing_header_is_overwritten_not_duplicated(self, analytics_middleware):
+        """Test that a header already on the response is replaced."""
+        response = Response(b"{}", headers={"X-Frame-Options": "SAMEORIGIN"})
+
+        response = analytics_middleware._add_security_headers(response)
+
+        assert response.headers.getlist("x-frame-options") == ["DENY"]
+
+
+@pytest.mark.services
+class TestRequestLogging:
+    """Test suite for request logging."""
+
+    def test_request_log_skipped_when_info_disabled(self, analytics_middleware):
+        """Test that nothing is logged when the logger filters out INFO."""
+        analytics_middleware.security_logger = MagicMock()
+        analytics_middleware.security_logger.isEnabledFor.return_value = False
+
+        analytics_middleware._log_request("1.2.3.4", "GET", "/analytics/track", {})
+
+        analytics_middleware.security_logger.info.assert_not_called()
+
+    def test_request_log_uses_lazy_formatting(self, analytics_middleware):
+        """Test that the request log passes format arguments instead of a preformatted message."""
+        analytics_middleware.security_logger = MagicMock()
+        analytics_middleware.security_logger.isEnabledFor.return_value = True
+
+        analytics_middleware._log_request("1.2.3.4", "GET", "/analytics/track", {"user-agent": "curl"})
+
+        args, kwargs = analytics_middleware.security_logger.info.call_args
+        assert args == ("Request: %s %s", "GET", "/analytics/track")
+        assert kwargs["extra"]["user_agent"] == "curl"
+
+
+@pytest.mark.services
+class TestPrecomputedErrorBodies:
+    """Test suite for pre-encoded error responses."""
+
+    def test_rate_limited_body_matches_documented_payload(self):
+        """Test that the pre-encoded 429 body carries the expected fields."""
+        payload = json.loads(security_middleware.RATE_LIMITED_BODY)
+
+        assert payload == {
+            "error": "Too Many Requests",
+            "message": "Rate limit exceeded. Please try again later.",
+            "retry_after": 60
+        }
+
+    @pytest.mark.asyncio
+    async def test_leak_response_uses_internal_error_body(self, validation_middleware):
+        """Test that leak detection answers with the shared 500 body."""
+        response = Response(b'{"secret": "s3"}', media_type="application/json")
+
+        result = await validation_middleware._validate_response(response, make_request())
+
+        assert result.body == security_middleware.INTERNAL_ERROR_BODY
+        assert result.headers["content-type"] == "application/json"
+
+    @pytest.mark.asyncio
+    async def test_blocked_ip_response_is_orjson_encoded(self, analytics_middleware):
+        """Test that the dynamic blocked-IP response is rendered with orjson."""
+        analytics_middleware._block_ip("1.2.3.4", duration=300)
+
+        response = await analytics_middleware.dispatch(make_request(), MagicMock())
+
+        assert isinstance(response, ORJSONResponse)
+        assert response.status_code == 429
+        assert 0 < json.loads(response.body)["retry_after"] <= 300
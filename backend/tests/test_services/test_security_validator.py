@@ -0,0 +1,540 @@
+"""
+Security validator tests.
+
+This module tests the input validation helpers in isolation:
+- Precompiled injection and XSS patterns
+- Fused per-category pattern scans
+- Single-pass URL threat screening
+- Trigger-character pre-screen for XSS
+- Memoized user, session, IP and URL checks
+- Regex-free IP address format check
+- Date range parsing
+- Batched screening of event data strings
+- Security event logging
+- Clean user ID fast path
+- Shared module-level validator
+- Linear-time patterns on adversarial input
+- Null-byte stripping
+- Schema-specialized event data validators
+"""
+
+import re
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from services import security_validator
+from services.security_validator import SecurityValidator
+
+
+@pytest.fixture(autouse=True)
+def clear_validation_caches():
+    """Reset memoized validation verdicts between tests."""
+    for cached in (security_validator._clean_user_id, security_validator._clean_session_id,
+                   security_validator._sanitize_event_key, security_validator._check_ip_address,
+                   security_validator._check_url):
+        cached.cache_clear()
+    yield
+
+
+@pytest.fixture
+def validator():
+    """SecurityValidator instance."""
+    return SecurityValidator()
+
+
+@pytest.mark.services
+class TestCompiledPatterns:
+    """Test suite for precompiled injection and XSS patterns."""
+
+    def test_patterns_compiled_once_per_class(self):
+        """Test that every signature has a compiled counterpart on the class."""
+        assert len(SecurityValidator._SQL_RE) == len(SecurityValidator.SQL_INJECTION_PATTERNS)
+        assert len(SecurityValidator._XSS_RE) == len(SecurityValidator.XSS_PATTERNS)
+        assert all(isinstance(pattern, re.Pattern) for pattern in SecurityValidator._SQL_RE)
+
+    def test_detect_patterns_reports_bitmask(self, validator):
+        """Test that detected patterns are reported as a bitmask of their indexes."""
+        mask = validator._detect_patterns("1; DROP TABLE users", validator._SQL_RE)
+
+        assert mask == 1 << 3
+        assert validator._mask_to_names(mask, SecurityValidator.SQL_INJECTION_PATTERN_NAMES) == ["drop_delete_insert"]
+
+    def test_pattern_names_cover_every_sql_pattern(self):
+        """Test that every SQL signature has a log name."""
+        assert len(SecurityValidator.SQL_INJECTION_PATTERN_NAMES) == len(SecurityValidator.SQL_INJECTION_PATTERNS)
+
+    def test_logged_event_lists_pattern_names(self, validator):
+        """Test that the bitmask is expanded to pattern names when the event is logged."""
+        validator.security_events_logger = MagicMock()
+
+        with pytest.raises(ValueError):
+            validator.validate_user_id("1 UNION SELECT * FROM users")
+
+        details = validator.security_events_logger.warning.call_args.kwargs["extra"]["details"]
+        assert details["pattern_detected"] == ["union_select_or_quote_chain"]
+
+    def test_xss_patterns_match_across_lines(self, validator):
+        """Test that XSS patterns keep DOTALL matching for multi-line payloads."""
+        assert validator._contains_xss_patterns("<script>\nalert(1)\n</script>")
+        assert not validator._contains_xss_patterns("plain text")
+
+
+@pytest.mark.services
+class TestCombinedPatterns:
+    """Test suite for fused per-category pattern scans."""
+
+    @pytest.mark.parametrize("value", [
+        "admin' OR '1'='1",
+        "1; DROP TABLE users;--",
+        "1 UNION SELECT * FROM users--",
+        "update users set role=1",
+        "clean_user_42",
+        "or 1=1",
+    ])
+    def test_sql_alternation_agrees_with_individual_patterns(self, validator, value):
+        """Test that the fused SQL scan flags exactly what the individual patterns flag."""
+        expected = any(pattern.search(value) for pattern in validator._SQL_RE)
+
+        assert validator._contains_sql_injection_patterns(value) is expected
+
+    @pytest.mark.parametrize("value", [
+        "<iframe src=x></iframe>",
+        "img onerror = x",
+        "data:text/html,<b>",
+        "hello world",
+    ])
+    def test_xss_alternation_agrees_with_individual_patterns(self, validator, value):
+        """Test that the fused XSS scan flags exactly what the individual patterns flag."""
+        expected = any(pattern.search(value) for pattern in validator._XSS_RE)
+
+        assert validator._contains_xss_patterns(value) is expected
+
+
+@pytest.mark.services
+class TestURLThreatScreening:
+    """Test suite for single-pass URL threat screening."""
+
+    @pytest.mark.parametrize("url", [
+        "http://evil.com'; DROP TABLE users;--",
+        "http://example.com/<iframe src=x>\n</iframe>",
+        "http://example.com/?q=1 union select password",
+    ])
+    def test_threats_are_rejected(self, validator, url):
+        """Test that injection and XSS URLs are rejected."""
+        assert validator.validate_url(url) is None
+
+    def test_path_segments_are_not_screened(self, validator):
+        """Test that URL screening covers the injection and XSS signatures only, as validate_url always has."""
+        url = "http://example.com/docs/../guides/page"
+
+        assert validator.validate_url(url) == url
+
+    def test_scheme_split_ignores_embedded_tabs(self, validator):
+        """Test that tab-obfuscated javascript: URLs are still rejected by scheme."""
+        validator._log_security_event = MagicMock()
+
+        assert validator.validate_url("jav\tascript:alert(1)") is None
+        validator._log_security_event.assert_called_once_with(
+            "unsafe_url_protocol", {"scheme": "javascript", "url": "jav\tascript:alert(1)"}
+        )
+
+    def test_clean_url_passes(self, validator):
+        """Test that an ordinary URL is returned unchanged."""
+        assert validator.validate_url("https://example.com/page?x=1") == "https://example.com/page?x=1"
+
+
+@pytest.mark.services
+class TestXSSPreScreen:
+    """Test suite for the trigger-character pre-screen for XSS."""
+
+    def test_every_xss_signature_needs_a_trigger_character(self):
+        """Test that no XSS signature can match without '<', ':' or '='."""
+        for pattern in SecurityValidator.XSS_PATTERNS:
+            assert any(char in pattern for char in "<:="), pattern
+
+    def test_clean_value_skips_regex(self, validator, monkeypatch):
+        """Test that values without trigger characters never reach the XSS regex."""
+        combined = MagicMock()
+        monkeypatch.setattr(SecurityValidator, "_XSS_COMBINED", combined)
+
+        assert validator._contains_xss_patterns("plain words only") is False
+        combined.search.assert_not_called()
+
+    def test_sanitize_skips_removal_passes_without_a_match(self, validator, monkeypatch):
+        """Test that a trigger character alone does not run the per-pattern XSS removals."""
+        removals = (MagicMock(),)
+        monkeypatch.setattr(SecurityValidator, "_XSS_RE", removals)
+
+        assert validator._sanitize_string("utm_source=mail") == "utm_source=mail"
+        removals[0].sub.assert_not_called()
+
+    def test_sanitize_still_removes_matches(self, validator):
+        """Test that values hitting the combined scan go through the removal passes."""
+        assert "javascript:" not in validator._sanitize_string("javascript:alert(1)")
+
+
+@pytest.mark.services
+class TestValidationCache:
+    """Test suite for memoized user, session, IP and URL checks."""
+
+    def test_repeated_user_id_is_served_from_cache(self, validator):
+        """Test that the second validation of a user ID is a cache hit."""
+        validator.validate_user_id("user_42")
+        validator.validate_user_id("user_42")
+
+        info = security_validator._clean_user_id.cache_info()
+        assert (info.hits, info.misses) == (1, 1)
+
+    def test_rejections_are_logged_on_every_call(self, validator):
+        """Test that cached rejections still emit a security event each time."""
+        validator._log_security_event = MagicMock()
+
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                validator.validate_user_id("1; DROP TABLE users;--")
+            assert validator.validate_ip_address("1.2.3.4; DROP") is None
+            assert validator.validate_url("javascript:alert(1)") is None
+
+        event_types = [call.args[0] for call in validator._log_security_event.call_args_list]
+        assert event_types == ["sql_injection_attempt", "invalid_ip_format", "unsafe_url_protocol"] * 2
+
+    def test_rejected_session_ids_get_fresh_safe_ids(self, validator):
+        """Test that generated replacement session IDs are not cached."""
+        first = validator.validate_session_id("1 OR 1=1")
+        second = validator.validate_session_id("1 OR 1=1")
+
+        assert first.startswith("safe_") and second.startswith("safe_")
+        assert first != second
+
+    def test_generated_session_ids_keep_their_format(self, validator):
+        """Test that replacement session IDs are 'safe_' plus 16 hex characters."""
+        assert re.fullmatch(r"safe_[0-9a-f]{16}", validator._generate_safe_session_id())
+
+    def test_event_keys_are_sanitized_once_per_key(self, validator):
+        """Test that repeated event data keys reuse their sanitized form."""
+        for _ in range(3):
+            result = validator.validate_event_data({"page-name": "home", "  ": "blank", "count": 1})
+
+        assert result == {"pagename": "home", "count": 1}
+        assert security_validator._sanitize_event_key.cache_info().misses == 3
+
+    def test_overlong_session_id_still_raises(self, validator):
+        """Test that length errors are raised on every call rather than cached."""
+        for _ in range(2):
+            with pytest.raises(ValueError, match="Session ID too long"):
+                validator.validate_session_id("s" * 101)
+
+
+@pytest.mark.services
+class TestIPAddressFormat:
+    """Test suite for the regex-free IP address format check."""
+
+    @pytest.mark.parametrize("ip", ["192.168.1.1", "10.0.0.255", "::1", "fe80::1", "ABCD:ef01::"])
+    def test_valid_addresses_pass(self, validator, ip):
+        """Test that dotted quads and hex/colon addresses are accepted."""
+        assert validator.validate_ip_address(ip) == ip
+
+    @pytest.mark.parametrize("ip", ["1.2.3", "1.2.3.4.5", "1..2.3", "1234.1.1.1", "1.2.3.4; DROP", "fe80::g", "::1 or 1=1"])
+    def test_malformed_addresses_are_rejected(self, validator, ip):
+        """Test that anything outside the two accepted shapes is rejected."""
+        assert validator.validate_ip_address(ip) is None
+
+
+@pytest.mark.services
+class TestDateRange:
+    """Test suite for date range parsing."""
+
+    def test_each_date_string_is_parsed_once(self, validator):
+        """Test that the ordering check reuses the already parsed dates."""
+        start = (datetime.now() - timedelta(days=2)).isoformat()
+        end = (datetime.now() - timedelta(days=1)).isoformat()
+
+        with patch.object(SecurityValidator, "_parse_date", wraps=SecurityValidator._parse_date) as parse:
+            assert validator.validate_date_range(start, end) == (start, end)
+
+        assert parse.call_count == 2
+
+    def test_trailing_z_is_read_as_utc(self, validator):
+        """Test that a trailing 'Z' designator is parsed as UTC."""
+        assert validator._parse_date("2025-01-01T00:00:00Z").utcoffset() == timedelta(0)
+
+    def test_start_after_end_is_rejected(self, validator):
+        """Test that reversed ranges are rejected."""
+        start = (datetime.now() - timedelta(days=1)).isoformat()
+        end = (datetime.now() - timedelta(days=2)).isoformat()
+
+        with pytest.raises(ValueError, match="Start date cannot be after end date"):
+            validator.validate_date_range(start, end)
+
+    def test_clock_is_read_once_per_call(self, validator):
+        """Test that both bounds share a single datetime.now() reading."""
+        fixed_now = datetime(2025, 6, 1, 12, 0, 0)
+        start = (fixed_now - timedelta(days=2)).isoformat()
+        end = (fixed_now - timedelta(days=1)).isoformat()
+
+        with patch.object(security_validator, "datetime", wraps=datetime) as clock:
+            clock.now.return_value = fixed_now
+            clock.fromisoformat = datetime.fromisoformat
+            assert validator.validate_date_range(start, end) == (start, end)
+
+        clock.now.assert_called_once()
+
+    def test_bounds_allow_one_day_of_future_slack(self, validator):
+        """Test that dates up to a day ahead pass and older than a year fail."""
+        soon = (datetime.now() + timedelta(hours=12)).isoformat()
+        too_old = (datetime.now() - timedelta(days=400)).isoformat()
+
+        assert validator.validate_date_range(soon, None) == (soon, None)
+        with pytest.raises(ValueError, match="too far in the past"):
+            validator.validate_date_range(None, too_old)
+
+
+@pytest.mark.services
+class TestEventDataScreening:
+    """Test suite for batched screening of event data strings."""
+
+    def test_clean_strings_skip_per_value_sanitizing(self, validator):
+        """Test that clean payloads are escaped without per-value regex passes."""
+        data = {"page": "home & garden", "title": " Hello ", "count": 3}
+
+        with patch.object(SecurityValidator, "_sanitize_string") as sanitize:
+            result = validator.validate_event_data(data)
+
+        sanitize.assert_not_called()
+        assert result == {"page": "home &amp; garden", "title": "Hello", "count": 3}
+
+    def test_suspicious_payload_falls_back_to_per_value_path(self, validator):
+        """Test that one suspicious value sends every string through full sanitizing."""
+        data = {"page": "home", "query": "1 UNION SELECT password"}
+
+        result = validator.validate_event_data(data)
+
+        assert result["page"] == "home"
+        assert "[REMOVED]" in result["query"]
+
+    def test_match_across_values_is_not_a_false_negative(self, validator):
+        """Test that word boundaries at the separator match those at value edges."""
+        assert validator._screen_string_values({"a": "x", "b": "or 1=1"}) is None
+
+
+@pytest.mark.services
+class TestSecurityEventLogging:
+    """Test suite for security event logging."""
+
+    def test_disabled_logger_skips_event_building(self, validator):
+        """Test that nothing is formatted when WARNING is filtered out."""
+        validator.security_events_logger = MagicMock()
+        validator.security_events_logger.isEnabledFor.return_value = False
+        validator._mask_to_names = MagicMock()
+
+        validator._log_security_event("sql_injection_attempt", {"sql_pattern_mask": 1})
+
+        validator.security_events_logger.warning.assert_not_called()
+        validator._mask_to_names.assert_not_called()
+
+    def test_event_message_uses_lazy_formatting(self, validator):
+        """Test that the event type is passed as a format argument."""
+        validator.security_events_logger = MagicMock()
+        validator.security_events_logger.isEnabledFor.return_value = True
+
+        validator._log_security_event("data_truncated", {"key": "k"})
+
+        args, kwargs = validator.security_events_logger.warning.call_args
+        assert args == ("Security event: %s", "data_truncated")
+        assert kwargs["extra"]["details"] == {"key": "k"}
+
+    def test_event_extra_carries_base_fields_and_epoch_timestamp(self, validator):
+        """Test that the event record merges the static base with a float timestamp."""
+        validator.security_events_logger = MagicMock()
+        validator.security_events_logger.isEnabledFor.return_value = True
+
+        with patch.object(security_validator.time, "time", return_value=1700000000.5):
+            validator._log_security_event("data_truncated", {"key": "k"})
+
+        extra = validator.security_events_logger.warning.call_args.kwargs["extra"]
+        assert extra["security_event"] is True
+        assert extra["event_type"] == "data_truncated"
+        assert extra["timestamp"] == 1700000000.5
+        assert security_validator._EVENT_BASE == {"security_event": True}
+
+
+@pytest.mark.services
+class TestUserIDFastPath:
+    """Test suite for the clean user ID fast path."""
+
+    @pytest.mark.parametrize("user_id", ["user_42", "john.doe@example.com", "a-b_c"])
+    def test_clean_ids_are_returned_as_is(self, validator, user_id):
+        """Test that already clean IDs skip sanitization and are returned unchanged."""
+        assert validator.validate_user_id(user_id) is user_id
+
+    def test_fast_path_still_applies_sql_checks(self, validator):
+        """Test that whitelisted characters alone do not bypass the injection scan."""
+        with pytest.raises(ValueError, match="Invalid user ID format"):
+            validator.validate_user_id("execute")
+
+    def test_non_ascii_ids_take_the_whitelist_path(self, validator):
+        """Test that IDs outside the ASCII fast path are still sanitized."""
+        assert validator.validate_user_id("ünï code!") == "ünïcode"
+
+
+@pytest.mark.services
+class TestSharedValidator:
+    """Test suite for the shared module-level validator."""
+
+    def test_module_functions_use_the_shared_instance(self):
+        """Test that the module-level API is bound to one process-wide validator."""
+        assert security_validator.validate_user_id.__self__ is security_validator.validator
+        assert security_validator.validate_url.__self__ is security_validator.validator
+
+    def test_module_function_validates(self):
+        """Test that the module-level API behaves like the instance methods."""
+        assert security_validator.validate_user_id("user_42") == "user_42"
+        assert security_validator.validate_ip_address("10.0.0.1") == "10.0.0.1"
+
+
+@pytest.mark.services
+class TestPatternBacktracking:
+    """Test suite for linear-time patterns on adversarial input."""
+
+    @pytest.mark.parametrize("value", [
+        "union " * 4000,
+        "or " * 6000,
+        "update  " * 3000,
+        "on" * 12000,
+        "<script>" * 3000,
+        "<iframe>" * 3000,
+        "<script" * 3000,
+    ])
+    def test_repeated_keywords_scan_quickly(self, validator, value):
+        """Test that repeated keywords without a closing match do not backtrack quadratically."""
+        started = time.perf_counter()
+        validator._contains_sql_injection_patterns(value)
+        validator._contains_xss_patterns(value)
+        validator._sanitize_string(value)
+
+        assert time.perf_counter() - started < 1.0
+
+    @pytest.mark.parametrize("value", [
+        "1 UNION ALL SELECT name FROM users",
+        "x' or 'a'='a",
+        "admin\";drop\"",
+        "update users  set role='admin'",
+        "1 or 1=1",
+    ])
+    def test_patterns_still_flag_injections(self, validator, value):
+        """Test that typical injection strings are still detected."""
+        assert validator._contains_sql_injection_patterns(value)
+
+    @pytest.mark.parametrize("padding", [150, 1500])
+    def test_padded_sql_injections_are_flagged(self, validator, padding):
+        """Test that keyword pairs separated by long padding are still detected."""
+        filler = "x " * padding
+
+        assert validator._contains_sql_injection_patterns(f"1 union {filler}select password")
+        assert validator._contains_sql_injection_patterns(f"name or {filler}1=1")
+        assert validator._contains_sql_injection_patterns(f"update users {filler}set role='admin'")
+
+    @pytest.mark.parametrize("padding", [150, 1500])
+    def test_padded_xss_is_flagged(self, validator, padding):
+        """Test that tags with long attributes or bodies and long handler names are still detected."""
+        filler = "a" * padding
+
+        assert validator._contains_xss_patterns(f"<script>{filler}</script>")
+        assert validator._contains_xss_patterns(f'<iframe title="{filler}" src="x">{filler}</iframe>')
+        assert validator._contains_xss_patterns(f"<div on{filler}=alert(1)>")
+
+    def test_repeated_openers_do_not_hide_a_match(self, validator):
+        """Test that a later opening token does not cut short a match found by the first."""
+        assert validator._contains_xss_patterns("<script>alert(1)<scriptx</script>")
+        assert validator._contains_sql_injection_patterns("update users update; set role='admin'")
+        assert validator._contains_sql_injection_patterns("1 union union select password")
+        assert not validator._contains_xss_patterns("<script>alert(1)<script>")
+
+    @pytest.mark.parametrize("value, expected", [
+        ("<div oncontextmenu=alert(1)>", "&lt;div alert(1)&gt;"),
+        ("<div onanimationend =alert(1)>", "&lt;div alert(1)&gt;"),
+        ("<a xontransitionend=alert(1)>", "&lt;a xalert(1)&gt;"),
+        ("<div data-on=1>", "&lt;div data-on=1&gt;"),
+    ])
+    def test_sanitize_removes_whole_handler_names(self, validator, value, expected):
+        """Test that sanitization removes a handler name from its first "on", not its last."""
+        assert validator._sanitize_string(value) == expected
+
+    def test_quote_chain_stays_within_a_line(self, validator):
+        """Test that the quote chain, like the original '.*' form, does not span newlines."""
+        assert not validator._SQL_RE[0].search("a'b\n'c'd\n'e")
+        assert validator._SQL_RE[0].search("a'b'c'd'e")
+
+
+@pytest.mark.services
+class TestNullByteStripping:
+    """Test suite for null-byte stripping before escaping."""
+
+    def test_null_bytes_are_removed(self, validator):
+        """Test that null bytes are stripped before the value is escaped."""
+        assert validator._escape_value("a\x00<b>\x00") == "a&lt;b&gt;"
+        assert validator._sanitize_string(" pa\x00ge ") == "page"
+
+    def test_clean_value_is_escaped_unchanged(self, validator):
+        """Test that values without null bytes pass straight to escaping."""
+        assert validator._escape_value("home & garden") == "home &amp; garden"
+
+
+@pytest.mark.services
+class TestSchemaValidator:
+    """Test suite for schema-specialized event data validators."""
+
+    SCHEMA = {"page": str, "title": str, "count": int, "duration": float, "ok": bool, "ref": type(None)}
+
+    @pytest.mark.parametrize("data", [
+        {"page": "home & garden", "title": " Hello ", "count": 3, "duration": 1.5, "ok": True, "ref": None},
+        {"page": "1 UNION SELECT password", "title": "<script>x</script>", "count": 0, "duration": 0.0, "ok": False, "ref": None},
+        {"page": "x" * 1200, "title": "t", "count": -5, "duration": -2.5, "ok": True, "ref": None},
+    ])
+    def test_matches_generic_validation(self, validator, data):
+        """Test that the specialized validator returns what validate_event_data returns."""
+        validate = validator.make_schema_validator(self.SCHEMA)
+
+        assert validate(data) == validator.validate_event_data(data)
+
+    @pytest.mark.parametrize("data", [
+        {"page": "home"},
+        {"page": "home", "title": "t", "count": 1, "duration": 1.0, "ok": True, "ref": None, "extra": 1},
+        {"page": "home", "title": "t", "count": "1", "duration": 1.0, "ok": True, "ref": None},
+        {"page": "home", "title": "t", "count": 2000000, "duration": 1.0, "ok": True, "ref": None},
+        "not a dict",
+    ])
+    def test_other_shapes_fall_back(self, validator, data):
+        """Test that payloads outside the schema are handed to validate_event_data."""
+        with patch.object(validator, "validate_event_data", return_value={"fallback": True}) as fallback:
+            validate = validator.make_schema_validator(self.SCHEMA)
+            assert validate(data) == {"fallback": True}
+
+        fallback.assert_called_once_with(data)
+
+    def test_truncation_is_logged(self, validator):
+        """Test that over-long strings are truncated and logged like the generic path."""
+        validate = validator.make_schema_validator({"page": str})
+
+        with patch.object(validator, "_log_security_event") as log_event:
+            result = validate({"page": "x" * 1200})
+
+        assert result == {"page": "x" * 1000}
+        log_event.assert_called_once_with("data_truncated", {
+            "key": "page", "original_length": 1200, "truncated_length": 1000
+        })
+
+    def test_keys_are_sanitized_at_build_time(self, validator):
+        """Test that output keys are sanitized and blank keys dropped."""
+        validate = validator.make_schema_validator({"pa-ge": str, "  ": int})
+
+        assert validate({"pa-ge": "home", "  ": 1}) == {"page": "home"}
+
+    @pytest.mark.parametrize("schema", [{"a": list}, {"a b": str, "ab": int}, {1: str}])
+    def test_invalid_schemas_are_rejected(self, validator, schema):
+        """Test that unsupported types, colliding keys and non-string keys raise."""
+        with pytest.raises(ValueError):
+            validator.make_schema_validator(schema)